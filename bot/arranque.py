@@ -0,0 +1,75 @@
+# bot/arranque.py
+# Calentamiento antes de recibir tráfico: pool de DB, consultas frecuentes, cachés en memoria
+# y conexiones HTTP a la Bot API. Así el primer update cuesta lo mismo que los siguientes.
+import asyncio
+import logging
+import time
+
+import config
+from database.connection import get_db_connection, obtener_pool
+from database.preparadas import ejecutar
+from utils.actividad import cargar_huellas
+from utils.auth import cargar_autorizados
+from utils.catalogo_paquetes import cargar_catalogo
+
+logger = logging.getLogger(__name__)
+
+# Sentencias preparadas de los caminos más usados (menú de inicio, selección de líneas,
+# saldos): el pool las prepara al abrir cada conexión (database/preparadas.py) y aquí se
+# ejecutan una vez para cargar el catálogo del backend y las páginas de índice en caché.
+SENTENCIAS_CALIENTES = [
+    ("resumen_propietario", (0,)),
+    ("lineas_activas", (0,)),
+    ("lineas_panel", (0,)),
+    ("saldos_lineas", ([0],)),
+]
+
+def cargar_caches():
+    """Cachés en memoria que no dependen del event loop."""
+    cargar_catalogo()
+    cargar_autorizados()
+    cargar_huellas()
+
+def calentar_db():
+    """Abre el mínimo del pool y ejecuta las sentencias calientes en cada conexión."""
+    obtener_pool().llenar_minimo()
+
+    conexiones = []
+    try:
+        for _ in range(config.DB_POOL_MIN):
+            conexiones.append(get_db_connection())
+        for conn in conexiones:
+            cur = conn.cursor()
+            for nombre, parametros in SENTENCIAS_CALIENTES:
+                ejecutar(cur, nombre, parametros)
+                cur.fetchall()
+            cur.close()
+            conn.rollback()
+    finally:
+        for conn in conexiones:
+            conn.close()
+
+async def _medir(tiempos, nombre, corrutina):
+    inicio = time.monotonic()
+    try:
+        await corrutina
+    except Exception as e:
+        logger.error("⚠️ Calentamiento '%s' falló: %s", nombre, e, exc_info=True)
+    tiempos[nombre] = round((time.monotonic() - inicio) * 1000)
+
+async def calentar(bot_interactivo, bot_masivo):
+    """Todo en paralelo: DB, cachés y conexiones a la Bot API. Registra el tiempo de cada parte."""
+    inicio = time.monotonic()
+    tiempos = {}
+
+    # Bot.initialize() ya hizo un get_me (1 conexión); se abren algunas más en paralelo
+    conexiones_bot = [bot_interactivo.get_me() for _ in range(config.CALENTAR_CONEXIONES_BOT)]
+
+    await asyncio.gather(
+        _medir(tiempos, "db", asyncio.to_thread(calentar_db)),
+        _medir(tiempos, "caches", asyncio.to_thread(cargar_caches)),
+        _medir(tiempos, "bot_api", asyncio.gather(*conexiones_bot, bot_masivo.get_me())),
+    )
+
+    total = round((time.monotonic() - inicio) * 1000)
+    logger.info("🔥 Calentamiento completado en %s ms", total, extra={"campos": tiempos})
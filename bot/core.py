@@ -1,14 +1,23 @@
 # bot/core.py
 from telegram.ext import Application
-from config import TELEGRAM_TOKEN
+from config import TELEGRAM_TOKEN, TELEGRAM_API_BASE_URL
+from bot.peticiones import crear_peticion_interactiva
 import importlib
 import os
 from database.connection import init_db  # <-- NUEVO
 
 class TelegramBot:
     def __init__(self):
-        self.application = Application.builder().token(TELEGRAM_TOKEN).updater(None).build()
+        self.application = (
+            Application.builder()
+            .token(TELEGRAM_TOKEN)
+            .base_url(TELEGRAM_API_BASE_URL)
+            .request(crear_peticion_interactiva())
+            .updater(None)
+            .build()
+        )
         init_db()  # <-- NUEVO: Inicializa la DB al arrancar
+        # Las cachés (catálogo, autorizados, perfiles) se cargan en el calentamiento: bot/arranque.py
         self.load_modules()
 
     def load_modules(self):
@@ -26,5 +35,7 @@ class TelegramBot:
                     print(f"❌ Error al cargar módulo {module_name}: {e}")
 
     def run(self):
+        from bot.arranque import cargar_caches
+        cargar_caches()
         print("🚀 Bot iniciado y esperando actualizaciones...")
         self.application.run_polling()
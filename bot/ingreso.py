@@ -0,0 +1,54 @@
+# bot/ingreso.py
+# Entrada del webhook: token secreto, tipos de update suscritos y decodificación rápida.
+import hashlib
+import json
+
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, CommandHandler, InlineQueryHandler, MessageHandler, TypeHandler
+
+import config
+
+try:
+    import orjson
+    cargar_json = orjson.loads
+except ImportError:  # orjson es opcional
+    cargar_json = json.loads
+
+def token_secreto():
+    """Valor de X-Telegram-Bot-Api-Secret-Token: el configurado o uno derivado del token del bot
+    (igual en todos los workers, que así no se pisan al llamar a set_webhook)."""
+    if config.WEBHOOK_SECRET_TOKEN:
+        return config.WEBHOOK_SECRET_TOKEN
+    return hashlib.sha256(f"webhook:{config.TELEGRAM_TOKEN}".encode()).hexdigest()
+
+# Tipos de update que atiende cada clase de handler
+TIPOS_POR_HANDLER = {
+    CallbackQueryHandler: (Update.CALLBACK_QUERY,),
+    # Por defecto filtran con UpdateType.MESSAGES: mensajes nuevos y editados
+    CommandHandler: (Update.MESSAGE, Update.EDITED_MESSAGE),
+    MessageHandler: (Update.MESSAGE, Update.EDITED_MESSAGE),
+    InlineQueryHandler: (Update.INLINE_QUERY,),
+}
+
+def tipos_manejados(application):
+    """Tipos de update que atienden los handlers registrados (para allowed_updates).
+
+    Los TypeHandler genéricos (como la puerta de autorización) no amplían la lista.
+    Si aparece un handler desconocido, se suscriben todos los tipos por seguridad.
+    """
+    tipos = set()
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, TypeHandler):
+                continue
+            for clase, tipos_clase in TIPOS_POR_HANDLER.items():
+                if isinstance(handler, clase):
+                    tipos.update(tipos_clase)
+                    break
+            else:
+                return list(Update.ALL_TYPES)
+    return sorted(tipos)
+
+def es_tipo_manejado(payload, tipos):
+    """True si el update trae alguno de los tipos suscritos (se mira antes de crear objetos PTB)."""
+    return any(tipo in payload for tipo in tipos)
@@ -0,0 +1,113 @@
+# bot/peticiones.py
+# Capa HTTP hacia la Bot API: un pool para el tráfico interactivo (respuestas a los usuarios)
+# y otro para el masivo (notificaciones), cada uno con sus métricas.
+import asyncio
+import importlib.util
+import time
+
+from telegram import Bot
+from telegram.error import TimedOut
+from telegram.request import BaseRequest, HTTPXRequest
+
+import config
+
+# nombre del pool -> métricas (las expone /metricas)
+METRICAS_PETICIONES = {}
+
+def _version_http():
+    """HTTP/2 si se pidió (o 'auto') y el paquete h2 está instalado; si no, HTTP/1.1."""
+    if config.BOT_HTTP2 == "no":
+        return "1.1"
+    return "2" if importlib.util.find_spec("h2") else "1.1"
+
+class PeticionMedida(HTTPXRequest):
+    """HTTPXRequest con un semáforo del tamaño del pool para medir peticiones en vuelo y espera."""
+
+    def __init__(self, nombre, tamano_pool, timeout_pool, **kwargs):
+        super().__init__(
+            connection_pool_size=tamano_pool,
+            pool_timeout=timeout_pool,
+            http_version=_version_http(),
+            **kwargs,
+        )
+        self.nombre = nombre
+        self._timeout_pool = timeout_pool
+        self._cupos = asyncio.Semaphore(tamano_pool)
+        self.metricas = METRICAS_PETICIONES.setdefault(nombre, {
+            "tamano_pool": tamano_pool,
+            "http": self.http_version,
+            "en_vuelo": 0,
+            "max_en_vuelo": 0,
+            "peticiones": 0,
+            "errores": 0,
+            "esperas_agotadas": 0,
+            "espera_total_ms": 0.0,
+            "espera_max_ms": 0.0,
+            "duracion_total_ms": 0.0,
+        })
+
+    async def do_request(self, url, method, request_data=None,
+                         read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE,
+                         connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        m = self.metricas
+        espera_maxima = self._timeout_pool if pool_timeout is BaseRequest.DEFAULT_NONE else pool_timeout
+
+        inicio = time.monotonic()
+        try:
+            await asyncio.wait_for(self._cupos.acquire(), espera_maxima)
+        except asyncio.TimeoutError:
+            m["esperas_agotadas"] += 1
+            raise TimedOut(f"Pool '{self.nombre}' ocupado: no hubo conexión libre en {espera_maxima}s.")
+
+        espera_ms = (time.monotonic() - inicio) * 1000
+        m["espera_total_ms"] += espera_ms
+        m["espera_max_ms"] = max(m["espera_max_ms"], espera_ms)
+        m["en_vuelo"] += 1
+        m["max_en_vuelo"] = max(m["max_en_vuelo"], m["en_vuelo"])
+        m["peticiones"] += 1
+
+        inicio = time.monotonic()
+        try:
+            return await super().do_request(
+                url, method, request_data,
+                read_timeout=read_timeout,
+                write_timeout=write_timeout,
+                connect_timeout=connect_timeout,
+                pool_timeout=pool_timeout,
+            )
+        except Exception:
+            m["errores"] += 1
+            raise
+        finally:
+            m["duracion_total_ms"] += (time.monotonic() - inicio) * 1000
+            m["en_vuelo"] -= 1
+            self._cupos.release()
+
+def crear_peticion_interactiva():
+    """Pool para lo que el usuario está esperando: respuestas, ediciones, answer_callback_query."""
+    return PeticionMedida(
+        "interactivo",
+        tamano_pool=config.BOT_HTTP_POOL_INTERACTIVO,
+        timeout_pool=config.BOT_HTTP_TIMEOUT_POOL,
+        connect_timeout=config.BOT_HTTP_TIMEOUT_CONEXION,
+        read_timeout=config.BOT_HTTP_TIMEOUT_LECTURA,
+        write_timeout=config.BOT_HTTP_TIMEOUT_ESCRITURA,
+    )
+
+def crear_bot_masivo():
+    """Bot propio para las notificaciones: sus ráfagas no compiten con el tráfico interactivo.
+
+    Hay que llamar a initialize()/shutdown() como con cualquier Bot.
+    """
+    peticion = PeticionMedida(
+        "masivo",
+        tamano_pool=config.BOT_HTTP_POOL_MASIVO,
+        # Las notificaciones pueden esperar su turno; mejor eso que fallar
+        timeout_pool=config.BOT_HTTP_TIMEOUT_POOL_MASIVO,
+        connect_timeout=config.BOT_HTTP_TIMEOUT_CONEXION,
+        read_timeout=config.BOT_HTTP_TIMEOUT_LECTURA,
+        write_timeout=config.BOT_HTTP_TIMEOUT_ESCRITURA,
+    )
+    return Bot(config.TELEGRAM_TOKEN, base_url=config.TELEGRAM_API_BASE_URL, request=peticion)
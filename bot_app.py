@@ -1,36 +1,47 @@
 # bot_app.py
 import os
-import sys
+import asyncio
+import secrets
 import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from telegram import Update
-from telegram.ext import Application
 
 import config
+from utils.registro import configurar_registro, detener_registro
 from bot.core import TelegramBot
+from bot.peticiones import crear_bot_masivo, METRICAS_PETICIONES
+from bot.arranque import calentar
+from bot.ingreso import cargar_json, es_tipo_manejado, tipos_manejados, token_secreto
 from notificaciones import enviar_notificaciones_programadas
+from utils.limpieza_db import bucle_retencion, METRICAS_RETENCION
+from database.cambios import escuchar_cambios, METRICAS_CAMBIOS
+from database.connection import estado_pools
+from utils.perfilado import crear_perfilador
+from utils.salud import estado_disponibilidad
+from utils.actividad import bucle_actividad, volcar_pendientes, METRICAS_ACTIVIDAD
+from utils.resumen_propietario import bucle_resumen_nocturno
+from utils.programador_avisos import ProgramadorAvisos
+from utils.flujos import bucle_flujos, informe_memoria
 
 # -----------------------
 # Configurar logging
 # -----------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout)],
-)
+# Cola + hilo escritor: los handlers nunca escriben a stdout desde el event loop
+configurar_registro(config.LOG_NIVEL)
 logger = logging.getLogger(__name__)
 
 # -----------------------
 # Crear aplicación del bot
 # -----------------------
-bot_app = Application.builder().token(config.TELEGRAM_TOKEN).updater(None).build()
-
 telegram_bot = TelegramBot()
 bot_app = telegram_bot.application
+bot_masivo = crear_bot_masivo()  # Notificaciones: pool HTTP separado del interactivo
+perfilador = None  # Se crea en el lifespan si PERFIL_ACTIVO=1
+programador_avisos = None  # Se crea en el lifespan (necesita el event loop)
 
 # -----------------------
 # Configurar webhook
@@ -38,6 +49,8 @@ bot_app = telegram_bot.application
 WEBHOOK_PATH = f"/webhook/{config.TELEGRAM_TOKEN}"
 PUBLIC_URL = os.getenv("RENDER_EXTERNAL_URL", getattr(config, "PUBLIC_URL", None))
 WEBHOOK_URL = f"{PUBLIC_URL}{WEBHOOK_PATH}" if PUBLIC_URL else None
+WEBHOOK_SECRETO = token_secreto()
+TIPOS_UPDATE = tipos_manejados(bot_app)  # Solo lo que atienden los módulos cargados
 
 # -----------------------
 # Lifespan de FastAPI
@@ -46,29 +59,77 @@ WEBHOOK_URL = f"{PUBLIC_URL}{WEBHOOK_PATH}" if PUBLIC_URL else None
 async def lifespan(app: FastAPI):
     logger.info("🚀 Startup FastAPI: inicializando PTB…")
     await bot_app.initialize()
+    # Bot con su propio pool HTTP para las notificaciones
+    await bot_masivo.initialize()
+    logger.info("✅ Base de datos ya inicializada por TelegramBot")
+
+    # Calentamiento antes de registrar el webhook: pool de DB, cachés y conexiones a la Bot API
+    await calentar(bot_app.bot, bot_masivo)
+
     await bot_app.start()
     logger.info("✅ PTB iniciado")
-    logger.info("✅ Base de datos ya inicializada por TelegramBot")
+
+    # Modo de perfilado: se crea aquí para muestrear el hilo del event loop
+    global perfilador
+    perfilador = crear_perfilador()
+    if perfilador:
+        perfilador.iniciar()
+        logger.info("🔬 Modo de perfilado activo")
 
     if WEBHOOK_URL:
         try:
             await bot_app.bot.set_webhook(
                 url=WEBHOOK_URL,
-                allowed_updates=Update.ALL_TYPES,
+                allowed_updates=TIPOS_UPDATE,
+                secret_token=WEBHOOK_SECRETO,
+                max_connections=config.WEBHOOK_MAX_CONEXIONES,
             )
-            logger.info(f"🌐 Webhook configurado: {WEBHOOK_URL}")
+            logger.info("🌐 Webhook configurado: %s (tipos: %s)", WEBHOOK_URL, ', '.join(TIPOS_UPDATE))
         except Exception as e:
-            logger.error(f"⚠️ No se pudo configurar el webhook: {e}", exc_info=True)
+            logger.error("⚠️ No se pudo configurar el webhook: %s", e, exc_info=True)
+
+    # Retención de datos en segundo plano (fuera de los handlers)
+    tarea_retencion = asyncio.create_task(bucle_retencion())
+    logger.info("🧹 Motor de retención programado")
+
+    # LISTEN/NOTIFY: invalida cachés (líneas, catálogo de paquetes) cuando otro proceso escribe
+    tarea_cambios = asyncio.create_task(escuchar_cambios())
+
+    # Pasada nocturna del resumen por propietario (cambios que solo dependen de la fecha)
+    tarea_resumen = asyncio.create_task(bucle_resumen_nocturno())
+
+    # Volcado por lotes de la actividad de usuarios
+    tarea_actividad = asyncio.create_task(bucle_actividad())
+
+    # Avisos a propietarios a su hora (sustituye al cron diario de /check-notifications)
+    global programador_avisos
+    programador_avisos = ProgramadorAvisos(bot_masivo)
+    tarea_avisos = asyncio.create_task(programador_avisos.ejecutar())
+
+    # Purga de flujos de conversación abandonados
+    tarea_flujos = asyncio.create_task(bucle_flujos(bot_app))
 
     try:
         yield
     finally:
+        tarea_retencion.cancel()
+        tarea_cambios.cancel()
+        tarea_resumen.cancel()
+        tarea_actividad.cancel()
+        tarea_avisos.cancel()
+        tarea_flujos.cancel()
+        if perfilador:
+            perfilador.detener()
+        await volcar_pendientes()  # No perder la actividad acumulada
         logger.info("🛑 Shutdown FastAPI: deteniendo PTB…")
         try:
             await bot_app.stop()
+            await bot_app.shutdown()
+            await bot_masivo.shutdown()
             logger.info("✅ PTB detenido")
         except Exception as e:
-            logger.error(f"⚠️ Error al detener PTB: {e}", exc_info=True)
+            logger.error("⚠️ Error al detener PTB: %s", e, exc_info=True)
+        detener_registro()
 
 # -----------------------
 # Crear instancia FastAPI
@@ -80,45 +141,107 @@ app = FastAPI(lifespan=lifespan)
 # -----------------------
 @app.post(WEBHOOK_PATH)
 async def telegram_webhook(request: Request):
-    logger.info("📩 Webhook: solicitud recibida")
+    logger.debug("📩 Webhook: solicitud recibida")
+    # Antes de leer el cuerpo: solo Telegram conoce el token secreto
+    if not secrets.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), WEBHOOK_SECRETO):
+        return JSONResponse(content={"status": "error", "message": "No autorizado"}, status_code=403)
     try:
-        payload = await request.json()
+        payload = cargar_json(await request.body())
+        if not es_tipo_manejado(payload, TIPOS_UPDATE):
+            return JSONResponse(content={"status": "ok"})  # Tipo no atendido: ni se construye el Update
         update_obj = Update.de_json(payload, bot_app.bot)
-        await bot_app.process_update(update_obj)
+        if perfilador:
+            await perfilador.medir(update_obj, bot_app.process_update(update_obj))
+        else:
+            await bot_app.process_update(update_obj)
         return JSONResponse(content={"status": "ok"})
     except Exception as e:
-        logger.error(f"❌ Error procesando el update: {e}", exc_info=True)
+        logger.error("❌ Error procesando el update: %s", e, exc_info=True)
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
 
 # ------------------------
-# Endpoint cron-job para notificaciones
+# Barrido manual de notificaciones (los avisos diarios los envía ProgramadorAvisos)
 # ------------------------
 @app.get("/check-notifications")
 @app.post("/check-notifications")
 async def check_notifications_endpoint(request: Request):
     logger.info("🔔 [NOTIFICACIONES] Iniciando revisión programada de fechas...")
     try:
-        await enviar_notificaciones_programadas(bot_app.bot)
+        await enviar_notificaciones_programadas(bot_masivo)
         logger.info("✅ [NOTIFICACIONES] Revisión completada. Notificaciones enviadas si correspondía.")
         return JSONResponse(content={"status": "ok", "message": "Revisión de notificaciones completada"})
     except Exception as e:
-        logger.error(f"❌ [NOTIFICACIONES] Error al enviar notificaciones: {str(e)}", exc_info=True)
+        logger.error("❌ [NOTIFICACIONES] Error al enviar notificaciones: %s", e, exc_info=True)
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
 
 # -----------------------
-# Ruta de salud
+# Métricas internas (requieren TOKEN_ADMIN)
+# -----------------------
+def _es_admin(request: Request):
+    token = request.headers.get("X-Token-Admin", "")
+    return bool(config.TOKEN_ADMIN) and secrets.compare_digest(token, config.TOKEN_ADMIN)
+
+@app.get("/metricas")
+async def metricas(request: Request):
+    """Métricas de los subsistemas en segundo plano.
+
+    async: corre en el bucle de eventos, el mismo hilo que modifica los flujos, y no en el threadpool.
+    """
+    if not _es_admin(request):
+        return JSONResponse(content={"status": "error", "message": "No autorizado"}, status_code=403)
+    return {"retencion": METRICAS_RETENCION, "cambios": METRICAS_CAMBIOS, "actividad": METRICAS_ACTIVIDAD,
+            "peticiones_bot": METRICAS_PETICIONES,
+            "perfilado": perfilador.metricas if perfilador else None,
+            "avisos": programador_avisos.metricas if programador_avisos else None,
+            "flujos": informe_memoria(bot_app),
+            "pool_db": estado_pools()}
+
+# -----------------------
+# Perfiles de los updates más lentos (requiere TOKEN_ADMIN)
+# -----------------------
+@app.get("/perfiles")
+def listar_perfiles(request: Request):
+    if not _es_admin(request):
+        return JSONResponse(content={"status": "error", "message": "No autorizado"}, status_code=403)
+    if not perfilador:
+        return JSONResponse(content={"status": "error", "message": "Perfilado desactivado"}, status_code=404)
+    return {"perfiles": perfilador.listar()}
+
+@app.get("/perfiles/{indice}")
+def descargar_perfil(indice: int, request: Request):
+    if not _es_admin(request):
+        return JSONResponse(content={"status": "error", "message": "No autorizado"}, status_code=403)
+    perfil = perfilador.obtener(indice) if perfilador else None
+    if not perfil:
+        return JSONResponse(content={"status": "error", "message": "Perfil no encontrado"}, status_code=404)
+    nombre = f"perfil_{perfil['update_id']}_{perfil['formato']}.txt"
+    cabecera = f"# {perfil['update']} · {perfil['duracion_ms']} ms · {perfil['momento']}\n"
+    return PlainTextResponse(
+        cabecera + perfil["contenido"],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+    )
+
+# -----------------------
+# Ruta de salud (liveness: el proceso responde)
 # -----------------------
 @app.get("/")
 def health():
     from datetime import datetime
-    logger.info("🟢 Health check: OK")
     return {"status": "Bot activo", "timestamp": str(datetime.now())}
 
+# -----------------------
+# Disponibilidad (readiness): DB, pool, PTB. Resultado en caché unos segundos
+# -----------------------
+@app.get("/listo")
+async def listo():
+    estado = await estado_disponibilidad(bot_app)
+    return JSONResponse(content=estado, status_code=200 if estado["listo"] else 503)
+
 # -----------------------
 # Endpoint para UptimeRobot (evitar cold start)
 # -----------------------
 @app.head("/ping")
-def ping():
-    """Endpoint simple para UptimeRobot. Responde 'pong'."""
-    logger.info("🏓 Ping recibido (UptimeRobot)")
-    return {"status": "pong"}
\ No newline at end of file
+async def ping():
+    """Endpoint para UptimeRobot: 200 solo si el bot está listo (misma sonda en caché que /listo)."""
+    estado = await estado_disponibilidad(bot_app)
+    return JSONResponse(content=None, status_code=200 if estado["listo"] else 503)
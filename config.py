@@ -7,11 +7,83 @@ load_dotenv()
 # Telegram token
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
-# Lista de IDs de usuarios autorizados (puedes poner varios)
+# URL base de la Bot API (se cambia para apuntar a la Bot API falsa de herramientas/carga.py)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org/bot")
+
+# IDs de los administradores (puedes poner varios); el resto se autoriza con /autorizar
 AUTHORIZED_USERS = list(map(int, os.getenv("ADMIN_ID", "").split(","))) if os.getenv("ADMIN_ID") else []
 
+# Nivel de logging (DEBUG muestra los eventos por fila, con límite de frecuencia)
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO")
+
 # Base de datos
 DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))  # Conexiones abiertas en el arranque
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_ESPERA_SEG = float(os.getenv("DB_POOL_ESPERA_SEG", "5"))  # Espera máxima por una conexión libre
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")  # 'disable' para instancias locales de prueba
+# Réplicas de lectura (DSNs separados por comas); vacío = todo va a la primaria
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_LECTURA_PROPIA_SEG = float(os.getenv("DB_LECTURA_PROPIA_SEG", "10"))  # Tras escribir, el usuario lee de la primaria
+# Presupuestos de latencia: los handlers no esperan más que esto a la base de datos
+DB_CONNECT_TIMEOUT_SEG = int(os.getenv("DB_CONNECT_TIMEOUT_SEG", "3"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "3000"))  # Por consulta, interactivo
+DB_PRESUPUESTO_FONDO_MS = int(os.getenv("DB_PRESUPUESTO_FONDO_MS", "120000"))  # Tareas en segundo plano
+# Cortacircuitos: tras N fallos seguidos se rechaza al instante durante unos segundos
+DB_CIRCUITO_FALLOS = int(os.getenv("DB_CIRCUITO_FALLOS", "5"))
+DB_CIRCUITO_ESPERA_SEG = float(os.getenv("DB_CIRCUITO_ESPERA_SEG", "15"))
+
+# Conexiones extra a la Bot API que se abren en el calentamiento (además de la de get_me)
+CALENTAR_CONEXIONES_BOT = int(os.getenv("CALENTAR_CONEXIONES_BOT", "2"))
 
 # Para Render (FastAPI)
 PUBLIC_URL = os.getenv("RENDER_EXTERNAL_URL")  # Render lo inyecta automáticamente
+
+# Webhook: token secreto (si no se define, se deriva del token del bot) y conexiones simultáneas
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+WEBHOOK_MAX_CONEXIONES = int(os.getenv("WEBHOOK_MAX_CONEXIONES", "40"))
+
+# Conexiones HTTP hacia la Bot API (pool interactivo y pool masivo para notificaciones)
+BOT_HTTP_POOL_INTERACTIVO = int(os.getenv("BOT_HTTP_POOL_INTERACTIVO", "16"))
+BOT_HTTP_POOL_MASIVO = int(os.getenv("BOT_HTTP_POOL_MASIVO", "8"))
+BOT_HTTP_TIMEOUT_CONEXION = float(os.getenv("BOT_HTTP_TIMEOUT_CONEXION", "5"))
+BOT_HTTP_TIMEOUT_LECTURA = float(os.getenv("BOT_HTTP_TIMEOUT_LECTURA", "10"))
+BOT_HTTP_TIMEOUT_ESCRITURA = float(os.getenv("BOT_HTTP_TIMEOUT_ESCRITURA", "10"))
+BOT_HTTP_TIMEOUT_POOL = float(os.getenv("BOT_HTTP_TIMEOUT_POOL", "3"))  # Espera máxima por una conexión libre
+BOT_HTTP_TIMEOUT_POOL_MASIVO = float(os.getenv("BOT_HTTP_TIMEOUT_POOL_MASIVO", "60"))
+BOT_HTTP2 = os.getenv("BOT_HTTP2", "auto")  # 'auto' = HTTP/2 si está instalado h2; 'no' = HTTP/1.1
+
+# Sonda de disponibilidad (/listo y HEAD /ping)
+LISTO_CACHE_SEG = float(os.getenv("LISTO_CACHE_SEG", "5"))
+LISTO_TIMEOUT_DB_SEG = float(os.getenv("LISTO_TIMEOUT_DB_SEG", "3"))
+
+# Retención de datos (limpieza en segundo plano)
+RETENCION_INTERVALO_MIN = int(os.getenv("RETENCION_INTERVALO_MIN", "360"))  # Cada cuánto se ejecuta
+RETENCION_TAMANO_LOTE = int(os.getenv("RETENCION_TAMANO_LOTE", "500"))  # Filas por transacción
+RETENCION_PRESUPUESTO_SEG = float(os.getenv("RETENCION_PRESUPUESTO_SEG", "20"))  # Tiempo máximo por ejecución
+
+# Volcado por lotes de la última actividad y perfil de los usuarios
+ACTIVIDAD_INTERVALO_SEG = int(os.getenv("ACTIVIDAD_INTERVALO_SEG", "300"))
+
+# Modo de perfilado (desactivado por defecto)
+PERFIL_ACTIVO = os.getenv("PERFIL_ACTIVO", "0") == "1"
+PERFIL_FRACCION = float(os.getenv("PERFIL_FRACCION", "0.01"))  # Updates perfilados con cProfile
+PERFIL_UMBRAL_MS = float(os.getenv("PERFIL_UMBRAL_MS", "1000"))  # Desde aquí se guarda su perfil
+PERFIL_MAX_GUARDADOS = int(os.getenv("PERFIL_MAX_GUARDADOS", "20"))  # Los N más lentos
+PERFIL_INTERVALO_MUESTREO_MS = float(os.getenv("PERFIL_INTERVALO_MUESTREO_MS", "5"))
+TOKEN_ADMIN = os.getenv("TOKEN_ADMIN")  # Cabecera X-Token-Admin para los endpoints internos
+
+# Pasada nocturna del resumen por propietario (hora local, HH:MM)
+RESUMEN_HORA_NOCTURNA = os.getenv("RESUMEN_HORA_NOCTURNA", "00:05")
+
+# Importe sugerido al registrar una recarga (botón de un toque); el usuario puede escribir otro
+# o registrarla sin importe (NULL en el historial, "sin importe" en /gastos). Los paquetes usan
+# su precio del catálogo.
+MONTO_RECARGA = float(os.getenv("MONTO_RECARGA")) if os.getenv("MONTO_RECARGA") else None
+
+# Avisos a propietarios: cada uno a su hora dentro de la ventana diaria (HH:MM + minutos)
+AVISOS_VENTANA_INICIO = os.getenv("AVISOS_VENTANA_INICIO", "09:00")
+AVISOS_VENTANA_MIN = int(os.getenv("AVISOS_VENTANA_MIN", "180"))
+
+# Flujos de conversación: cada cuánto se purgan los abandonados (su vida está en utils/flujos.py)
+FLUJOS_PURGA_SEG = int(os.getenv("FLUJOS_PURGA_SEG", "60"))
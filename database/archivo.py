@@ -0,0 +1,78 @@
+# database/archivo.py
+import logging
+from database.connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+def sql_archivar(origen):
+    """INSERT que copia a recursos_archivo las filas de 'origen' (tabla, partición o CTE).
+
+    Se guarda una fila por línea y mes de vencimiento, con los recursos en arrays paralelos: una
+    cabecera de fila y una entrada de índice por línea y mes en lugar de una por recurso.
+    """
+    return f"""
+        INSERT INTO recursos_archivo
+            (mes, linea_id, propietario_id, numero_linea,
+             tipos, cantidades, fechas_activacion, fechas_vencimiento, origenes)
+        SELECT date_trunc('month', r.fecha_vencimiento)::date, r.linea_id, l.propietario_id, l.numero_linea,
+               array_agg(r.tipo_recurso ORDER BY r.fecha_vencimiento, r.id),
+               array_agg(r.cantidad ORDER BY r.fecha_vencimiento, r.id),
+               array_agg(r.fecha_activacion ORDER BY r.fecha_vencimiento, r.id),
+               array_agg(r.fecha_vencimiento ORDER BY r.fecha_vencimiento, r.id),
+               array_agg(r.origen_paquete ORDER BY r.fecha_vencimiento, r.id)
+        FROM {origen} r
+        LEFT JOIN lineas l ON l.id = r.linea_id
+        GROUP BY 1, r.linea_id, l.propietario_id, l.numero_linea
+    """
+
+def consultar_archivo(propietario_id, desde=None, hasta=None, linea_id=None):
+    """Recursos archivados de un usuario, uno por fila, entre dos meses (inclusive).
+
+    Devuelve tuplas (numero_linea, tipo_recurso, cantidad, fecha_activacion, fecha_vencimiento, origen_paquete).
+    Lanza BaseDatosNoDisponible si no hay conexión (el manejador de errores avisa al usuario).
+    """
+    conn = get_db_connection(solo_lectura=True, propietario_id=propietario_id)
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT a.numero_linea, u.tipo, u.cantidad, u.activacion, u.vencimiento, u.origen
+            FROM recursos_archivo a
+            CROSS JOIN LATERAL unnest(a.tipos, a.cantidades, a.fechas_activacion, a.fechas_vencimiento, a.origenes)
+                AS u(tipo, cantidad, activacion, vencimiento, origen)
+            WHERE a.propietario_id = %s
+              AND (%s::date IS NULL OR a.mes >= date_trunc('month', %s::date))
+              AND (%s::date IS NULL OR a.mes <= %s::date)
+              AND (%s::int IS NULL OR a.linea_id = %s)
+            ORDER BY u.vencimiento, a.numero_linea
+        """, (propietario_id, desde, desde, hasta, hasta, linea_id, linea_id))
+        filas = cur.fetchall()
+        cur.close()
+        return filas
+    finally:
+        conn.close()
+
+def resumen_archivo(propietario_id, desde=None, hasta=None):
+    """Totales archivados por mes y tipo de recurso: tuplas (mes, tipo_recurso, paquetes, cantidad_total).
+
+    Lanza BaseDatosNoDisponible si no hay conexión.
+    """
+    conn = get_db_connection(solo_lectura=True, propietario_id=propietario_id)
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT a.mes, u.tipo, COUNT(*), SUM(u.cantidad)
+            FROM recursos_archivo a
+            CROSS JOIN LATERAL unnest(a.tipos, a.cantidades) AS u(tipo, cantidad)
+            WHERE a.propietario_id = %s
+              AND (%s::date IS NULL OR a.mes >= date_trunc('month', %s::date))
+              AND (%s::date IS NULL OR a.mes <= %s::date)
+            GROUP BY a.mes, u.tipo
+            ORDER BY a.mes, u.tipo
+        """, (propietario_id, desde, desde, hasta, hasta))
+        filas = cur.fetchall()
+        cur.close()
+        return filas
+    finally:
+        conn.close()
@@ -0,0 +1,63 @@
+# database/busqueda.py
+# Búsqueda de líneas por número o alias parcial (/buscar y modo inline).
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Normalización de la búsqueda, la misma en memoria (utils/busqueda_lineas.normalizar) y en
+# la base (función normalizar_busqueda): quitar tildes con esta tabla y pasar a minúsculas.
+CON_TILDE = "ÁÀÂÄÃÉÈÊËÍÌÎÏÓÒÔÖÕÚÙÛÜÑÇáàâäãéèêëíìîïóòôöõúùûüñç"
+SIN_TILDE = "aaaaaeeeeiiiiooooouuuuncaaaaaeeeeiiiiooooouuuunc"
+
+def crear_indices_busqueda(cur):
+    """Función de normalización e índice trigram para buscar por fragmentos de número o alias.
+
+    pg_trgm puede no estar disponible (permisos del proveedor): entonces la búsqueda
+    funciona igual, solo que sin índice. El SAVEPOINT evita abortar el resto de init_db.
+    """
+    # translate antes que lower: con collation C, lower() no cambia 'É'
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION normalizar_busqueda(texto TEXT) RETURNS TEXT
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS
+        $$ SELECT lower(translate(texto, %s, %s)) $$
+    """, (CON_TILDE, SIN_TILDE))
+    cur.execute("SAVEPOINT indices_busqueda")
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cur.execute("DROP INDEX IF EXISTS idx_lineas_busqueda_trgm")
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_lineas_busqueda_normalizada_trgm
+            ON lineas USING gin (numero_linea gin_trgm_ops, normalizar_busqueda(nombre_alias) gin_trgm_ops)
+        """)
+        cur.execute("RELEASE SAVEPOINT indices_busqueda")
+    except Exception as e:
+        cur.execute("ROLLBACK TO SAVEPOINT indices_busqueda")
+        logger.warning("⚠️ Sin índice trigram para la búsqueda de líneas: %s", e)
+
+def _patron_like(texto):
+    """'%texto%' con los comodines de LIKE escapados."""
+    escapado = texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escapado}%"
+
+def buscar_lineas_db(cur, propietario_id, terminos, limite):
+    """Líneas activas del usuario cuyo número o alias contiene todos los términos.
+
+    Los términos llegan ya normalizados (utils/busqueda_lineas.normalizar) y el alias se
+    compara normalizado del mismo modo, así 'mama' encuentra 'Mamá' igual que en memoria.
+    Devuelve tuplas (id, numero_linea, nombre_alias) en orden de ID, como la caché de líneas.
+    """
+    condiciones = " AND ".join(
+        ["(numero_linea LIKE %s OR normalizar_busqueda(nombre_alias) LIKE %s)"] * len(terminos)
+    )
+    parametros = [propietario_id]
+    for termino in terminos:
+        patron = _patron_like(termino)
+        parametros += [patron, patron]
+    cur.execute(f"""
+        SELECT id, numero_linea, nombre_alias
+        FROM lineas
+        WHERE propietario_id = %s AND activa = TRUE AND {condiciones}
+        ORDER BY id
+        LIMIT %s
+    """, (*parametros, limite))
+    return cur.fetchall()
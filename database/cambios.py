@@ -0,0 +1,203 @@
+# database/cambios.py
+# Canal de cambios entre procesos: los triggers emiten NOTIFY y cada worker escucha
+# para invalidar solo las claves afectadas de sus cachés en memoria.
+import asyncio
+import logging
+
+import psycopg2
+import psycopg2.extensions
+
+from config import DATABASE_URL, DB_SSLMODE, DB_CONNECT_TIMEOUT_SEG
+
+logger = logging.getLogger(__name__)
+
+CANAL_CAMBIOS = "cambios"
+
+# Payload: '<tabla>:<propietario_id>' ('*' = todo lo de esa tabla)
+SQL_NOTIFICAR_CAMBIOS = f"""
+    CREATE OR REPLACE FUNCTION notificar_cambios_propietario() RETURNS trigger AS $$
+    BEGIN
+        -- TG_ARGV[0]: columna con el propietario en la tabla de transición
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            EXECUTE format(
+                'SELECT pg_notify(%L, %L || '':'' || p) FROM (SELECT DISTINCT %I AS p FROM nuevas WHERE %I IS NOT NULL) t',
+                '{CANAL_CAMBIOS}', TG_TABLE_NAME, TG_ARGV[0], TG_ARGV[0]);
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            EXECUTE format(
+                'SELECT pg_notify(%L, %L || '':'' || p) FROM (SELECT DISTINCT %I AS p FROM viejas WHERE %I IS NOT NULL) t',
+                '{CANAL_CAMBIOS}', TG_TABLE_NAME, TG_ARGV[0], TG_ARGV[0]);
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION notificar_cambios_recursos() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM pg_notify('{CANAL_CAMBIOS}', 'recursos_linea:' || p)
+            FROM (SELECT DISTINCT l.propietario_id AS p FROM viejas v JOIN lineas l ON l.id = v.linea_id
+                  WHERE l.propietario_id IS NOT NULL) t;
+        ELSE
+            PERFORM pg_notify('{CANAL_CAMBIOS}', 'recursos_linea:' || p)
+            FROM (SELECT DISTINCT l.propietario_id AS p FROM nuevas n JOIN lineas l ON l.id = n.linea_id
+                  WHERE l.propietario_id IS NOT NULL) t;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION notificar_cambio_usuario() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{CANAL_CAMBIOS}', 'usuarios:' || NEW.id);
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION notificar_cambios_tabla() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{CANAL_CAMBIOS}', TG_TABLE_NAME || ':*');
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+"""
+
+def _triggers_propietario(tabla, columna, funcion, eventos=("ins", "upd", "del")):
+    return "\n".join(
+        f"""
+        CREATE OR REPLACE TRIGGER trg_cambios_{tabla}_{sufijo} AFTER {evento} ON {tabla}
+            REFERENCING {transicion} FOR EACH STATEMENT EXECUTE FUNCTION {funcion}({columna});
+        """
+        for sufijo, evento, transicion in (
+            ("ins", "INSERT", "NEW TABLE AS nuevas"),
+            ("upd", "UPDATE", "NEW TABLE AS nuevas OLD TABLE AS viejas"),
+            ("del", "DELETE", "OLD TABLE AS viejas"),
+        )
+        if sufijo in eventos
+    )
+
+def crear_notificaciones_cambios(cur):
+    """Crea las funciones y triggers que publican los cambios en el canal."""
+    cur.execute(SQL_NOTIFICAR_CAMBIOS)
+    cur.execute(_triggers_propietario("lineas", "propietario_id", "notificar_cambios_propietario"))
+    cur.execute(_triggers_propietario("usuarios", "id", "notificar_cambios_propietario", ("ins", "del")))
+    # En 'usuarios' solo interesa 'activo': el volcado periódico de actividad no debe notificar
+    cur.execute("""
+        DROP TRIGGER IF EXISTS trg_cambios_usuarios_upd ON usuarios;
+        CREATE OR REPLACE TRIGGER trg_cambios_usuarios_activo
+        AFTER UPDATE OF activo ON usuarios
+        FOR EACH ROW WHEN (OLD.activo IS DISTINCT FROM NEW.activo)
+        EXECUTE FUNCTION notificar_cambio_usuario();
+    """)
+    cur.execute(_triggers_propietario("recursos_linea", "", "notificar_cambios_recursos"))
+    cur.execute("""
+        CREATE OR REPLACE TRIGGER trg_cambios_paquetes
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON paquetes
+        FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambios_tabla();
+    """)
+
+# ========================
+# Lado Python: suscriptores por tabla
+# ========================
+_invalidadores = {}
+_tareas_invalidacion = set()  # Referencias fuertes: el loop solo guarda referencias débiles a sus tareas
+
+METRICAS_CAMBIOS = {"notificaciones_recibidas": 0, "reconexiones": 0, "escuchando": False}
+
+def registrar_invalidador(tabla, funcion, bloqueante=False):
+    """Registra funcion(clave) para los cambios de 'tabla'. clave=None significa 'invalidar todo'.
+
+    Con bloqueante=True (la función consulta la base de datos) se ejecuta en un hilo,
+    fuera del event loop.
+    """
+    _invalidadores.setdefault(tabla, []).append((funcion, bloqueante))
+
+def _fin_invalidacion(tarea):
+    _tareas_invalidacion.discard(tarea)
+    if not tarea.cancelled() and tarea.exception() is not None:
+        logger.error("❌ Error al invalidar caché en segundo plano: %s", tarea.exception(),
+                     exc_info=tarea.exception())
+
+def publicar_cambio(tabla, clave=None):
+    """Aplica un cambio en este proceso (lo usan el listener y las escrituras locales)."""
+    for funcion, bloqueante in _invalidadores.get(tabla, []):
+        try:
+            if bloqueante:
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    funcion(clave)
+                else:
+                    tarea = loop.create_task(asyncio.to_thread(funcion, clave))
+                    _tareas_invalidacion.add(tarea)
+                    tarea.add_done_callback(_fin_invalidacion)
+            else:
+                funcion(clave)
+        except Exception as e:
+            logger.error("❌ Error al invalidar caché de %s: %s", tabla, e, exc_info=True)
+
+def _invalidar_todo():
+    for tabla in list(_invalidadores):
+        publicar_cambio(tabla, None)
+
+def _procesar_payload(payload):
+    tabla, _, clave = payload.partition(":")
+    if not clave or clave == "*":
+        publicar_cambio(tabla, None)
+        return
+    try:
+        publicar_cambio(tabla, int(clave))
+    except ValueError:
+        publicar_cambio(tabla, None)
+
+async def escuchar_cambios():
+    """Tarea en segundo plano: LISTEN en una conexión dedicada, integrada en el event loop."""
+    loop = asyncio.get_running_loop()
+    espera = 1
+
+    while True:
+        conn = None
+        try:
+            conn = await asyncio.to_thread(
+                psycopg2.connect, DATABASE_URL, sslmode=DB_SSLMODE, connect_timeout=DB_CONNECT_TIMEOUT_SEG
+            )
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {CANAL_CAMBIOS};")
+            cur.close()
+
+            # Lo que cambió mientras no escuchábamos es desconocido: invalidar todo
+            _invalidar_todo()
+            METRICAS_CAMBIOS["escuchando"] = True
+            logger.info("📡 Escuchando cambios de la base de datos.")
+            espera = 1
+
+            desconectado = loop.create_future()
+
+            def al_recibir():
+                try:
+                    conn.poll()
+                except Exception as e:
+                    loop.remove_reader(conn.fileno())
+                    if not desconectado.done():
+                        desconectado.set_exception(e)
+                    return
+                while conn.notifies:
+                    notificacion = conn.notifies.pop(0)
+                    METRICAS_CAMBIOS["notificaciones_recibidas"] += 1
+                    _procesar_payload(notificacion.payload)
+
+            loop.add_reader(conn.fileno(), al_recibir)
+            await desconectado
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            METRICAS_CAMBIOS["reconexiones"] += 1
+            logger.error("❌ Listener de cambios desconectado: %s. Reintentando en %ss.", e, espera)
+        finally:
+            METRICAS_CAMBIOS["escuchando"] = False
+            if conn is not None:
+                try:
+                    loop.remove_reader(conn.fileno())
+                except Exception:
+                    pass
+                conn.close()
+
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, 60)
@@ -0,0 +1,72 @@
+# database/circuito.py
+# Cortacircuitos de la base de datos: tras varios fallos seguidos se deja de intentar conectar
+# durante un rato y las peticiones fallan al instante en vez de esperar timeouts.
+import threading
+import time
+
+import psycopg2
+
+class BaseDatosNoDisponible(Exception):
+    """La base de datos no responde (circuito abierto, pool agotado o conexión fallida)."""
+
+# Errores tras los que un handler debe responder "inténtalo más tarde" (QueryCanceled,
+# el error de statement_timeout, es un OperationalError)
+ERRORES_DISPONIBILIDAD = (BaseDatosNoDisponible, psycopg2.OperationalError)
+
+class Circuito:
+    """cerrado → (umbral fallos seguidos) → abierto → (espera_seg) → semiabierto → una prueba.
+
+    Si la prueba no informa (exito/fallo/abandonar_prueba) en espera_seg, se admite otra.
+    """
+
+    def __init__(self, umbral, espera_seg):
+        self.umbral = umbral
+        self.espera_seg = espera_seg
+        self.estado = "cerrado"
+        self._fallos_seguidos = 0
+        self._abierto_en = 0.0
+        self._prueba_en_curso = False
+        self._prueba_desde = 0.0
+        self._candado = threading.Lock()
+        self.metricas = {"aperturas": 0, "rechazadas": 0}
+
+    def permitir(self):
+        """True si se puede intentar la operación. En semiabierto solo pasa una prueba a la vez."""
+        with self._candado:
+            if self.estado == "cerrado":
+                return True
+            if self.estado == "abierto" and time.monotonic() - self._abierto_en >= self.espera_seg:
+                self.estado = "semiabierto"
+            if self.estado == "semiabierto":
+                ahora = time.monotonic()
+                if not self._prueba_en_curso or ahora - self._prueba_desde >= self.espera_seg:
+                    self._prueba_en_curso = True
+                    self._prueba_desde = ahora
+                    return True
+            self.metricas["rechazadas"] += 1
+            return False
+
+    def exito(self):
+        with self._candado:
+            self.estado = "cerrado"
+            self._fallos_seguidos = 0
+            self._prueba_en_curso = False
+
+    def fallo(self):
+        with self._candado:
+            self._fallos_seguidos += 1
+            self._prueba_en_curso = False
+            if self.estado == "semiabierto" or self._fallos_seguidos >= self.umbral:
+                if self.estado != "abierto":
+                    self.metricas["aperturas"] += 1
+                self.estado = "abierto"
+                self._abierto_en = time.monotonic()
+
+    def abandonar_prueba(self):
+        """La prueba se perdió sin resultado (p. ej. la conexión no se devolvió): admitir otra."""
+        with self._candado:
+            self._prueba_en_curso = False
+
+    def describir(self):
+        with self._candado:
+            return {"estado": self.estado, "fallos_seguidos": self._fallos_seguidos, **self.metricas}
@@ -1,28 +1,161 @@
 # database/connection.py
-import psycopg2
+import itertools
+import threading
+import time
 from psycopg2.extras import RealDictCursor
-from config import DATABASE_URL
+from config import (DATABASE_URL, DATABASE_REPLICA_URLS, AUTHORIZED_USERS, DB_POOL_MIN, DB_POOL_MAX,
+                    DB_POOL_ESPERA_SEG, DB_SSLMODE, DB_LECTURA_PROPIA_SEG, DB_CONNECT_TIMEOUT_SEG,
+                    DB_STATEMENT_TIMEOUT_MS, DB_CIRCUITO_FALLOS, DB_CIRCUITO_ESPERA_SEG)
+from database.circuito import BaseDatosNoDisponible, Circuito
+from database.pool import PoolConexiones
+from database.particiones import crear_tabla_recursos, asegurar_particiones
+from database.resumen import crear_resumen_propietario
+from database.cambios import crear_notificaciones_cambios, registrar_invalidador
+from database.gastos import crear_historial_gastos
+from database.busqueda import crear_indices_busqueda
+from database.preparadas import preparar
+from utils import reloj
 import logging
 
 logger = logging.getLogger(__name__)
 
-def get_db_connection():
-    """Devuelve una conexión activa a la base de datos."""
+_pool = None
+_pools_replica = None
+_pool_lock = threading.Lock()
+_turno_replica = itertools.count()
+
+# Lectura de lo propio: tras una escritura, las lecturas de ese usuario van a la primaria un rato
+_ultima_escritura = {}  # propietario_id -> time.monotonic()
+_ultima_escritura_global = 0.0
+METRICAS_LECTURAS = {"replica": 0, "primaria_por_escritura": 0, "replica_fallida": 0}
+
+def _crear_pool(dsn, minimo):
+    return PoolConexiones(
+        dsn, minimo, DB_POOL_MAX, DB_POOL_ESPERA_SEG,
+        circuito=Circuito(DB_CIRCUITO_FALLOS, DB_CIRCUITO_ESPERA_SEG),
+        al_conectar=preparar,
+        sslmode=DB_SSLMODE,
+        connect_timeout=DB_CONNECT_TIMEOUT_SEG,
+        options=f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+    )
+
+def obtener_pool():
+    """Pool de conexiones de la primaria (se crea en el primer uso, sin conectar todavía)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _crear_pool(DATABASE_URL, DB_POOL_MIN)
+    return _pool
+
+def obtener_pools_replica():
+    """Un pool por réplica configurada (lista vacía si no hay)."""
+    global _pools_replica
+    if _pools_replica is None:
+        with _pool_lock:
+            if _pools_replica is None:
+                _pools_replica = [_crear_pool(url, 0) for url in DATABASE_REPLICA_URLS]
+    return _pools_replica
+
+def marcar_escritura(propietario_id=None):
+    """Anota que se escribieron datos del usuario (None = de cualquiera) tras el commit."""
+    global _ultima_escritura_global
+    ahora = time.monotonic()
+    if propietario_id is None:
+        _ultima_escritura_global = ahora
+        return
+    _ultima_escritura[propietario_id] = ahora
+    if len(_ultima_escritura) > 10_000:
+        # Poda de las marcas ya vencidas para que el dict no crezca sin límite
+        for clave, momento in list(_ultima_escritura.items()):
+            if ahora - momento >= DB_LECTURA_PROPIA_SEG:
+                _ultima_escritura.pop(clave, None)
+
+def _escritura_reciente(propietario_id):
+    ahora = time.monotonic()
+    if ahora - _ultima_escritura_global < DB_LECTURA_PROPIA_SEG:
+        return True
+    momento = _ultima_escritura.get(propietario_id)
+    return momento is not None and ahora - momento < DB_LECTURA_PROPIA_SEG
+
+# Escrituras de otros procesos (llegan por NOTIFY antes que la recarga de las cachés)
+registrar_invalidador("lineas", marcar_escritura)
+registrar_invalidador("recursos_linea", marcar_escritura)
+
+def _conexion_replica():
+    pools = obtener_pools_replica()
+    inicio = next(_turno_replica)
+    for i in range(len(pools)):
+        try:
+            return pools[(inicio + i) % len(pools)].obtener()
+        except Exception as e:
+            METRICAS_LECTURAS["replica_fallida"] += 1
+            logger.warning("⚠️ Réplica no disponible, se prueba la siguiente: %s", e)
+    return None
+
+def _aplicar_reloj(conn):
+    """Con el reloj fijado, la sesión usa el mismo día en SQL (hoy_app()). En producción no hace nada.
+
+    app.hoy vive lo que la sesión y las del pool se reutilizan: si el reloj se liberó después de
+    fijarlo en esta conexión, se vacía (hoy_app() vuelve a CURRENT_DATE).
+    """
+    fijado = reloj.fijado()
+    if fijado or getattr(conn, "reloj_fijado", False):
+        cur = conn.cursor()
+        cur.execute("SELECT set_config('app.hoy', %s, false)", (reloj.hoy().isoformat() if fijado else "",))
+        cur.close()
+        conn.commit()
+        conn.reloj_fijado = fijado
+    return conn
+
+def get_db_connection(solo_lectura=False, propietario_id=None):
+    """Devuelve una conexión activa del pool; conn.close() la devuelve al pool.
+
+    Con solo_lectura=True la consulta puede ir a una réplica, salvo que el usuario
+    (propietario_id) haya escrito hace menos de DB_LECTURA_PROPIA_SEG.
+    Lanza BaseDatosNoDisponible si no hay conexión (circuito abierto, pool agotado, caída).
+    """
+    if solo_lectura and DATABASE_REPLICA_URLS:
+        if _escritura_reciente(propietario_id):
+            METRICAS_LECTURAS["primaria_por_escritura"] += 1
+        else:
+            conn = _conexion_replica()
+            if conn:
+                METRICAS_LECTURAS["replica"] += 1
+                return _aplicar_reloj(conn)
     try:
-        conn = psycopg2.connect(DATABASE_URL, sslmode='require')
-        return conn
+        return _aplicar_reloj(obtener_pool().obtener())
+    except BaseDatosNoDisponible:
+        raise
     except Exception as e:
-        logger.error(f"❌ Error al conectar a la base de datos: {e}")
-        return None
+        logger.error("❌ Error al conectar a la base de datos: %s", e)
+        raise BaseDatosNoDisponible(str(e)) from e
+
+def fijar_presupuesto(conn, milisegundos):
+    """statement_timeout propio para esta conexión (0 = sin límite); el pool lo restaura al devolverla."""
+    cur = conn.cursor()
+    cur.execute("SET statement_timeout = %s", (int(milisegundos),))
+    cur.close()
+    conn.presupuesto_cambiado = True
+
+def estado_pools():
+    """Estado del pool de la primaria y de cada réplica (para /metricas)."""
+    return {
+        "primaria": obtener_pool().estado(),
+        "replicas": [pool.estado() for pool in obtener_pools_replica()],
+        "lecturas": METRICAS_LECTURAS,
+    }
 
 def init_db():
     """Inicializa las tablas y columnas básicas si no existen."""
-    conn = get_db_connection()
-    if not conn:
+    try:
+        conn = get_db_connection()
+    except BaseDatosNoDisponible:
         return
 
     try:
         cur = conn.cursor()
+        fijar_presupuesto(conn, 0)  # Migraciones: sin límite por consulta
 
         # ========================
         # TABLA: usuarios
@@ -38,6 +171,13 @@ def init_db():
             );
         """)
 
+        # Los administradores (ADMIN_ID) siempre existen y están activos
+        cur.executemany("""
+            INSERT INTO usuarios (id, activo) VALUES (%s, TRUE)
+            ON CONFLICT (id) DO UPDATE SET activo = TRUE
+            WHERE usuarios.activo IS DISTINCT FROM TRUE;
+        """, [(admin_id,) for admin_id in AUTHORIZED_USERS])
+
         # ========================
         # TABLA: lineas
         # ========================
@@ -55,22 +195,157 @@ def init_db():
             );
         """)
 
+        # Búsqueda por fragmento de número o alias (/buscar, modo inline)
+        crear_indices_busqueda(cur)
+
         # ========================
-        # TABLA: recursos_linea
+        # TABLA: recursos_linea (particionada por mes de vencimiento)
+        # ========================
+        crear_tabla_recursos(cur)
+        asegurar_particiones(cur)
+
         # ========================
+        # TABLA: recursos_archivo (histórico frío, solo inserciones)
+        # ========================
+        # Sin FK a lineas: el histórico sobrevive a la línea
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS recursos_linea (
-                id SERIAL PRIMARY KEY,
-                linea_id INTEGER REFERENCES lineas(id) ON DELETE CASCADE,
+            CREATE TABLE IF NOT EXISTS recursos_archivo (
+                id BIGSERIAL PRIMARY KEY,
+                mes DATE NOT NULL,
+                linea_id INTEGER NOT NULL,
+                propietario_id BIGINT,
+                numero_linea VARCHAR(20),
+                tipos TEXT[] NOT NULL,
+                cantidades DECIMAL(10,2)[] NOT NULL,
+                fechas_activacion DATE[] NOT NULL,
+                fechas_vencimiento DATE[] NOT NULL,
+                origenes TEXT[] NOT NULL,
+                archivado_en TIMESTAMP DEFAULT NOW()
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_recursos_archivo_propietario
+            ON recursos_archivo (propietario_id, mes);
+        """)
+
+        # ========================
+        # TABLA: movimientos_recurso (libro de asignaciones y consumos, solo inserciones)
+        # ========================
+        # Sin FK a lineas: el libro sobrevive a la línea (como recursos_archivo e historial_gastos)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS movimientos_recurso (
+                id BIGSERIAL PRIMARY KEY,
+                linea_id INTEGER NOT NULL,
                 tipo_recurso VARCHAR(20) NOT NULL,
+                tipo_movimiento VARCHAR(20) NOT NULL,
                 cantidad DECIMAL(10,2) NOT NULL,
-                fecha_activacion DATE NOT NULL,
+                fecha DATE NOT NULL,
+                origen VARCHAR(255),
+                creado_en TIMESTAMP DEFAULT NOW()
+            );
+        """)
+        cur.execute("ALTER TABLE movimientos_recurso DROP CONSTRAINT IF EXISTS movimientos_recurso_linea_id_fkey")
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_movimientos_recurso_linea
+            ON movimientos_recurso (linea_id, id);
+        """)
+
+        # ========================
+        # TABLA: saldos_linea (saldo actual por línea y tipo, mantenido junto a cada movimiento)
+        # ========================
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS saldos_linea (
+                linea_id INTEGER NOT NULL REFERENCES lineas(id) ON DELETE CASCADE,
+                tipo_recurso VARCHAR(20) NOT NULL,
+                asignado DECIMAL(10,2) NOT NULL,
+                consumido DECIMAL(10,2) NOT NULL DEFAULT 0,
+                saldo DECIMAL(10,2) NOT NULL,
                 fecha_vencimiento DATE NOT NULL,
-                origen_paquete VARCHAR(255),
-                activo BOOLEAN DEFAULT TRUE
+                ultimo_movimiento_id BIGINT,
+                actualizado_en TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (linea_id, tipo_recurso)
+            );
+        """)
+
+        # Primera vez: partir de los recursos activos existentes, con su asignación en el libro
+        # (así la suma de movimientos de cada línea y tipo coincide con su saldo)
+        cur.execute("""
+            WITH vigentes AS (
+                SELECT DISTINCT ON (linea_id, tipo_recurso)
+                       linea_id, tipo_recurso, cantidad, fecha_activacion, fecha_vencimiento, origen_paquete
+                FROM recursos_linea
+                WHERE activo = TRUE AND NOT EXISTS (SELECT 1 FROM saldos_linea)
+                ORDER BY linea_id, tipo_recurso, fecha_vencimiento DESC
+            ), movimientos AS (
+                INSERT INTO movimientos_recurso (linea_id, tipo_recurso, tipo_movimiento, cantidad, fecha, origen)
+                SELECT linea_id, tipo_recurso, 'asignacion', cantidad, fecha_activacion, origen_paquete
+                FROM vigentes
+                RETURNING id, linea_id, tipo_recurso
+            )
+            INSERT INTO saldos_linea (linea_id, tipo_recurso, asignado, saldo, fecha_vencimiento, ultimo_movimiento_id)
+            SELECT v.linea_id, v.tipo_recurso, v.cantidad, v.cantidad, v.fecha_vencimiento, m.id
+            FROM vigentes v
+            JOIN movimientos m USING (linea_id, tipo_recurso)
+            ON CONFLICT DO NOTHING;
+        """)
+        # Saldos sembrados por versiones anteriores sin su asignación en el libro
+        cur.execute("""
+            INSERT INTO movimientos_recurso (linea_id, tipo_recurso, tipo_movimiento, cantidad, fecha, origen)
+            SELECT s.linea_id, s.tipo_recurso, 'asignacion', s.asignado, s.actualizado_en::date, 'saldo inicial'
+            FROM saldos_linea s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM movimientos_recurso m
+                WHERE m.linea_id = s.linea_id AND m.tipo_recurso = s.tipo_recurso
+                  AND m.tipo_movimiento = 'asignacion'
             );
         """)
 
+        # ========================
+        # TABLA: paquetes (catálogo)
+        # ========================
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS paquetes (
+                id INTEGER PRIMARY KEY,
+                descripcion VARCHAR(255) NOT NULL,
+                precio DECIMAL(10,2) NOT NULL,
+                datos_gb DECIMAL(10,2) NOT NULL DEFAULT 0,
+                minutos DECIMAL(10,2) NOT NULL DEFAULT 0,
+                sms DECIMAL(10,2) NOT NULL DEFAULT 0,
+                dias_vigencia INTEGER NOT NULL DEFAULT 35,
+                activo BOOLEAN DEFAULT TRUE,
+                actualizado_en TIMESTAMP DEFAULT NOW()
+            );
+        """)
+
+        # Marca de tiempo de la última modificación de cada paquete
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION tocar_actualizado_en() RETURNS trigger AS $$
+            BEGIN
+                NEW.actualizado_en := NOW();
+                RETURN NEW;
+            END $$ LANGUAGE plpgsql;
+        """)
+        cur.execute("""
+            CREATE OR REPLACE TRIGGER trg_paquetes_actualizado_en
+            BEFORE UPDATE ON paquetes
+            FOR EACH ROW EXECUTE FUNCTION tocar_actualizado_en();
+        """)
+
+        # ========================
+        # TABLA: resumen_propietario (agregado por usuario, mantenido por triggers)
+        # ========================
+        crear_resumen_propietario(cur)
+
+        # ========================
+        # TABLAS: historial_gastos (solo inserciones) y gastos_mensuales (totales por trigger)
+        # ========================
+        crear_historial_gastos(cur)
+
+        # ========================
+        # NOTIFY en el canal 'cambios' (invalidación de cachés entre procesos)
+        # ========================
+        crear_notificaciones_cambios(cur)
+
         # ========================
         # VERIFICAR Y AGREGAR COLUMNAS FALTANTES (si se añaden en el futuro)
         # ========================
@@ -105,10 +380,11 @@ def init_db():
         """)
 
         conn.commit()
+        preparar(conn)  # En una base nueva las tablas no existían al abrir esta conexión
         logger.info("✅ Base de datos inicializada. Tablas y columnas verificadas.")
 
     except Exception as e:
-        logger.error(f"❌ Error al inicializar la base de datos: {e}")
+        logger.error("❌ Error al inicializar la base de datos: %s", e)
         conn.rollback()
     finally:
         cur.close()
@@ -0,0 +1,103 @@
+# database/gastos.py
+# Historial de gastos (recargas y compras de paquetes, solo inserciones) y totales mensuales
+# por usuario y por línea, mantenidos por un trigger en cada inserción. Un gasto de importe
+# desconocido (monto NULL) cuenta como operación y en 'sin_importe', no en el total.
+from config import MONTO_RECARGA
+
+# Fila de gastos_mensuales con el total del usuario (todas sus líneas)
+LINEA_TOTAL_PROPIETARIO = 0
+
+SQL_TRIGGERS_GASTOS = f"""
+    CREATE OR REPLACE FUNCTION trg_gastos_mensuales() RETURNS trigger AS $$
+    BEGIN
+        -- Un solo INSERT .. ON CONFLICT por sentencia: filas por línea y la del total del usuario
+        INSERT INTO gastos_mensuales AS g (propietario_id, mes, linea_id, tipo, total, operaciones, sin_importe)
+        SELECT propietario_id, mes,
+               CASE WHEN GROUPING(linea_id) = 1 THEN {LINEA_TOTAL_PROPIETARIO} ELSE linea_id END,
+               tipo, COALESCE(SUM(monto), 0), COUNT(*), COUNT(*) FILTER (WHERE monto IS NULL)
+        FROM (
+            SELECT propietario_id, date_trunc('month', fecha)::date AS mes, linea_id, tipo, monto
+            FROM nuevas
+            WHERE propietario_id IS NOT NULL
+        ) n
+        GROUP BY GROUPING SETS ((propietario_id, mes, linea_id, tipo), (propietario_id, mes, tipo))
+        ON CONFLICT (propietario_id, mes, linea_id, tipo) DO UPDATE
+        SET total = g.total + EXCLUDED.total,
+            operaciones = g.operaciones + EXCLUDED.operaciones,
+            sin_importe = g.sin_importe + EXCLUDED.sin_importe;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION trg_historial_solo_inserciones() RETURNS trigger AS $$
+    BEGIN
+        RAISE EXCEPTION 'historial_gastos es de solo inserciones (los totales mensuales dependen de ello)';
+    END $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE TRIGGER trg_gastos_mensuales_ins AFTER INSERT ON historial_gastos
+        REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION trg_gastos_mensuales();
+    CREATE OR REPLACE TRIGGER trg_historial_gastos_inmutable BEFORE UPDATE OR DELETE ON historial_gastos
+        FOR EACH STATEMENT EXECUTE FUNCTION trg_historial_solo_inserciones();
+"""
+
+def crear_historial_gastos(cur):
+    """Crea el historial, la tabla de totales mensuales y sus triggers (llamar después de 'paquetes')."""
+    # Sin FK a lineas: el historial sobrevive a la línea (como recursos_archivo)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS historial_gastos (
+            id BIGSERIAL PRIMARY KEY,
+            propietario_id BIGINT,
+            linea_id INTEGER NOT NULL,
+            numero_linea VARCHAR(20),
+            tipo VARCHAR(10) NOT NULL,  -- 'recarga' | 'paquete'
+            concepto VARCHAR(255),
+            monto DECIMAL(10,2),  -- NULL: importe desconocido
+            fecha DATE NOT NULL,
+            creado_en TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    cur.execute("ALTER TABLE historial_gastos ALTER COLUMN monto DROP NOT NULL")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_historial_gastos_propietario
+        ON historial_gastos (propietario_id, fecha)
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS gastos_mensuales (
+            propietario_id BIGINT NOT NULL,
+            mes DATE NOT NULL,
+            linea_id INTEGER NOT NULL,  -- 0 = total del usuario
+            tipo VARCHAR(10) NOT NULL,
+            total DECIMAL(12,2) NOT NULL,
+            operaciones INTEGER NOT NULL,
+            sin_importe INTEGER NOT NULL DEFAULT 0,  -- operaciones con monto NULL
+            PRIMARY KEY (propietario_id, mes, linea_id, tipo)
+        )
+    """)
+    cur.execute("ALTER TABLE gastos_mensuales ADD COLUMN IF NOT EXISTS sin_importe INTEGER NOT NULL DEFAULT 0")
+    cur.execute(SQL_TRIGGERS_GASTOS)
+
+    # Primera vez: lo que se puede reconstruir. De cada línea solo se conoce su última recarga;
+    # las compras salen de las asignaciones del libro de movimientos. Una compra anota todos sus
+    # componentes en la misma transacción (mismo creado_en): una fila por cada una, aunque se
+    # repita el paquete el mismo día. Sin importe conocido, monto NULL en lugar de inventar 0.
+    cur.execute("SELECT EXISTS (SELECT 1 FROM historial_gastos)")
+    if cur.fetchone()[0]:
+        return
+    cur.execute("""
+        INSERT INTO historial_gastos (propietario_id, linea_id, numero_linea, tipo, concepto, monto, fecha)
+        SELECT propietario_id, id, numero_linea, 'recarga', 'Recarga', %s::decimal, fecha_ultima_recarga
+        FROM lineas
+        WHERE fecha_ultima_recarga IS NOT NULL
+    """, (MONTO_RECARGA,))
+    cur.execute("""
+        INSERT INTO historial_gastos (propietario_id, linea_id, numero_linea, tipo, concepto, monto, fecha)
+        SELECT l.propietario_id, m.linea_id, l.numero_linea, 'paquete', m.origen, p.precio, m.fecha
+        FROM (
+            SELECT MIN(id) AS id, linea_id, fecha, origen
+            FROM movimientos_recurso
+            WHERE tipo_movimiento = 'asignacion' AND origen IS DISTINCT FROM 'saldo inicial'
+            GROUP BY linea_id, fecha, origen, creado_en
+        ) m
+        JOIN lineas l ON l.id = m.linea_id
+        LEFT JOIN LATERAL (SELECT precio FROM paquetes WHERE descripcion = m.origen LIMIT 1) p ON TRUE
+        ORDER BY m.id
+    """)
@@ -0,0 +1,173 @@
+# database/particiones.py
+import logging
+from datetime import date, timedelta
+
+from utils import reloj
+
+logger = logging.getLogger(__name__)
+
+# recursos_linea está particionada por mes de fecha_vencimiento
+TABLA_PARTICIONADA = "recursos_linea"
+PARTICION_DEFAULT = "recursos_linea_default"
+PREFIJO_PARTICION = "recursos_linea_p"  # recursos_linea_pAAAAMM
+
+# Recursos vencidos hace más de ~4 meses dejan de considerarse: se archivan (también los que
+# seguían marcados como activos) y su partición se elimina
+DIAS_RETENCION_RECURSOS = 120
+
+# Particiones que se crean por adelantado (además del mes actual)
+MESES_ADELANTE = 3
+
+def inicio_mes(fecha):
+    return fecha.replace(day=1)
+
+def mes_siguiente(fecha):
+    return (fecha.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def fecha_limite_retencion(hoy=None):
+    """Límite de retención y cota inferior de fecha_vencimiento para consultas de recursos activos.
+
+    Añadirlo a las consultas permite a Postgres descartar las particiones antiguas. Lo que queda
+    por debajo lo archiva la retención, activo o no (ver eliminar_particion): el saldo de la línea
+    sigue en saldos_linea y el detalle en recursos_archivo.
+    """
+    if hoy is None:
+        hoy = reloj.hoy()
+    return hoy - timedelta(days=DIAS_RETENCION_RECURSOS)
+
+def nombre_particion(mes):
+    return f"{PREFIJO_PARTICION}{mes.strftime('%Y%m')}"
+
+def crear_particion(cur, mes):
+    """Crea la partición del mes indicado si no existe.
+
+    Las filas de ese rango que hubieran caído en la partición default se mueven a la nueva
+    antes de adjuntarla (si no, Postgres rechaza el ATTACH).
+    """
+    nombre = nombre_particion(mes)
+    desde, hasta = mes, mes_siguiente(mes)
+
+    cur.execute("SELECT to_regclass(%s)", (nombre,))
+    if cur.fetchone()[0]:
+        return False
+
+    cur.execute(f"CREATE TABLE {nombre} (LIKE {TABLA_PARTICIONADA} INCLUDING DEFAULTS)")
+    cur.execute(f"""
+        WITH movidas AS (
+            DELETE FROM {PARTICION_DEFAULT}
+            WHERE fecha_vencimiento >= %s AND fecha_vencimiento < %s
+            RETURNING *
+        )
+        INSERT INTO {nombre} SELECT * FROM movidas
+    """, (desde, hasta))
+    cur.execute(
+        f"ALTER TABLE {TABLA_PARTICIONADA} ATTACH PARTITION {nombre} FOR VALUES FROM (%s) TO (%s)",
+        (desde, hasta),
+    )
+    logger.info("🗂️ Partición %s creada (%s → %s).", nombre, desde, hasta)
+    return True
+
+def asegurar_particiones(cur, desde=None, hasta=None):
+    """Garantiza una partición por mes entre 'desde' y 'hasta' (por defecto: mes actual + MESES_ADELANTE)."""
+    if desde is None:
+        desde = reloj.hoy()
+    if hasta is None:
+        hasta = desde
+        for _ in range(MESES_ADELANTE):
+            hasta = mes_siguiente(hasta)
+
+    creadas = 0
+    mes = inicio_mes(desde)
+    while mes <= hasta:
+        if crear_particion(cur, mes):
+            creadas += 1
+        mes = mes_siguiente(mes)
+    return creadas
+
+def particiones_vencidas(cur, fecha_limite):
+    """Particiones mensuales cuyo rango termina antes de 'fecha_limite' (más antiguas primero)."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass AND c.relname LIKE %s
+        ORDER BY c.relname
+    """, (TABLA_PARTICIONADA, PREFIJO_PARTICION + "%"))
+
+    vencidas = []
+    for (nombre,) in cur.fetchall():
+        sufijo = nombre[len(PREFIJO_PARTICION):]
+        try:
+            mes = date(int(sufijo[:4]), int(sufijo[4:6]), 1)
+        except ValueError:
+            continue
+        if mes_siguiente(mes) <= fecha_limite:
+            vencidas.append(nombre)
+    return vencidas
+
+def eliminar_particion(cur, nombre):
+    """Separa y elimina una partición completa (ya archivada). Devuelve (filas, activas).
+
+    'activas' son las que seguían marcadas como activas (nadie compró otro recurso del mismo tipo):
+    vencieron hace más de DIAS_RETENCION_RECURSOS días y se retiran con el resto, ya que las
+    consultas de activos no miran por debajo de fecha_limite_retencion().
+    """
+    cur.execute("SET LOCAL lock_timeout = '2s'")
+    cur.execute(f"SELECT COUNT(*), COUNT(*) FILTER (WHERE activo) FROM {nombre}")
+    filas, activas = cur.fetchone()
+    cur.execute(f"ALTER TABLE {TABLA_PARTICIONADA} DETACH PARTITION {nombre}")
+    cur.execute(f"DROP TABLE {nombre}")
+    return filas, activas
+
+def crear_tabla_recursos(cur):
+    """Crea recursos_linea particionada, migrando la tabla antigua (no particionada) si existe."""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (TABLA_PARTICIONADA,))
+    fila = cur.fetchone()
+    if fila and fila[0] == 'p':
+        return
+
+    migrar = fila is not None
+    if migrar:
+        cur.execute(f"ALTER TABLE {TABLA_PARTICIONADA} RENAME TO recursos_linea_antigua")
+        # El nombre del índice de la PK es global al esquema: liberarlo para la tabla nueva
+        cur.execute("ALTER TABLE recursos_linea_antigua RENAME CONSTRAINT recursos_linea_pkey TO recursos_linea_antigua_pkey")
+
+    cur.execute(f"""
+        CREATE TABLE {TABLA_PARTICIONADA} (
+            id SERIAL,
+            linea_id INTEGER REFERENCES lineas(id) ON DELETE CASCADE,
+            tipo_recurso VARCHAR(20) NOT NULL,
+            cantidad DECIMAL(10,2) NOT NULL,
+            fecha_activacion DATE NOT NULL,
+            fecha_vencimiento DATE NOT NULL,
+            origen_paquete VARCHAR(255),
+            activo BOOLEAN DEFAULT TRUE,
+            PRIMARY KEY (id, fecha_vencimiento)
+        ) PARTITION BY RANGE (fecha_vencimiento)
+    """)
+    cur.execute(f"CREATE TABLE {PARTICION_DEFAULT} PARTITION OF {TABLA_PARTICIONADA} DEFAULT")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_recursos_linea_linea ON {TABLA_PARTICIONADA} (linea_id)")
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_recursos_linea_activos
+        ON {TABLA_PARTICIONADA} (linea_id, tipo_recurso) WHERE activo = TRUE
+    """)
+
+    if not migrar:
+        return
+
+    # Copiar los datos existentes y repartirlos en sus particiones mensuales
+    cur.execute(f"""
+        INSERT INTO {TABLA_PARTICIONADA}
+            (id, linea_id, tipo_recurso, cantidad, fecha_activacion, fecha_vencimiento, origen_paquete, activo)
+        SELECT id, linea_id, tipo_recurso, cantidad, fecha_activacion, fecha_vencimiento, origen_paquete, activo
+        FROM recursos_linea_antigua
+    """)
+    cur.execute("SELECT MIN(fecha_vencimiento), MAX(fecha_vencimiento), MAX(id) FROM recursos_linea_antigua")
+    minima, maxima, max_id = cur.fetchone()
+    if minima:
+        # Las particiones ya vencidas las elimina el motor de retención en su próxima pasada
+        asegurar_particiones(cur, minima, maxima)
+    if max_id:
+        cur.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)", (TABLA_PARTICIONADA, max_id))
+    cur.execute("DROP TABLE recursos_linea_antigua")
+    logger.info("✅ Tabla 'recursos_linea' migrada a tabla particionada por mes.")
@@ -0,0 +1,201 @@
+# database/pool.py
+# Pool de conexiones propio: get_db_connection() entrega una conexión del pool y
+# conn.close() la devuelve, así el código existente no cambia.
+import threading
+import time
+import weakref
+from collections import deque
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+from database.circuito import BaseDatosNoDisponible, Circuito
+
+class CursorVigilado(psycopg2.extensions.cursor):
+    """Anota en la conexión los errores de disponibilidad (statement_timeout, caída) para el circuito."""
+
+    def _anotar(self, error):
+        # Un lock_timeout es contención puntual, no una base de datos lenta
+        if not isinstance(error, psycopg2.errors.LockNotAvailable):
+            self.connection.error_disponibilidad = True
+
+    def execute(self, sql, params=None):
+        try:
+            return super().execute(sql, params)
+        except psycopg2.OperationalError as e:
+            self._anotar(e)
+            raise
+
+    def executemany(self, sql, params_seq):
+        try:
+            return super().executemany(sql, params_seq)
+        except psycopg2.OperationalError as e:
+            self._anotar(e)
+            raise
+
+class ConexionAgrupada(psycopg2.extensions.connection):
+    """Conexión cuyo close() la devuelve al pool en lugar de cerrarla."""
+
+    pool = None
+    en_pool = False
+    presupuesto_cambiado = False  # statement_timeout distinto del de la sesión (se restaura al devolver)
+    error_disponibilidad = False  # Alguna consulta falló por timeout o caída mientras estaba prestada
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.devolver(self)
+        else:
+            super().close()
+
+    def cerrar_de_verdad(self):
+        psycopg2.extensions.connection.close(self)
+
+class PoolAgotado(BaseDatosNoDisponible):
+    """No hubo una conexión libre dentro del tiempo de espera."""
+
+class PoolConexiones:
+    def __init__(self, dsn, minimo, maximo, espera_seg, circuito=None, al_conectar=None, **kwargs):
+        self.dsn = dsn
+        self.minimo = minimo
+        self.maximo = maximo
+        self.espera_seg = espera_seg
+        self.circuito = circuito or Circuito(umbral=5, espera_seg=30)
+        self.al_conectar = al_conectar  # al_conectar(conn) en cada conexión nueva (p. ej. PREPARE)
+        self.kwargs = kwargs
+        self._libres = deque()
+        self._creadas = 0
+        self._condicion = threading.Condition()
+        self.metricas = {"esperas": 0, "esperas_agotadas": 0, "espera_max_ms": 0.0, "descartadas": 0, "perdidas": 0}
+
+    def _crear(self):
+        try:
+            conn = psycopg2.connect(self.dsn, connection_factory=ConexionAgrupada,
+                                    **{"cursor_factory": CursorVigilado, **self.kwargs})
+        except Exception:
+            self.circuito.fallo()
+            raise
+        self.circuito.exito()
+        conn.pool = self
+        # Si una conexión prestada se pierde sin close(), el recolector libera su cupo
+        conn.finalizador = weakref.finalize(conn, self._liberar_cupo_perdido)
+        conn.finalizador.atexit = False
+        if self.al_conectar:
+            self.al_conectar(conn)
+        return conn
+
+    def _liberar_cupo_perdido(self):
+        with self._condicion:
+            self._creadas -= 1
+            self.metricas["perdidas"] += 1
+            self._condicion.notify()
+        # Si era la prueba del circuito semiabierto, nunca informará
+        self.circuito.abandonar_prueba()
+
+    def llenar_minimo(self):
+        """Abre conexiones hasta tener 'minimo' (para el arranque en caliente)."""
+        while True:
+            with self._condicion:
+                if self._creadas >= self.minimo:
+                    return
+                self._creadas += 1
+            try:
+                conn = self._crear()
+            except Exception:
+                with self._condicion:
+                    self._creadas -= 1
+                raise
+            with self._condicion:
+                conn.en_pool = True
+                self._libres.append(conn)
+                self._condicion.notify()
+
+    def obtener(self):
+        if not self.circuito.permitir():
+            raise BaseDatosNoDisponible("Circuito abierto: la base de datos falló varias veces seguidas.")
+        inicio = time.monotonic()
+        with self._condicion:
+            while not self._libres and self._creadas >= self.maximo:
+                self.metricas["esperas"] += 1
+                restante = self.espera_seg - (time.monotonic() - inicio)
+                if restante <= 0 or not self._condicion.wait(restante):
+                    if not self._libres and self._creadas >= self.maximo:
+                        self.metricas["esperas_agotadas"] += 1
+                        self.circuito.fallo()  # Sobrecarga: mejor rechazar rápido que acumular esperas
+                        raise PoolAgotado(f"Sin conexiones libres tras {self.espera_seg}s ({self.maximo} en uso).")
+            espera_ms = (time.monotonic() - inicio) * 1000
+            self.metricas["espera_max_ms"] = max(self.metricas["espera_max_ms"], espera_ms)
+            if self._libres:
+                conn = self._libres.pop()
+                conn.en_pool = False
+                return conn
+            self._creadas += 1
+
+        try:
+            return self._crear()
+        except Exception:
+            with self._condicion:
+                self._creadas -= 1
+                self._condicion.notify()
+            raise
+
+    def devolver(self, conn):
+        if conn.en_pool:
+            return  # close() repetido
+        descartar = bool(conn.closed)
+        if not descartar:
+            try:
+                estado = conn.info.transaction_status
+                if estado == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    descartar = True
+                elif estado != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.presupuesto_cambiado and not descartar:
+                    cur = conn.cursor()
+                    cur.execute("RESET statement_timeout")
+                    cur.close()
+                    conn.commit()
+                    conn.presupuesto_cambiado = False
+            except Exception:
+                descartar = True
+
+        if not descartar:
+            # Una consulta cancelada por statement_timeout solo deshace la transacción, pero es
+            # justo el síntoma de una base lenta: cuenta como fallo aunque la conexión siga sirviendo
+            if conn.error_disponibilidad:
+                conn.error_disponibilidad = False
+                self.circuito.fallo()
+            else:
+                self.circuito.exito()
+        else:
+            self.circuito.fallo()  # Conexión rota a mitad de uso
+            conn.finalizador.detach()
+            conn.pool = None  # Un close() posterior ya no vuelve al pool
+            try:
+                conn.cerrar_de_verdad()
+            except Exception:
+                pass
+
+        with self._condicion:
+            if descartar:
+                self._creadas -= 1
+                self.metricas["descartadas"] += 1
+            else:
+                conn.en_pool = True
+                self._libres.append(conn)
+            self._condicion.notify()
+
+    def estado(self):
+        with self._condicion:
+            libres = len(self._libres)
+            creadas = self._creadas
+        en_uso = creadas - libres
+        return {
+            "maximo": self.maximo,
+            "abiertas": creadas,
+            "en_uso": en_uso,
+            "libres": libres,
+            "saturacion": round(en_uso / self.maximo, 2) if self.maximo else 0,
+            "circuito": self.circuito.describir(),
+            **self.metricas,
+        }
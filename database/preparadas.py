@@ -0,0 +1,70 @@
+# database/preparadas.py
+# Sentencias preparadas de los caminos más usados. PREPARE vive lo que la sesión, y las del
+# pool son sesiones largas: se preparan al abrir cada conexión (hook del pool) y los handlers
+# las ejecutan con EXECUTE, sin volver a analizar ni planificar la consulta.
+import logging
+
+logger = logging.getLogger(__name__)
+
+# nombre -> (tipos de los parámetros, SQL con %s en el orden de los parámetros)
+SENTENCIAS = {
+    "resumen_propietario": ("bigint", """
+        SELECT lineas_activas, linea_principal, proxima_recarga, proximo_vencimiento, recursos_vencidos
+        FROM resumen_propietario
+        WHERE propietario_id = %s
+    """),
+    "lineas_activas": ("bigint", """
+        SELECT id, numero_linea, nombre_alias
+        FROM lineas
+        WHERE propietario_id = %s AND activa = TRUE
+        ORDER BY id
+    """),
+    "lineas_panel": ("bigint", """
+        SELECT id, numero_linea, nombre_alias, fecha_ultima_recarga, es_principal
+        FROM lineas
+        WHERE propietario_id = %s AND activa = TRUE
+        ORDER BY es_principal DESC, id ASC
+    """),
+    "saldos_lineas": ("integer[]", """
+        SELECT linea_id, tipo_recurso, saldo, asignado, fecha_vencimiento
+        FROM saldos_linea
+        WHERE linea_id = ANY(%s)
+        ORDER BY linea_id, tipo_recurso
+    """),
+}
+
+def _numerar(sql):
+    """'%s' → '$1', '$2'… para PREPARE."""
+    partes = sql.split("%s")
+    return "".join(f"{parte}${i}" for i, parte in enumerate(partes[:-1], 1)) + partes[-1]
+
+def preparar(conn):
+    """Hook del pool: prepara las sentencias en una conexión recién abierta.
+
+    Si una tabla aún no existe (base nueva, antes de init_db) esa sentencia queda sin preparar
+    y ejecutar() usa la consulta normal; init_db vuelve a llamar a esta función al terminar.
+    """
+    preparadas = getattr(conn, "preparadas", set())
+    cur = conn.cursor()
+    try:
+        for nombre, (tipos, sql) in SENTENCIAS.items():
+            if nombre in preparadas:
+                continue
+            try:
+                cur.execute(f"PREPARE {nombre} ({tipos}) AS {_numerar(sql)}")
+                conn.commit()
+                preparadas.add(nombre)
+            except Exception as e:
+                conn.rollback()
+                logger.debug("Sentencia %s sin preparar: %s", nombre, e)
+    finally:
+        cur.close()
+    conn.preparadas = preparadas
+
+def ejecutar(cur, nombre, parametros):
+    """EXECUTE de la sentencia preparada, o la consulta normal si esta conexión no la tiene."""
+    if nombre in getattr(cur.connection, "preparadas", ()):
+        marcadores = ", ".join(["%s"] * len(parametros))
+        cur.execute(f"EXECUTE {nombre} ({marcadores})", parametros)
+    else:
+        cur.execute(SENTENCIAS[nombre][1], parametros)
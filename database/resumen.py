@@ -0,0 +1,141 @@
+# database/resumen.py
+# Tabla resumen por propietario, mantenida por triggers sobre 'lineas' y 'recursos_linea'.
+
+# "Hoy" para el SQL: CURRENT_DATE, salvo que la sesión fije app.hoy (reloj fijado, ver utils/reloj.py)
+SQL_HOY_APP = """
+    CREATE OR REPLACE FUNCTION hoy_app() RETURNS date AS $$
+        SELECT COALESCE(NULLIF(current_setting('app.hoy', true), '')::date, CURRENT_DATE)
+    $$ LANGUAGE sql STABLE;
+"""
+
+SQL_REFRESCAR_RESUMEN = """
+    CREATE OR REPLACE FUNCTION refrescar_resumen_propietario(p_propietario BIGINT) RETURNS void AS $$
+    BEGIN
+        IF p_propietario IS NULL THEN
+            RETURN;
+        END IF;
+
+        INSERT INTO resumen_propietario AS rp
+            (propietario_id, lineas_activas, linea_principal_id, linea_principal,
+             proxima_recarga, proximo_vencimiento, recursos_vencidos, actualizado_en)
+        SELECT p_propietario,
+               (SELECT COUNT(*) FROM lineas WHERE propietario_id = p_propietario AND activa),
+               principal.id,
+               principal.nombre,
+               (SELECT MIN(fecha_ultima_recarga) + 30 FROM lineas
+                WHERE propietario_id = p_propietario AND activa),
+               (SELECT MIN(r.fecha_vencimiento)
+                FROM recursos_linea r JOIN lineas l ON l.id = r.linea_id
+                WHERE l.propietario_id = p_propietario AND l.activa AND r.activo
+                  AND r.fecha_vencimiento >= hoy_app()),
+               (SELECT COUNT(*)
+                FROM recursos_linea r JOIN lineas l ON l.id = r.linea_id
+                WHERE l.propietario_id = p_propietario AND l.activa AND r.activo
+                  AND r.fecha_vencimiento < hoy_app()
+                  AND r.fecha_vencimiento >= hoy_app() - 120),  -- = DIAS_RETENCION_RECURSOS
+               NOW()
+        FROM (SELECT 1) uno
+        LEFT JOIN LATERAL (
+            SELECT id, COALESCE(nombre_alias, 'Sin alias') || ' (' || numero_linea || ')' AS nombre
+            FROM lineas
+            WHERE propietario_id = p_propietario AND activa AND es_principal
+            ORDER BY id
+            LIMIT 1
+        ) principal ON TRUE
+        ON CONFLICT (propietario_id) DO UPDATE
+        SET lineas_activas = EXCLUDED.lineas_activas,
+            linea_principal_id = EXCLUDED.linea_principal_id,
+            linea_principal = EXCLUDED.linea_principal,
+            proxima_recarga = EXCLUDED.proxima_recarga,
+            proximo_vencimiento = EXCLUDED.proximo_vencimiento,
+            recursos_vencidos = EXCLUDED.recursos_vencidos,
+            actualizado_en = EXCLUDED.actualizado_en;
+    END $$ LANGUAGE plpgsql;
+"""
+
+# Triggers por sentencia con tablas de transición: un refresco por propietario afectado,
+# no uno por fila (las compras y la retención tocan varias filas a la vez).
+SQL_TRIGGERS_RESUMEN = """
+    CREATE OR REPLACE FUNCTION trg_resumen_lineas() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM refrescar_resumen_propietario(p)
+            FROM (SELECT DISTINCT propietario_id AS p FROM nuevas) t;
+        ELSIF TG_OP = 'UPDATE' THEN
+            PERFORM refrescar_resumen_propietario(p)
+            FROM (SELECT propietario_id AS p FROM nuevas UNION SELECT propietario_id FROM viejas) t;
+        ELSE
+            PERFORM refrescar_resumen_propietario(p)
+            FROM (SELECT DISTINCT propietario_id AS p FROM viejas) t;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION trg_resumen_recursos() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM refrescar_resumen_propietario(p)
+            FROM (SELECT DISTINCT l.propietario_id AS p FROM viejas v JOIN lineas l ON l.id = v.linea_id) t;
+        ELSE
+            PERFORM refrescar_resumen_propietario(p)
+            FROM (SELECT DISTINCT l.propietario_id AS p FROM nuevas n JOIN lineas l ON l.id = n.linea_id) t;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE TRIGGER trg_resumen_lineas_ins AFTER INSERT ON lineas
+        REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION trg_resumen_lineas();
+    CREATE OR REPLACE TRIGGER trg_resumen_lineas_upd AFTER UPDATE ON lineas
+        REFERENCING NEW TABLE AS nuevas OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION trg_resumen_lineas();
+    CREATE OR REPLACE TRIGGER trg_resumen_lineas_del AFTER DELETE ON lineas
+        REFERENCING OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION trg_resumen_lineas();
+
+    CREATE OR REPLACE TRIGGER trg_resumen_recursos_ins AFTER INSERT ON recursos_linea
+        REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION trg_resumen_recursos();
+    CREATE OR REPLACE TRIGGER trg_resumen_recursos_upd AFTER UPDATE ON recursos_linea
+        REFERENCING NEW TABLE AS nuevas OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION trg_resumen_recursos();
+    CREATE OR REPLACE TRIGGER trg_resumen_recursos_del AFTER DELETE ON recursos_linea
+        REFERENCING OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION trg_resumen_recursos();
+"""
+
+def crear_resumen_propietario(cur):
+    """Crea la tabla resumen, su función de refresco y los triggers que la mantienen."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS resumen_propietario (
+            propietario_id BIGINT PRIMARY KEY,
+            lineas_activas INTEGER NOT NULL DEFAULT 0,
+            linea_principal_id INTEGER,
+            linea_principal VARCHAR(130),
+            proxima_recarga DATE,
+            proximo_vencimiento DATE,
+            recursos_vencidos INTEGER NOT NULL DEFAULT 0,
+            actualizado_en TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    # Último día en que se avisó al usuario (lo escribe el programador de avisos)
+    cur.execute("ALTER TABLE resumen_propietario ADD COLUMN IF NOT EXISTS ultima_notificacion DATE")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_lineas_propietario ON lineas (propietario_id)")
+    cur.execute(SQL_HOY_APP)
+    cur.execute(SQL_REFRESCAR_RESUMEN)
+    cur.execute(SQL_TRIGGERS_RESUMEN)
+
+    # Primera vez: calcular el resumen de todos los propietarios existentes
+    cur.execute("""
+        SELECT refrescar_resumen_propietario(p)
+        FROM (SELECT DISTINCT propietario_id AS p FROM lineas WHERE propietario_id IS NOT NULL) t
+        WHERE NOT EXISTS (SELECT 1 FROM resumen_propietario)
+    """)
+
+def refrescar_resumenes(cur, desde_id, tamano_lote):
+    """Recalcula un lote de propietarios (orden por ID). Devuelve el último ID procesado o None."""
+    cur.execute("""
+        SELECT p, refrescar_resumen_propietario(p)
+        FROM (
+            SELECT DISTINCT propietario_id AS p FROM lineas
+            WHERE propietario_id > %s
+            ORDER BY propietario_id
+            LIMIT %s
+        ) t
+    """, (desde_id, tamano_lote))
+    filas = cur.fetchall()
+    return filas[-1][0] if filas else None
@@ -0,0 +1,102 @@
+# herramientas/bench_compra.py
+"""Compara el registro de compras: sentencias sueltas por recurso vs. una sola sentencia con CTE.
+
+Las dos variantes hacen las mismas escrituras (recursos, libro de movimientos, saldos y gasto),
+así que la diferencia medida es la de los viajes al servidor y la planificación.
+
+Uso: python -m herramientas.bench_compra [iteraciones]
+
+Usa DATABASE_URL. Todo ocurre dentro de una transacción que se deshace al final.
+"""
+import sys
+import time
+from datetime import timedelta
+
+from database.connection import get_db_connection
+from database.particiones import fecha_limite_retencion
+from modules.gestionar_paquetes import SQL_REGISTRAR_COMPRA, parametros_compra
+from utils import reloj
+from utils.catalogo_paquetes import obtener_paquete
+
+def compra_en_bucle(cur, linea_id, paquete, fecha_compra):
+    """Implementación por sentencias sueltas con las mismas escrituras que SQL_REGISTRAR_COMPRA:
+    bloqueo de la línea, por cada tipo de recurso UPDATE + INSERT del recurso, movimiento en el
+    libro y saldo, y al final el gasto."""
+    vencimiento = fecha_compra + timedelta(days=paquete.dias_vigencia)
+    cur.execute("SELECT 1 FROM lineas WHERE id = %s FOR NO KEY UPDATE", (linea_id,))
+    for tipo, cantidad in paquete.componentes:
+        cur.execute("""
+            UPDATE recursos_linea
+            SET activo = FALSE
+            WHERE linea_id = %s AND tipo_recurso = %s AND activo = TRUE AND fecha_vencimiento >= %s
+        """, (linea_id, tipo, fecha_limite_retencion(fecha_compra)))
+        cur.execute("""
+            INSERT INTO recursos_linea (linea_id, tipo_recurso, cantidad, fecha_activacion, fecha_vencimiento, origen_paquete)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (linea_id, tipo, cantidad, fecha_compra, vencimiento, paquete.descripcion))
+        cur.execute("""
+            INSERT INTO movimientos_recurso (linea_id, tipo_recurso, tipo_movimiento, cantidad, fecha, origen)
+            VALUES (%s, %s, 'asignacion', %s, %s, %s)
+            RETURNING id
+        """, (linea_id, tipo, cantidad, fecha_compra, paquete.descripcion))
+        movimiento_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO saldos_linea
+                (linea_id, tipo_recurso, asignado, consumido, saldo, fecha_vencimiento, ultimo_movimiento_id, actualizado_en)
+            VALUES (%s, %s, %s, 0, %s, %s, %s, NOW())
+            ON CONFLICT (linea_id, tipo_recurso) DO UPDATE
+            SET asignado = EXCLUDED.asignado,
+                consumido = 0,
+                saldo = EXCLUDED.saldo,
+                fecha_vencimiento = EXCLUDED.fecha_vencimiento,
+                ultimo_movimiento_id = EXCLUDED.ultimo_movimiento_id,
+                actualizado_en = NOW()
+        """, (linea_id, tipo, cantidad, cantidad, vencimiento, movimiento_id))
+    cur.execute("""
+        INSERT INTO historial_gastos (propietario_id, linea_id, numero_linea, tipo, concepto, monto, fecha)
+        SELECT propietario_id, id, numero_linea, 'paquete', %s, %s, %s
+        FROM lineas
+        WHERE id = %s
+    """, (paquete.descripcion, paquete.precio, fecha_compra, linea_id))
+
+def sentencias_bucle(paquete):
+    return 2 + 4 * len(paquete.componentes)
+
+def compra_en_cte(cur, linea_id, paquete, fecha_compra):
+    cur.execute(SQL_REGISTRAR_COMPRA, parametros_compra(linea_id, paquete, fecha_compra))
+    cur.fetchall()
+
+def medir(nombre, funcion, cur, linea_id, paquete, iteraciones):
+    hoy = reloj.hoy()
+    inicio = time.perf_counter()
+    for _ in range(iteraciones):
+        funcion(cur, linea_id, paquete, hoy)
+    total = time.perf_counter() - inicio
+    print(f"{nombre:<8} {iteraciones} compras en {total:.3f}s → {total / iteraciones * 1000:.2f} ms/compra")
+    return total
+
+def main():
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    paquete = obtener_paquete(1)  # Combo: datos + minutos + SMS
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO lineas (numero_linea, nombre_alias)
+            VALUES ('bench-' || txid_current(), 'benchmark')
+            RETURNING id
+        """)
+        linea_id = cur.fetchone()[0]
+
+        bucle = medir("bucle", compra_en_bucle, cur, linea_id, paquete, iteraciones)
+        cte = medir("cte", compra_en_cte, cur, linea_id, paquete, iteraciones)
+        print(f"Sentencias por compra: bucle={sentencias_bucle(paquete)}, cte=1 (+ bloqueo en el mismo envío)")
+        print(f"Mejora: x{bucle / cte:.2f}")
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# herramientas/bench_webhook.py
+"""CPU por update en la entrada del webhook: ruta anterior vs. la actual.
+
+Uso: python -m herramientas.bench_webhook [iteraciones]
+
+Anterior: json.loads + Update.de_json para cualquier update.
+Actual: decodificador rápido (orjson si está instalado) y descarte de los tipos que
+ningún handler atiende antes de construir objetos de PTB.
+No necesita base de datos ni red.
+"""
+import json
+import sys
+import time
+
+from telegram import Bot, Update
+
+from bot.ingreso import cargar_json, es_tipo_manejado
+
+TIPOS = [Update.CALLBACK_QUERY, Update.EDITED_MESSAGE, Update.MESSAGE]
+
+USUARIO = {"id": 42, "is_bot": False, "first_name": "Ana", "username": "ana"}
+CHAT = {"id": 42, "type": "private", "first_name": "Ana"}
+
+# Mezcla parecida a la real: sobre todo callbacks, algo de mensajes y algunos tipos no atendidos
+MUESTRAS = [
+    {"update_id": 1, "callback_query": {
+        "id": "1", "chat_instance": "42", "from": USUARIO, "data": "consultar_lineas",
+        "message": {"message_id": 7, "date": 1700000000, "chat": CHAT, "text": "menú",
+                    "reply_markup": {"inline_keyboard": [[{"text": "Siguiente ▶️", "callback_data": "linea_siguiente"}]]}},
+    }},
+    {"update_id": 2, "message": {
+        "message_id": 8, "date": 1700000000, "chat": CHAT, "from": USUARIO, "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    }},
+    {"update_id": 3, "my_chat_member": {
+        "chat": CHAT, "from": USUARIO, "date": 1700000000,
+        "old_chat_member": {"status": "member", "user": USUARIO},
+        "new_chat_member": {"status": "kicked", "user": USUARIO, "until_date": 0},
+    }},
+    {"update_id": 4, "edited_channel_post": {
+        "message_id": 9, "date": 1700000000, "edit_date": 1700000001,
+        "chat": {"id": -100, "type": "channel", "title": "canal"}, "text": "editado",
+    }},
+]
+CUERPOS = [json.dumps(m).encode() for m in MUESTRAS] * 5 + [json.dumps(MUESTRAS[0]).encode()] * 10
+
+def ruta_anterior(bot, cuerpo):
+    Update.de_json(json.loads(cuerpo), bot)
+
+def ruta_actual(bot, cuerpo):
+    payload = cargar_json(cuerpo)
+    if es_tipo_manejado(payload, TIPOS):
+        Update.de_json(payload, bot)
+
+def medir(nombre, funcion, bot, iteraciones):
+    inicio = time.process_time()
+    for _ in range(iteraciones):
+        for cuerpo in CUERPOS:
+            funcion(bot, cuerpo)
+    total = time.process_time() - inicio
+    por_update_us = total / (iteraciones * len(CUERPOS)) * 1e6
+    print(f"{nombre:<9} {por_update_us:.1f} µs de CPU por update")
+    return por_update_us
+
+def main():
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    bot = Bot("123456:BENCH")
+    print(f"Decodificador JSON: {cargar_json.__module__}")
+    anterior = medir("anterior", ruta_anterior, bot, iteraciones)
+    actual = medir("actual", ruta_actual, bot, iteraciones)
+    print(f"Ahorro: {anterior - actual:.1f} µs/update ({(1 - actual / anterior) * 100:.0f}%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# herramientas/carga.py
+"""Prueba de carga de extremo a extremo: bot_app bajo uvicorn + Bot API falsa.
+
+Uso: python -m herramientas.carga [--niveles 2,5,10,20] [--duracion 30] [--usuarios 50]
+                                  [--latencia-ms 30] [--prob-429 0.01] [--prob-5xx 0.01]
+
+Necesita DATABASE_URL (¡una base de pruebas!) y TELEGRAM_TOKEN (puede ser uno falso con
+formato válido, p. ej. 123456:ABC). Crea usuarios y líneas sintéticos (IDs desde
+ID_BASE_USUARIOS), arranca la Bot API falsa en este proceso y bot_app:app en un
+subproceso uvicorn apuntando a ella, y envía webhooks con mezclas realistas de uso
+a cada nivel de carga (sesiones por segundo). Informa rendimiento, percentiles de
+latencia y errores por nivel.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date
+
+import httpx
+import uvicorn
+
+from config import TELEGRAM_TOKEN
+from database.connection import get_db_connection, init_db
+from bot.ingreso import token_secreto
+from herramientas import mock_bot_api
+
+ID_BASE_USUARIOS = 900_000_000
+PUERTO_MOCK = 8081
+PUERTO_BOT = 8000
+
+# (peso, pasos): cada paso es '/comando' o datos de callback; {linea} = línea del usuario
+ESCENARIOS = {
+    "start": (30, ["/start"]),
+    "navegacion": (35, ["consultar_lineas", "linea_siguiente", "linea_anterior", "volver_start_consulta",
+                        "gestionar_lineas", "volver_start"]),
+    "fecha_recarga": (20, ["gestionar_recargas", "registrar_recarga", "elegir_linea_{linea}", "fecha_botones",
+                           "sel_año_{año}", "sel_mes_{mes}", "sel_dia_1"]),
+    "compra": (15, ["gestionar_paquetes", "comprar_paquete", "paquete_1", "fecha_actual_paquete"]),
+}
+
+# ========================
+# Preparación de datos
+# ========================
+def preparar_usuarios(cantidad):
+    """Crea (o reutiliza) usuarios activos con una línea principal cada uno. Devuelve {user_id: linea_id}."""
+    init_db()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    lineas = {}
+    for i in range(cantidad):
+        user_id = ID_BASE_USUARIOS + i
+        cur.execute("""
+            INSERT INTO usuarios (id, username, first_name, activo)
+            VALUES (%s, %s, 'Carga', TRUE)
+            ON CONFLICT (id) DO UPDATE SET activo = TRUE
+        """, (user_id, f"carga_{i}"))
+        cur.execute("""
+            INSERT INTO lineas (numero_linea, nombre_alias, propietario_id, es_principal, fecha_ultima_recarga)
+            VALUES (%s, 'carga', %s, TRUE, CURRENT_DATE)
+            ON CONFLICT (numero_linea) DO UPDATE SET activa = TRUE
+            RETURNING id
+        """, (f"99{user_id}", user_id))
+        lineas[user_id] = cur.fetchone()[0]
+    conn.commit()
+    cur.close()
+    conn.close()
+    return lineas
+
+# ========================
+# Construcción de updates
+# ========================
+_siguiente_update_id = 1
+
+def _usuario(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": "Carga", "username": f"carga_{user_id - ID_BASE_USUARIOS}"}
+
+def crear_update(user_id, paso):
+    global _siguiente_update_id
+    _siguiente_update_id += 1
+    ahora = int(time.time())
+    chat = {"id": user_id, "type": "private"}
+
+    if paso.startswith("/"):
+        comando = paso.split()[0]
+        return {
+            "update_id": _siguiente_update_id,
+            "message": {
+                "message_id": _siguiente_update_id, "date": ahora, "chat": chat, "from": _usuario(user_id),
+                "text": paso, "entities": [{"type": "bot_command", "offset": 0, "length": len(comando)}],
+            },
+        }
+    return {
+        "update_id": _siguiente_update_id,
+        "callback_query": {
+            "id": str(_siguiente_update_id), "chat_instance": str(user_id), "from": _usuario(user_id),
+            "data": paso,
+            "message": {
+                "message_id": 1, "date": ahora, "chat": chat, "from": mock_bot_api.BOT_USUARIO, "text": "menú",
+            },
+        },
+    }
+
+# ========================
+# Generador de tráfico
+# ========================
+async def sesion(cliente, url, user_id, linea_id, pasos, latencias, errores):
+    hoy = date.today()
+    for paso in pasos:
+        paso = paso.format(linea=linea_id, año=hoy.year, mes=hoy.month)
+        inicio = time.perf_counter()
+        try:
+            respuesta = await cliente.post(url, json=crear_update(user_id, paso))
+            if respuesta.status_code != 200:
+                errores[f"http_{respuesta.status_code}"] = errores.get(f"http_{respuesta.status_code}", 0) + 1
+        except Exception as e:
+            errores[type(e).__name__] = errores.get(type(e).__name__, 0) + 1
+        latencias.append(time.perf_counter() - inicio)
+
+async def ejecutar_nivel(cliente, url, lineas, sesiones_por_seg, duracion):
+    """Llegadas abiertas (Poisson): no se espera a que terminen las sesiones anteriores."""
+    nombres = list(ESCENARIOS)
+    pesos = [ESCENARIOS[n][0] for n in nombres]
+    libres = list(lineas)  # Un usuario no tiene dos sesiones a la vez (user_data es por usuario)
+    random.shuffle(libres)
+    latencias, errores, tareas, sin_usuario = [], {}, [], 0
+
+    async def sesion_y_liberar(user_id, pasos):
+        try:
+            await sesion(cliente, url, user_id, lineas[user_id], pasos, latencias, errores)
+        finally:
+            libres.append(user_id)
+
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < duracion:
+        await asyncio.sleep(random.expovariate(sesiones_por_seg))
+        if not libres:
+            sin_usuario += 1
+            continue
+        user_id = libres.pop()
+        pasos = ESCENARIOS[random.choices(nombres, pesos)[0]][1]
+        tareas.append(asyncio.create_task(sesion_y_liberar(user_id, pasos)))
+    await asyncio.gather(*tareas)
+    total = time.perf_counter() - inicio
+
+    return latencias, errores, total, sin_usuario
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+def informar(nivel, latencias, errores, total, sin_usuario, registro):
+    n = len(latencias)
+    n_errores = sum(errores.values())
+    print(f"\n=== {nivel} sesiones/s ===")
+    print(f"Updates: {n} en {total:.1f}s → {n / total:.1f} updates/s")
+    if n:
+        ms = [x * 1000 for x in latencias]
+        print(f"Latencia ms: p50={percentil(ms, 50):.0f} p90={percentil(ms, 90):.0f} "
+              f"p99={percentil(ms, 99):.0f} max={max(ms):.0f} media={statistics.mean(ms):.0f}")
+    print(f"Errores HTTP/cliente: {n_errores} ({(n_errores / n * 100) if n else 0:.1f}%) {errores or ''}")
+    if sin_usuario:
+        print(f"⚠️ {sin_usuario} llegadas descartadas por falta de usuarios libres (sube --usuarios)")
+    print(f"Bot API falsa: {registro['llamadas']} errores inyectados={registro['errores_inyectados']}")
+
+# ========================
+# Orquestación
+# ========================
+async def esperar_bot(cliente, base, limite=60):
+    inicio = time.monotonic()
+    while time.monotonic() - inicio < limite:
+        try:
+            if (await cliente.get(f"{base}/")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("bot_app no respondió a tiempo")
+
+async def main_async(args):
+    mock_bot_api.fallos.latencia_ms = args.latencia_ms
+    mock_bot_api.fallos.prob_429 = args.prob_429
+    mock_bot_api.fallos.prob_5xx = args.prob_5xx
+
+    lineas = preparar_usuarios(args.usuarios)
+
+    servidor_mock = uvicorn.Server(uvicorn.Config(mock_bot_api.app, port=PUERTO_MOCK, log_level="warning"))
+    tarea_mock = asyncio.create_task(servidor_mock.serve())
+
+    entorno = dict(os.environ)
+    entorno["TELEGRAM_API_BASE_URL"] = f"http://127.0.0.1:{PUERTO_MOCK}/bot"
+    entorno["RENDER_EXTERNAL_URL"] = f"http://127.0.0.1:{PUERTO_BOT}"
+    bot = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bot_app:app", "--port", str(PUERTO_BOT), "--log-level", "warning"],
+        env=entorno,
+    )
+
+    base = f"http://127.0.0.1:{PUERTO_BOT}"
+    url = f"{base}/webhook/{TELEGRAM_TOKEN}"
+    limites = httpx.Limits(max_connections=args.conexiones, max_keepalive_connections=args.conexiones)
+    cabeceras = {"X-Telegram-Bot-Api-Secret-Token": token_secreto()}
+    try:
+        async with httpx.AsyncClient(timeout=60, limits=limites, headers=cabeceras) as cliente:
+            await esperar_bot(cliente, base)
+            for nivel in args.niveles:
+                mock_bot_api.reiniciar_registro()
+                resultado = await ejecutar_nivel(cliente, url, lineas, nivel, args.duracion)
+                informar(nivel, *resultado, mock_bot_api.registro())
+    finally:
+        bot.terminate()
+        bot.wait(timeout=30)
+        servidor_mock.should_exit = True
+        await tarea_mock
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--niveles", type=lambda s: [float(x) for x in s.split(",")], default=[2, 5, 10, 20])
+    parser.add_argument("--duracion", type=float, default=30, help="segundos por nivel")
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--conexiones", type=int, default=100, help="conexiones HTTP del generador")
+    parser.add_argument("--latencia-ms", type=float, default=30)
+    parser.add_argument("--prob-429", type=float, default=0.0)
+    parser.add_argument("--prob-5xx", type=float, default=0.0)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
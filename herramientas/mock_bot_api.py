@@ -0,0 +1,96 @@
+# herramientas/mock_bot_api.py
+"""Servidor falso de la Bot API de Telegram para pruebas de carga.
+
+Responde a los métodos que usa el bot con objetos válidos para PTB, registra cada llamada
+y puede inyectar latencia, errores 429 (con retry_after) y errores 5xx.
+
+Uso suelto: uvicorn herramientas.mock_bot_api:app --port 8081
+(y arrancar el bot con TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot)
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+@dataclass
+class Fallos:
+    latencia_ms: float = 30.0       # Latencia media de cada llamada
+    variacion_ms: float = 10.0      # Desviación (distribución normal, nunca negativa)
+    prob_429: float = 0.0           # Probabilidad de responder 429 Too Many Requests
+    retry_after: int = 1            # Segundos que se anuncian en el 429
+    prob_5xx: float = 0.0           # Probabilidad de responder 502 Bad Gateway
+
+fallos = Fallos()
+llamadas = Counter()
+errores_inyectados = Counter()
+_siguiente_message_id = 1
+
+BOT_USUARIO = {"id": 1, "is_bot": True, "first_name": "Bot de carga", "username": "bot_carga"}
+
+def reiniciar_registro():
+    llamadas.clear()
+    errores_inyectados.clear()
+
+async def _leer_parametros(request):
+    cuerpo = await request.body()
+    tipo = request.headers.get("content-type", "")
+    if tipo.startswith("application/json"):
+        return json.loads(cuerpo or b"{}")
+    if tipo.startswith("application/x-www-form-urlencoded"):
+        return {k: v[0] for k, v in parse_qs(cuerpo.decode()).items()}
+    return {}  # multipart (documentos): no hace falta leerlo
+
+def _mensaje(parametros):
+    global _siguiente_message_id
+    _siguiente_message_id += 1
+    chat_id = int(parametros.get("chat_id", 0) or 0)
+    return {
+        "message_id": int(parametros.get("message_id", _siguiente_message_id)),
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": BOT_USUARIO,
+        "text": parametros.get("text", ""),
+    }
+
+RESPUESTAS = {
+    "getMe": lambda p: BOT_USUARIO,
+    "sendMessage": _mensaje,
+    "editMessageText": _mensaje,
+    "sendDocument": _mensaje,
+}
+
+app = FastAPI()
+
+@app.post("/bot{token}/{metodo}")
+async def metodo_bot(token: str, metodo: str, request: Request):
+    parametros = await _leer_parametros(request)
+    llamadas[metodo] += 1
+
+    if fallos.latencia_ms > 0:
+        await asyncio.sleep(max(0.0, random.gauss(fallos.latencia_ms, fallos.variacion_ms)) / 1000)
+
+    sorteo = random.random()
+    if sorteo < fallos.prob_429:
+        errores_inyectados["429"] += 1
+        return JSONResponse(status_code=429, content={
+            "ok": False, "error_code": 429,
+            "description": f"Too Many Requests: retry after {fallos.retry_after}",
+            "parameters": {"retry_after": fallos.retry_after},
+        })
+    if sorteo < fallos.prob_429 + fallos.prob_5xx:
+        errores_inyectados["502"] += 1
+        return JSONResponse(status_code=502, content={"ok": False, "error_code": 502, "description": "Bad Gateway"})
+
+    respuesta = RESPUESTAS.get(metodo, lambda p: True)(parametros)
+    return {"ok": True, "result": respuesta}
+
+@app.get("/_registro")
+def registro():
+    """Llamadas recibidas por método y errores inyectados."""
+    return {"llamadas": dict(llamadas), "errores_inyectados": dict(errores_inyectados)}
@@ -0,0 +1,339 @@
+# herramientas/simulacion.py
+"""Simula meses de uso día a día: actividad, retención, resumen nocturno y avisos, con el reloj fijado.
+
+Uso: python -m herramientas.simulacion [--lineas 100000] [--recursos 1000000] [--usuarios 30000]
+                                       [--dias 365] [--inicio AAAA-MM-DD] [--bajas-dia 0.001]
+                                       [--salida simulacion.csv]
+
+Necesita DATABASE_URL apuntando a una base NUEVA y desechable: historial_gastos es de solo
+inserciones, así que los datos sintéticos no se pueden borrar después. Siembra una flota
+sintética (usuarios desde ID_BASE_USUARIOS, líneas 'sim…', recursos con una cadencia de compra
+por línea) y luego, para cada día simulado, fija utils/reloj en ese día y ejecuta:
+
+  1. actividad: compras de las líneas a las que les toca (SQL_REGISTRAR_COMPRA), recargas de las
+     que cumplen su ciclo (SQL_REGISTRAR_RECARGA), y altas y bajas de líneas;
+  2. retención (ejecutar_retencion, una pasada; en producción corre cada RETENCION_INTERVALO_MIN);
+  3. pasada nocturna del resumen por propietario;
+  4. barrido de avisos (enviar_notificaciones_programadas) contra un bot falso que solo cuenta.
+
+Por día y fase guarda duración y consultas emitidas; además, mensajes generados y tamaño de las
+tablas. Escribe una fila por día en --salida (CSV) y un resumen al final.
+"""
+import argparse
+import asyncio
+import csv
+import sys
+import time
+from datetime import date, timedelta
+
+from config import MONTO_RECARGA
+from database.connection import get_db_connection, init_db, obtener_pool, obtener_pools_replica
+from database.pool import CursorVigilado
+from database.particiones import MESES_ADELANTE, TABLA_PARTICIONADA, asegurar_particiones
+from modules.gestionar_paquetes import SQL_REGISTRAR_COMPRA, parametros_compra
+from modules.gestionar_recargas import SQL_REGISTRAR_RECARGA
+from notificaciones import enviar_notificaciones_programadas
+from utils import reloj
+from utils.catalogo_paquetes import cargar_catalogo, obtener_paquetes
+from utils.limpieza_db import METRICAS_RETENCION, ejecutar_retencion
+from utils.resumen_propietario import refrescar_todos_los_resumenes
+
+ID_BASE_USUARIOS = 800_000_000
+LOTE_SIEMBRA = 10_000  # Líneas por sentencia al sembrar
+CADENCIA_MIN, CADENCIA_RANGO = 20, 26  # Cada línea compra cada 20..45 días
+CICLO_RECARGA = 30
+
+# Misma fórmula en Python y en SQL: días entre compras de cada línea
+SQL_CADENCIA = f"({CADENCIA_MIN} + (id::bigint * 7919) %% {CADENCIA_RANGO})"
+
+TABLAS = ("lineas", TABLA_PARTICIONADA, "saldos_linea", "movimientos_recurso", "recursos_archivo",
+          "resumen_propietario", "historial_gastos", "gastos_mensuales")
+
+# ========================
+# Instrumentación
+# ========================
+CONSULTAS = {"total": 0}
+
+class CursorContado(CursorVigilado):
+    """Cuenta las sentencias emitidas (sin el set_config del reloj, que solo existe en la simulación).
+
+    Hereda del cursor del pool para no perder el aviso de timeouts al circuito.
+    """
+
+    def execute(self, sql, params=None):
+        if not (isinstance(sql, str) and "set_config('app.hoy'" in sql):
+            CONSULTAS["total"] += 1
+        return super().execute(sql, params)
+
+    def executemany(self, sql, params_seq):
+        params_seq = list(params_seq)
+        CONSULTAS["total"] += len(params_seq)
+        return super().executemany(sql, params_seq)
+
+def instrumentar_pools():
+    """Antes de abrir ninguna conexión: todas las del pool usarán CursorContado."""
+    for pool in [obtener_pool(), *obtener_pools_replica()]:
+        pool.kwargs["cursor_factory"] = CursorContado
+
+class BotSimulado:
+    """Sustituye a telegram.Bot en los avisos: cuenta mensajes y caracteres, no envía nada."""
+
+    def __init__(self):
+        self.mensajes = 0
+        self.caracteres = 0
+        self.destinatarios = set()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.mensajes += 1
+        self.caracteres += len(text)
+        self.destinatarios.add(chat_id)
+
+def medir(funcion, *args):
+    """Ejecuta funcion(*args). Devuelve (resultado, segundos, consultas)."""
+    consultas = CONSULTAS["total"]
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio, CONSULTAS["total"] - consultas
+
+async def medir_async(corrutina):
+    consultas = CONSULTAS["total"]
+    inicio = time.perf_counter()
+    resultado = await corrutina
+    return resultado, time.perf_counter() - inicio, CONSULTAS["total"] - consultas
+
+# ========================
+# Siembra
+# ========================
+def hay_datos_simulados(cur):
+    cur.execute("SELECT EXISTS (SELECT 1 FROM usuarios WHERE id >= %s)", (ID_BASE_USUARIOS,))
+    return cur.fetchone()[0]
+
+def sembrar(n_usuarios, n_lineas, n_recursos, inicio):
+    """Usuarios, líneas y su historial de compras hasta el día anterior a 'inicio'."""
+    paquete = obtener_paquetes()[0]  # Combo de datos + minutos + SMS
+    compras = max(1, round(n_recursos / (n_lineas * len(paquete.componentes))))
+    ayer = inicio - timedelta(days=1)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        if hay_datos_simulados(cur):
+            sys.exit("❌ La base ya tiene datos simulados: usa una base nueva (los gastos no se pueden borrar).")
+
+        # Particiones para todo el historial sembrado y los meses siguientes
+        asegurar_particiones(cur, inicio - timedelta(days=compras * (CADENCIA_MIN + CADENCIA_RANGO)),
+                             inicio + timedelta(days=31 * MESES_ADELANTE))
+        cur.execute("""
+            INSERT INTO usuarios (id, username, first_name, activo)
+            SELECT %(base)s + u, 'sim_' || u, 'Simulación', TRUE
+            FROM generate_series(0, %(usuarios)s - 1) u
+        """, {"base": ID_BASE_USUARIOS, "usuarios": n_usuarios})
+        conn.commit()
+
+        for desde in range(0, n_lineas, LOTE_SIEMBRA):
+            hasta = min(desde + LOTE_SIEMBRA, n_lineas) - 1
+            cur.execute(f"""
+                WITH nuevas AS (
+                    INSERT INTO lineas (numero_linea, nombre_alias, propietario_id, es_principal,
+                                        fecha_ultima_recarga, fecha_registro)
+                    SELECT 'sim' || i, 'Línea ' || i, %(base)s + i %% %(usuarios)s, i < %(usuarios)s,
+                           %(ayer)s::date - i %% {CICLO_RECARGA + 3}, %(ayer)s::date - 200 - i %% 100
+                    FROM generate_series(%(desde)s, %(hasta)s) i
+                    RETURNING id
+                ), compras AS (
+                    SELECT id AS linea_id, k = 0 AS vigente,
+                           %(ayer)s::date - ((%(ordinal)s + id) %% {SQL_CADENCIA} + k * {SQL_CADENCIA})::int AS fecha
+                    FROM nuevas, generate_series(0, %(compras)s - 1) k
+                ), recursos AS (
+                    INSERT INTO {TABLA_PARTICIONADA}
+                        (linea_id, tipo_recurso, cantidad, fecha_activacion, fecha_vencimiento, origen_paquete, activo)
+                    SELECT c.linea_id, t.tipo, t.cantidad, c.fecha, c.fecha + %(vigencia)s, %(origen)s, c.vigente
+                    FROM compras c
+                    CROSS JOIN unnest(%(tipos)s::varchar[], %(cantidades)s::decimal[]) t(tipo, cantidad)
+                    RETURNING linea_id, tipo_recurso, cantidad, fecha_vencimiento, activo
+                )
+                INSERT INTO saldos_linea (linea_id, tipo_recurso, asignado, saldo, fecha_vencimiento)
+                SELECT linea_id, tipo_recurso, cantidad, cantidad, fecha_vencimiento
+                FROM recursos
+                WHERE activo
+            """, {
+                "base": ID_BASE_USUARIOS, "usuarios": n_usuarios, "desde": desde, "hasta": hasta,
+                "ayer": ayer, "ordinal": ayer.toordinal(), "compras": compras,
+                "vigencia": paquete.dias_vigencia, "origen": paquete.descripcion,
+                "tipos": [tipo for tipo, _ in paquete.componentes],
+                "cantidades": [cantidad for _, cantidad in paquete.componentes],
+            })
+            conn.commit()
+            print(f"🌱 Líneas sembradas: {hasta + 1}/{n_lineas}", end="\r", flush=True)
+        print()
+    finally:
+        cur.close()
+        conn.close()
+
+    refrescar_todos_los_resumenes()
+    return compras
+
+# ========================
+# Actividad diaria
+# ========================
+def actividad_del_dia(hoy, bajas_dia, n_usuarios, secuencia_altas):
+    """Compras, recargas, altas y bajas del día. Devuelve un dict con los conteos."""
+    paquetes = obtener_paquetes()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT id FROM lineas
+            WHERE propietario_id >= %s AND activa AND (%s + id) %% {SQL_CADENCIA} = 0
+        """, (ID_BASE_USUARIOS, hoy.toordinal()))
+        compradoras = [fila[0] for fila in cur.fetchall()]
+        for linea_id in compradoras:
+            paquete = paquetes[linea_id % min(3, len(paquetes))]
+            cur.execute(SQL_REGISTRAR_COMPRA, parametros_compra(linea_id, paquete, hoy))
+            cur.fetchall()
+
+        # Algunas líneas recargan tarde (hasta 3 días después de vencer)
+        cur.execute(f"""
+            SELECT id FROM lineas
+            WHERE propietario_id >= %s AND activa
+              AND fecha_ultima_recarga <= %s::date - ({CICLO_RECARGA} + id %% 4)
+        """, (ID_BASE_USUARIOS, hoy))
+        recargadas = [fila[0] for fila in cur.fetchall()]
+        for linea_id in recargadas:
+            cur.execute(SQL_REGISTRAR_RECARGA, {"fecha": hoy, "linea_id": linea_id, "monto": MONTO_RECARGA})
+
+        # Bajas lógicas (la retención las borra pasados 7 días) y otras tantas altas
+        cur.execute("""
+            UPDATE lineas SET activa = FALSE
+            WHERE id IN (
+                SELECT id FROM lineas
+                WHERE propietario_id >= %s AND activa
+                ORDER BY random()
+                LIMIT (SELECT (COUNT(*) * %s)::int FROM lineas WHERE propietario_id >= %s AND activa)
+            )
+        """, (ID_BASE_USUARIOS, bajas_dia, ID_BASE_USUARIOS))
+        bajas = cur.rowcount
+        altas = [next(secuencia_altas) for _ in range(bajas)]
+        cur.executemany("""
+            INSERT INTO lineas (numero_linea, nombre_alias, propietario_id, fecha_ultima_recarga, fecha_registro)
+            VALUES ('sim' || %s, 'Alta ' || %s, %s, %s, %s)
+        """, [(i, i, ID_BASE_USUARIOS + i % n_usuarios, hoy, hoy) for i in altas])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    return {"compras": len(compradoras), "recargas": len(recargadas), "bajas": bajas}
+
+# ========================
+# Tamaños
+# ========================
+def tamanos():
+    """Filas de las tablas principales y MB totales (con índices; recursos_linea suma sus particiones)."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    datos = {}
+    try:
+        for tabla in TABLAS:
+            cur.execute(f"""
+                SELECT (SELECT COUNT(*) FROM {tabla}),
+                       COALESCE(SUM(pg_total_relation_size(relid)), 0)
+                FROM pg_partition_tree(%s)
+            """, (tabla,))
+            filas, bytes_ = cur.fetchone()
+            datos[f"{tabla}_filas"] = filas
+            datos[f"{tabla}_mb"] = round(bytes_ / 1024 / 1024, 1)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    return datos
+
+# ========================
+# Bucle de días
+# ========================
+async def simular(args):
+    inicio = date.fromisoformat(args.inicio) if args.inicio else reloj.hoy()
+    reloj.fijar(inicio - timedelta(days=1))
+
+    instrumentar_pools()
+    init_db()
+    cargar_catalogo()
+
+    _, segundos, consultas = medir(sembrar, args.usuarios, args.lineas, args.recursos, inicio)
+    print(f"🌱 Siembra: {segundos:.1f}s, {consultas} consultas")
+    inicial = tamanos()
+    print(f"   {inicial['lineas_filas']} líneas, {inicial[TABLA_PARTICIONADA + '_filas']} recursos")
+
+    secuencia_altas = iter(range(args.lineas, sys.maxsize))
+    filas = []
+    with open(args.salida, "w", newline="") as salida:
+        escritor = None
+        for dia in range(args.dias):
+            hoy = inicio + timedelta(days=dia)
+            reloj.fijar(hoy)
+            fila = {"dia": dia + 1, "fecha": hoy.isoformat()}
+
+            actividad, fila["actividad_seg"], fila["actividad_consultas"] = medir(
+                actividad_del_dia, hoy, args.bajas_dia, args.usuarios, secuencia_altas)
+            fila.update(actividad)
+
+            _, fila["retencion_seg"], fila["retencion_consultas"] = medir(ejecutar_retencion, hoy)
+            fila["retencion_lineas"] = METRICAS_RETENCION["ultimas_lineas_eliminadas"]
+            fila["retencion_recursos"] = METRICAS_RETENCION["ultimos_recursos_eliminados"]
+            fila["retencion_incompleta"] = METRICAS_RETENCION["presupuesto_agotado"]
+
+            _, fila["resumen_seg"], fila["resumen_consultas"] = medir(refrescar_todos_los_resumenes)
+
+            bot = BotSimulado()
+            _, fila["avisos_seg"], fila["avisos_consultas"] = await medir_async(enviar_notificaciones_programadas(bot))
+            fila["mensajes"] = bot.mensajes
+            fila["mensajes_caracteres"] = bot.caracteres
+
+            fila.update(tamanos())
+
+            if escritor is None:
+                escritor = csv.DictWriter(salida, fieldnames=list(fila))
+                escritor.writeheader()
+            escritor.writerow(fila)
+            salida.flush()
+            filas.append(fila)
+            print(f"📅 {fila['fecha']}: avisos {fila['avisos_seg']:.2f}s/{fila['avisos_consultas']} consultas/"
+                  f"{fila['mensajes']} mensajes, retención {fila['retencion_seg']:.2f}s, "
+                  f"recursos {fila[TABLA_PARTICIONADA + '_filas']}, movimientos {fila['movimientos_recurso_filas']}")
+
+    reloj.fijar(None)
+    informar(filas, args.salida)
+
+def informar(filas, ruta):
+    if not filas:
+        return
+    primera, ultima = filas[0], filas[-1]
+    print(f"\n=== {len(filas)} días simulados ({primera['fecha']} → {ultima['fecha']}) ===")
+    for fase in ("actividad", "retencion", "resumen", "avisos"):
+        segundos = [f[f"{fase}_seg"] for f in filas]
+        consultas = [f[f"{fase}_consultas"] for f in filas]
+        print(f"{fase:<10} seg: día 1={segundos[0]:.2f} último={segundos[-1]:.2f} máx={max(segundos):.2f}  "
+              f"consultas: día 1={consultas[0]} último={consultas[-1]} máx={max(consultas)}")
+    print(f"mensajes   total={sum(f['mensajes'] for f in filas)} máx/día={max(f['mensajes'] for f in filas)}")
+    print(f"retención incompleta (presupuesto agotado): {sum(bool(f['retencion_incompleta']) for f in filas)} días")
+    for tabla in TABLAS:
+        print(f"{tabla:<22} filas {primera[tabla + '_filas']:>10} → {ultima[tabla + '_filas']:>10}   "
+              f"MB {primera[tabla + '_mb']:>8} → {ultima[tabla + '_mb']:>8}")
+    print(f"Detalle por día en {ruta}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lineas", type=int, default=100_000)
+    parser.add_argument("--recursos", type=int, default=1_000_000, help="Aproximado: se redondea a compras enteras")
+    parser.add_argument("--usuarios", type=int, default=30_000)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--inicio", help="Primer día simulado (AAAA-MM-DD); por defecto, hoy")
+    parser.add_argument("--bajas-dia", type=float, default=0.001, help="Fracción de líneas dadas de baja cada día")
+    parser.add_argument("--salida", default="simulacion.csv")
+    asyncio.run(simular(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
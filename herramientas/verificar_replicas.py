@@ -0,0 +1,103 @@
+# herramientas/verificar_replicas.py
+"""Comprueba el enrutado de lecturas a réplicas con dos instancias locales de Postgres.
+
+Uso: python -m herramientas.verificar_replicas --primaria DSN --replica DSN [--ventana 1]
+
+Las instancias pueden ser independientes (p. ej. dos contenedores en los puertos 5432 y
+5433): no hace falta replicación. Se marca cada instancia con su nombre en una tabla
+auxiliar y se comprueba a cuál va cada conexión:
+escrituras → primaria; lecturas → réplica; lecturas del mismo usuario justo después de
+escribir → primaria hasta que pasa la ventana; réplica caída → primaria.
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+
+TABLA = "verificacion_nodo"
+
+def marcar_nodo(dsn, nombre):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {TABLA} (nombre TEXT)")
+    cur.execute(f"TRUNCATE {TABLA}")
+    cur.execute(f"INSERT INTO {TABLA} VALUES (%s)", (nombre,))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def borrar_marca(dsn):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DROP TABLE IF EXISTS {TABLA}")
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--primaria", required=True)
+    parser.add_argument("--replica", required=True)
+    parser.add_argument("--ventana", type=float, default=1.0, help="DB_LECTURA_PROPIA_SEG para la prueba")
+    args = parser.parse_args()
+
+    # Antes de importar config: la configuración se lee del entorno
+    os.environ["DATABASE_URL"] = args.primaria
+    os.environ["DATABASE_REPLICA_URLS"] = args.replica
+    os.environ["DB_LECTURA_PROPIA_SEG"] = str(args.ventana)
+    os.environ.setdefault("DB_SSLMODE", "disable")
+    from database import connection
+    from database.pool import PoolConexiones
+
+    marcar_nodo(args.primaria, "primaria")
+    marcar_nodo(args.replica, "replica")
+
+    def nodo(**kwargs):
+        conn = connection.get_db_connection(**kwargs)
+        cur = conn.cursor()
+        cur.execute(f"SELECT nombre FROM {TABLA}")
+        nombre = cur.fetchone()[0]
+        cur.close()
+        conn.close()
+        return nombre
+
+    fallos = 0
+
+    def comprobar(descripcion, obtenido, esperado):
+        nonlocal fallos
+        ok = obtenido == esperado
+        fallos += not ok
+        print(f"{'✅' if ok else '❌'} {descripcion}: {obtenido} (esperado {esperado})")
+
+    try:
+        comprobar("Conexión de escritura", nodo(), "primaria")
+        comprobar("Lectura sin escrituras previas", nodo(solo_lectura=True, propietario_id=1), "replica")
+
+        connection.marcar_escritura(1)
+        comprobar("Lectura del mismo usuario tras escribir", nodo(solo_lectura=True, propietario_id=1), "primaria")
+        comprobar("Lectura de otro usuario", nodo(solo_lectura=True, propietario_id=2), "replica")
+
+        time.sleep(args.ventana + 0.1)
+        comprobar("Lectura del usuario pasada la ventana", nodo(solo_lectura=True, propietario_id=1), "replica")
+
+        connection.marcar_escritura(None)
+        comprobar("Lectura tras un cambio global", nodo(solo_lectura=True, propietario_id=3), "primaria")
+        time.sleep(args.ventana + 0.1)
+
+        # Réplica inalcanzable: la lectura cae a la primaria
+        replicas = connection._pools_replica
+        connection._pools_replica = [PoolConexiones("host=127.0.0.1 port=1 connect_timeout=1", 0, 1, 1)]
+        comprobar("Lectura con la réplica caída", nodo(solo_lectura=True, propietario_id=4), "primaria")
+        connection._pools_replica = replicas
+
+        print(f"Métricas: {connection.METRICAS_LECTURAS}")
+    finally:
+        borrar_marca(args.primaria)
+        borrar_marca(args.replica)
+
+    sys.exit(1 if fallos else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# modules/autorizacion.py
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, CommandHandler, ContextTypes, TypeHandler
+from database.cambios import publicar_cambio
+from database.connection import get_db_connection
+from utils.auth import is_user_authorized, es_administrador
+from utils.actividad import registrar_actividad
+
+MENSAJE_NO_AUTORIZADO = (
+    "🚫 Lo siento, no tienes permiso para usar este bot.\n"
+    "Contacta al administrador para obtener acceso."
+)
+
+async def verificar_autorizacion(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Grupo -1: corta cualquier update de un usuario no autorizado antes de los demás handlers."""
+    user = update.effective_user
+    if user and is_user_authorized(user.id):
+        registrar_actividad(user)  # Solo en memoria; se vuelca por lotes
+        return
+
+    if update.callback_query:
+        await update.callback_query.answer(MENSAJE_NO_AUTORIZADO, show_alert=True)
+    elif update.effective_message and user:
+        await update.effective_message.reply_text(MENSAJE_NO_AUTORIZADO)
+    raise ApplicationHandlerStop
+
+def _leer_id_objetivo(context):
+    if len(context.args) != 1 or not context.args[0].lstrip("-").isdigit():
+        return None
+    return int(context.args[0])
+
+async def autorizar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/autorizar <id>: da acceso a un usuario (solo administradores)."""
+    if not es_administrador(update.effective_user.id):
+        await update.message.reply_text("🚫 Solo un administrador puede autorizar usuarios.")
+        return
+
+    objetivo = _leer_id_objetivo(context)
+    if objetivo is None:
+        await update.message.reply_text("ℹ️ Uso: `/autorizar <id de Telegram>`", parse_mode="Markdown")
+        return
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO usuarios (id, activo)
+            VALUES (%s, TRUE)
+            ON CONFLICT (id) DO UPDATE SET activo = TRUE;
+        """, (objetivo,))
+        conn.commit()
+        mensaje = f"✅ Usuario {objetivo} autorizado."
+    except Exception as e:
+        print(f"Error al autorizar usuario: {e}")
+        conn.rollback()
+        mensaje = "❌ Hubo un error al autorizar al usuario."
+    finally:
+        cur.close()
+        conn.close()
+
+    # Aplicarlo ya en este proceso; los demás lo reciben por NOTIFY
+    publicar_cambio("usuarios", objetivo)
+    await update.message.reply_text(mensaje)
+
+async def revocar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/revocar <id>: quita el acceso a un usuario (solo administradores)."""
+    if not es_administrador(update.effective_user.id):
+        await update.message.reply_text("🚫 Solo un administrador puede revocar usuarios.")
+        return
+
+    objetivo = _leer_id_objetivo(context)
+    if objetivo is None:
+        await update.message.reply_text("ℹ️ Uso: `/revocar <id de Telegram>`", parse_mode="Markdown")
+        return
+    if es_administrador(objetivo):
+        await update.message.reply_text("❌ No se puede revocar a un administrador (se define en ADMIN_ID).")
+        return
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE usuarios SET activo = FALSE WHERE id = %s", (objetivo,))
+        conn.commit()
+        if cur.rowcount == 0:
+            mensaje = f"📭 El usuario {objetivo} no está registrado."
+        else:
+            mensaje = f"✅ Acceso revocado al usuario {objetivo}."
+    except Exception as e:
+        print(f"Error al revocar usuario: {e}")
+        conn.rollback()
+        mensaje = "❌ Hubo un error al revocar al usuario."
+    finally:
+        cur.close()
+        conn.close()
+
+    publicar_cambio("usuarios", objetivo)
+    await update.message.reply_text(mensaje)
+
+def register_handlers(application):
+    # Antes que cualquier otro módulo: grupo -1
+    application.add_handler(TypeHandler(Update, verificar_autorizacion), group=-1)
+
+    application.add_handler(CommandHandler("autorizar", autorizar))
+    application.add_handler(CommandHandler("revocar", revocar))
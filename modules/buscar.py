@@ -0,0 +1,51 @@
+# modules/buscar.py
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.ext import CommandHandler, ContextTypes, InlineQueryHandler
+from telegram.helpers import escape_markdown
+from utils.busqueda_lineas import buscar_lineas
+
+def nombre_linea(numero, alias):
+    return f"{alias or 'Sin alias'} ({numero})"
+
+async def buscar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/buscar <texto>: líneas cuyo número o alias contiene el texto (p. ej. los últimos dígitos)."""
+    texto = " ".join(context.args)
+    if not texto:
+        await update.message.reply_text(
+            "ℹ️ Uso: `/buscar <parte del número o del alias>`\n"
+            "También puedes escribir `@nombre_del_bot texto` en cualquier chat.",
+            parse_mode="Markdown",
+        )
+        return
+
+    resultados = buscar_lineas(update.effective_user.id, texto)
+    if not resultados:
+        await update.message.reply_text(f"🔍 No hay líneas activas que coincidan con «{texto}».")
+        return
+
+    # El texto y los alias los escribe el usuario: escapados para no romper el Markdown
+    partes = [f"🔍 *Líneas que coinciden con «{escape_markdown(texto)}»:*\n"]
+    partes += [f"📱 {escape_markdown(nombre_linea(numero, alias))}" for _, numero, alias in resultados]
+    await update.message.reply_text("\n".join(partes), parse_mode="Markdown")
+
+async def buscar_inline(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Modo inline: resultados mientras se escribe; al elegir uno se envía el número."""
+    consulta = update.inline_query
+    resultados = buscar_lineas(update.effective_user.id, consulta.query) if consulta.query.strip() else []
+    await consulta.answer(
+        [
+            InlineQueryResultArticle(
+                id=str(linea_id),
+                title=nombre_linea(numero, alias),
+                description=numero,
+                input_message_content=InputTextMessageContent(numero),
+            )
+            for linea_id, numero, alias in resultados
+        ],
+        cache_time=5,
+        is_personal=True,  # Cada usuario ve solo sus líneas
+    )
+
+def register_handlers(application):
+    application.add_handler(CommandHandler("buscar", buscar))
+    application.add_handler(InlineQueryHandler(buscar_inline))
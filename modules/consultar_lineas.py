@@ -2,8 +2,10 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import CallbackQueryHandler, ContextTypes
 from database.connection import get_db_connection
-from datetime import date
+from utils.saldos import obtener_saldos_lineas, formatear_saldo
+from utils import reloj
 from utils.recargas import calcular_estado_recarga
+from utils.flujos import FlujoConsulta, iniciar, obtener
 
 
 # Número de líneas por página (para navegación)
@@ -14,23 +16,27 @@ async def mostrar_consulta_lineas(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query
     if query:
         await query.answer()
+    await iniciar_consulta(update, context)
 
+async def iniciar_consulta(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Lee las líneas del usuario y muestra la primera (sin responder al callback)."""
+    query = update.callback_query
     user_id = update.effective_user.id
 
-    # Obtener todas las líneas activas, poniendo la principal primero
-    conn = get_db_connection()
+    # IDs de las líneas activas, poniendo la principal primero
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
     cur = conn.cursor()
     cur.execute("""
-        SELECT id, numero_linea, nombre_alias, fecha_ultima_recarga, es_principal
+        SELECT id
         FROM lineas
         WHERE propietario_id = %s AND activa = TRUE
         ORDER BY es_principal DESC, id ASC  -- Principal primero, luego el resto
     """, (user_id,))
-    lineas = cur.fetchall()
+    linea_ids = [fila[0] for fila in cur.fetchall()]
     cur.close()
     conn.close()
 
-    if not lineas:
+    if not linea_ids:
         texto = "📭 No tienes líneas registradas. Registra una en 'Gestionar Líneas'."
         keyboard = [[InlineKeyboardButton("⬅️ Volver al inicio", callback_data='volver_start_consulta')]]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -41,41 +47,54 @@ async def mostrar_consulta_lineas(update: Update, context: ContextTypes.DEFAULT_
             await update.message.reply_text(text=texto, reply_markup=reply_markup, parse_mode="Markdown")
         return
 
-    # Guardar en contexto para navegación
-    context.user_data['todas_lineas_consulta'] = lineas
-    context.user_data['indice_linea_actual'] = 0
+    # Solo los IDs y la posición: cada línea se lee al mostrarla
+    iniciar(user_id, FlujoConsulta(linea_ids))
 
     await mostrar_linea_actual(update, context)
 
+def leer_linea(linea_id, user_id):
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT numero_linea, nombre_alias, fecha_ultima_recarga, es_principal
+        FROM lineas
+        WHERE id = %s AND propietario_id = %s
+    """, (linea_id, user_id))
+    fila = cur.fetchone()
+    cur.close()
+    conn.close()
+    return fila
+
 async def mostrar_linea_actual(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Muestra la línea actual según el índice."""
-    lineas = context.user_data.get('todas_lineas_consulta', [])
-    indice = context.user_data.get('indice_linea_actual', 0)
-
-    if not lineas or indice >= len(lineas):
+    flujo = obtener(update.effective_user.id, FlujoConsulta)
+    if flujo is None:
+        # Consulta caducada (o reinicio del bot): se vuelve a empezar
+        await iniciar_consulta(update, context)
         return
 
-    linea_id, numero, alias, fecha_ultima_recarga, es_principal = lineas[indice]
+    indice = flujo.indice
+    linea_id = flujo.linea_ids[indice]
+    fila = leer_linea(linea_id, update.effective_user.id)
+    if fila is None:
+        # Borrada mientras se navegaba
+        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔄 Ver líneas", callback_data='consultar_lineas')]])
+        if update.callback_query:
+            await update.callback_query.edit_message_text(text="⚠️ Esa línea ya no existe.", reply_markup=reply_markup)
+        else:
+            await update.message.reply_text(text="⚠️ Esa línea ya no existe.", reply_markup=reply_markup)
+        return
+    numero, alias, fecha_ultima_recarga, es_principal = fila
 
     # Construir mensaje bonito
     titulo = f"📱 *{alias or 'Sin alias'}* (`{numero}`)"
     if es_principal:
         titulo += " ⭐"  # Emoji de estrella para línea principal
 
-    # Obtener recursos activos de esta línea
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT tipo_recurso, cantidad, fecha_vencimiento
-        FROM recursos_linea
-        WHERE linea_id = %s AND activo = TRUE
-        ORDER BY fecha_vencimiento DESC
-    """, (linea_id,))
-    recursos = cur.fetchall()
-    cur.close()
-    conn.close()
+    hoy = reloj.hoy()
 
-    hoy = date.today()
+    # Obtener los saldos vigentes de esta línea
+    recursos = sorted(obtener_saldos_lineas([linea_id]).get(linea_id, []), key=lambda r: r[3], reverse=True)
 
     # Calcular estado de recarga
     if fecha_ultima_recarga:
@@ -94,7 +113,7 @@ async def mostrar_linea_actual(update: Update, context: ContextTypes.DEFAULT_TYP
     # Construir sección de recursos
     if recursos:
         recursos_texto = "📦 *Recursos Activos:*\n"
-        for tipo, cantidad, vence in recursos:
+        for tipo, saldo, asignado, vence in recursos:
             dias_restantes = (vence - hoy).days
             if dias_restantes < 0:
                 estado = f"❌ Vencido (hace {abs(dias_restantes)} días)"
@@ -106,7 +125,7 @@ async def mostrar_linea_actual(update: Update, context: ContextTypes.DEFAULT_TYP
                 estado = f"✅ Activo ({dias_restantes} días)"
                 emoji = "✅"
             recursos_texto += (
-                f"\n▫️ {emoji} *{cantidad} {tipo}* → {estado}\n"
+                f"\n▫️ {emoji} *{formatear_saldo(saldo, asignado)} {tipo}* → {estado}\n"
                 f"   📆 Vence: {vence.strftime('%d/%m/%Y')}\n"
             )
     else:
@@ -122,7 +141,7 @@ async def mostrar_linea_actual(update: Update, context: ContextTypes.DEFAULT_TYP
     )
 
     # Botones de navegación
-    total = len(lineas)
+    total = len(flujo.linea_ids)
     botones = []
 
     if total > 1:
@@ -148,9 +167,11 @@ async def navegar_linea_anterior(update: Update, context: ContextTypes.DEFAULT_T
     query = update.callback_query
     await query.answer()
 
-    indice_actual = context.user_data.get('indice_linea_actual', 0)
-    if indice_actual > 0:
-        context.user_data['indice_linea_actual'] = indice_actual - 1
+    flujo = obtener(update.effective_user.id, FlujoConsulta)
+    if flujo is None:
+        await iniciar_consulta(update, context)
+    elif flujo.indice > 0:
+        flujo.indice -= 1
         await mostrar_linea_actual(update, context)
 
 async def navegar_linea_siguiente(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -158,10 +179,11 @@ async def navegar_linea_siguiente(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query
     await query.answer()
 
-    indice_actual = context.user_data.get('indice_linea_actual', 0)
-    total_lineas = len(context.user_data.get('todas_lineas_consulta', []))
-    if indice_actual < total_lineas - 1:
-        context.user_data['indice_linea_actual'] = indice_actual + 1
+    flujo = obtener(update.effective_user.id, FlujoConsulta)
+    if flujo is None:
+        await iniciar_consulta(update, context)
+    elif flujo.indice < len(flujo.linea_ids) - 1:
+        flujo.indice += 1
         await mostrar_linea_actual(update, context)
 
 async def volver_start_consulta(update: Update, context: ContextTypes.DEFAULT_TYPE):
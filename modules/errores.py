@@ -0,0 +1,36 @@
+# modules/errores.py
+import logging
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from database.circuito import ERRORES_DISPONIBILIDAD
+
+logger = logging.getLogger(__name__)
+
+MENSAJE_INTENTAR_LUEGO = "⏳ El servicio está saturado en este momento. Inténtalo de nuevo en unos minutos."
+
+async def manejar_error(update: object, context: ContextTypes.DEFAULT_TYPE):
+    """Cualquier excepción de un handler termina aquí. Si la base de datos no responde, el usuario
+    recibe un 'inténtalo más tarde' al instante en lugar de quedarse sin respuesta."""
+    if not isinstance(context.error, ERRORES_DISPONIBILIDAD):
+        logger.error("❌ Error no controlado en un handler: %s", context.error, exc_info=context.error)
+        return
+
+    logger.warning("⏳ Base de datos no disponible: %s", context.error)
+    if not isinstance(update, Update):
+        return
+    try:
+        if update.callback_query:
+            await update.callback_query.answer(MENSAJE_INTENTAR_LUEGO, show_alert=True)
+        elif update.effective_message:
+            await update.effective_message.reply_text(MENSAJE_INTENTAR_LUEGO)
+    except Exception as e:
+        # p. ej. el callback ya se había respondido con query.answer()
+        if update.effective_chat:
+            await context.bot.send_message(update.effective_chat.id, MENSAJE_INTENTAR_LUEGO)
+        else:
+            logger.warning("No se pudo avisar al usuario: %s", e)
+
+def register_handlers(application):
+    application.add_error_handler(manejar_error)
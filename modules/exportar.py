@@ -0,0 +1,83 @@
+# modules/exportar.py
+import asyncio
+import csv
+import gzip
+import io
+import tempfile
+from utils import reloj
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+import config
+from database.connection import get_db_connection, fijar_presupuesto
+
+# Filas que trae el cursor del servidor en cada viaje
+FILAS_POR_LOTE = 2000
+
+# Hasta este tamaño el CSV comprimido vive en memoria; a partir de ahí pasa a disco
+MAX_BYTES_EN_MEMORIA = 1024 * 1024
+
+COLUMNAS_EXPORTACION = [
+    "numero_linea", "nombre_alias", "linea_activa", "es_principal", "fecha_ultima_recarga",
+    "tipo_recurso", "cantidad", "fecha_activacion", "fecha_vencimiento", "origen_paquete", "recurso_activo",
+]
+
+def escribir_exportacion(user_id, destino):
+    """Vuelca las líneas y recursos del usuario como CSV comprimido en 'destino'. Devuelve el nº de filas."""
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
+
+    filas = 0
+    try:
+        fijar_presupuesto(conn, config.DB_PRESUPUESTO_FONDO_MS)  # Recorre todo el historial del usuario
+        # Cursor con nombre = cursor del lado del servidor: las filas llegan por lotes
+        cur = conn.cursor(name=f"exportar_{user_id}")
+        cur.itersize = FILAS_POR_LOTE
+        cur.execute("""
+            SELECT l.numero_linea, l.nombre_alias, l.activa, l.es_principal, l.fecha_ultima_recarga,
+                   r.tipo_recurso, r.cantidad, r.fecha_activacion, r.fecha_vencimiento, r.origen_paquete, r.activo
+            FROM lineas l
+            LEFT JOIN recursos_linea r ON r.linea_id = l.id
+            WHERE l.propietario_id = %s
+            ORDER BY l.id, r.id
+        """, (user_id,))
+
+        with gzip.GzipFile(fileobj=destino, mode="wb") as comprimido:
+            texto = io.TextIOWrapper(comprimido, encoding="utf-8", newline="")
+            escritor = csv.writer(texto)
+            escritor.writerow(COLUMNAS_EXPORTACION)
+            for fila in cur:
+                escritor.writerow(fila)
+                filas += 1
+            texto.flush()
+            texto.detach()  # Evita que cerrar el wrapper cierre el gzip antes de tiempo
+
+        cur.close()
+    finally:
+        conn.close()
+
+    destino.seek(0)
+    return filas
+
+async def exportar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Envía al usuario un CSV comprimido con sus líneas y el historial de recursos."""
+    user = update.effective_user
+
+    await update.message.reply_text("⏳ Preparando tu exportación...")
+
+    with tempfile.SpooledTemporaryFile(max_size=MAX_BYTES_EN_MEMORIA) as archivo:
+        try:
+            # La consulta y la compresión son bloqueantes: se hacen fuera del event loop
+            filas = await asyncio.to_thread(escribir_exportacion, user.id, archivo)
+        except Exception as e:
+            print(f"❌ Error al exportar datos: {e}")
+            await update.message.reply_text("❌ Hubo un error al generar la exportación. Inténtalo de nuevo.")
+            return
+
+        await update.message.reply_document(
+            document=archivo,
+            filename=f"lineas_{reloj.hoy().strftime('%Y%m%d')}.csv.gz",
+            caption=f"📤 Exportación completada: {filas} filas.",
+        )
+
+def register_handlers(application):
+    application.add_handler(CommandHandler("exportar", exportar))
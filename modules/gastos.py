@@ -0,0 +1,77 @@
+# modules/gastos.py
+from datetime import date
+from utils import reloj
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+from telegram.helpers import escape_markdown
+
+from database.connection import get_db_connection
+from database.gastos import LINEA_TOTAL_PROPIETARIO
+from database.particiones import inicio_mes
+
+MESES_INFORME = 6
+MESES = ["", "Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+ICONOS_TIPO = {"recarga": "🔋", "paquete": "📦"}
+
+def mes_hace(mes, meses):
+    """Primer día del mes que está 'meses' meses antes de 'mes'."""
+    indice = mes.year * 12 + mes.month - 1 - meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+def leer_gastos(user_id, hoy):
+    """Totales ya agregados: los del usuario de los últimos meses y los del mes actual por línea."""
+    mes_actual = inicio_mes(hoy)
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT mes, tipo, total, operaciones, sin_importe
+            FROM gastos_mensuales
+            WHERE propietario_id = %s AND linea_id = %s AND mes >= %s
+            ORDER BY mes DESC, tipo
+        """, (user_id, LINEA_TOTAL_PROPIETARIO, mes_hace(mes_actual, MESES_INFORME - 1)))
+        por_mes = cur.fetchall()
+        cur.execute("""
+            SELECT g.linea_id, l.nombre_alias, l.numero_linea, SUM(g.total)
+            FROM gastos_mensuales g
+            LEFT JOIN lineas l ON l.id = g.linea_id
+            WHERE g.propietario_id = %s AND g.mes = %s AND g.linea_id <> %s
+            GROUP BY g.linea_id, l.nombre_alias, l.numero_linea
+            ORDER BY SUM(g.total) DESC
+        """, (user_id, mes_actual, LINEA_TOTAL_PROPIETARIO))
+        por_linea = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
+    return por_mes, por_linea
+
+def formatear_gastos(por_mes, por_linea, hoy):
+    if not por_mes:
+        return "📭 *Todavía no hay gastos registrados.*\nLas recargas y compras de paquetes aparecerán aquí."
+
+    partes = [f"💰 *GASTOS (últimos {MESES_INFORME} meses)*"]
+    mes_previo = None
+    for mes, tipo, total, operaciones, sin_importe in por_mes:
+        if mes != mes_previo:
+            partes.append(f"\n📅 *{MESES[mes.month]} {mes.year}*")
+            mes_previo = mes
+        detalle = f"{operaciones}, {sin_importe} sin importe" if sin_importe else f"{operaciones}"
+        partes.append(f"   {ICONOS_TIPO.get(tipo, '•')} {tipo.capitalize()}: ${total} ({detalle})")
+
+    if por_linea:
+        partes.append(f"\n📱 *Por línea en {MESES[hoy.month]}:*")
+        for _, alias, numero, total in por_linea:
+            # Alias y número los escribe el usuario: escapados para no romper el Markdown
+            nombre = escape_markdown(f"{alias or 'Sin alias'} ({numero})") if numero else "Línea eliminada"
+            partes.append(f"   {nombre}: ${total}")
+    return "\n".join(partes)
+
+async def gastos(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/gastos: gasto mensual en recargas y paquetes (lee unas pocas filas precalculadas)."""
+    hoy = reloj.hoy()
+    por_mes, por_linea = leer_gastos(update.effective_user.id, hoy)
+    await update.message.reply_text(formatear_gastos(por_mes, por_linea, hoy), parse_mode="Markdown")
+
+def register_handlers(application):
+    application.add_handler(CommandHandler("gastos", gastos))
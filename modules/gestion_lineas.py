@@ -1,65 +1,25 @@
 # modules/gestionar_lineas.py
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import CallbackQueryHandler, ContextTypes, MessageHandler, filters
-from database.connection import get_db_connection
-from utils.auth import is_user_authorized
-from datetime import date, timedelta
+from database.connection import get_db_connection, marcar_escritura
+from database.archivo import sql_archivar
+from utils.cache_lineas import obtener_lineas_activas, invalidar_lineas
+from utils.flujos import FlujoAgregarLinea, FlujoEliminarLinea, iniciar, obtener, terminar
 
 # Estados para el flujo de agregar línea
 ESTADO_AGREGAR_NUMERO = "agregar_numero"
 ESTADO_AGREGAR_ALIAS = "agregar_alias"
 
-async def limpiar_lineas_antiguas():
-    """Elimina permanentemente líneas inactivas con más de 7 días de inactividad + sus recursos."""
-    conn = get_db_connection()
-    if not conn:
-        return
-
-    try:
-        cur = conn.cursor()
-
-        # Obtener líneas inactivas con más de 7 días
-        cur.execute("""
-            SELECT id
-            FROM lineas
-            WHERE activa = FALSE AND fecha_registro <= %s
-        """, (date.today() - timedelta(days=7),))
-        lineas_a_borrar = cur.fetchall()
-
-        for (linea_id,) in lineas_a_borrar:
-            # Primero borrar recursos asociados
-            cur.execute("DELETE FROM recursos_linea WHERE linea_id = %s", (linea_id,))
-            # Luego borrar la línea
-            cur.execute("DELETE FROM lineas WHERE id = %s", (linea_id,))
-            print(f"🧹 Línea {linea_id} y sus recursos eliminados permanentemente por antigüedad.")
-
-        conn.commit()
-        if lineas_a_borrar:
-            print(f"✅ Limpieza automática completada: {len(lineas_a_borrar)} líneas eliminadas.")
-    except Exception as e:
-        print(f"❌ Error en limpieza automática: {e}")
-    finally:
-        cur.close()
-        conn.close()
-
 async def mostrar_gestion_lineas(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Muestra directamente las líneas registradas + botones de acción."""
     query = update.callback_query
     if query:
         await query.answer()
 
-    # Ejecutar limpieza automática al cargar el módulo
-    await limpiar_lineas_antiguas()
-
     user_id = update.effective_user.id
 
     # Obtener todas las líneas activas del usuario
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, numero_linea, nombre_alias FROM lineas WHERE propietario_id = %s AND activa = TRUE", (user_id,))
-    lineas = cur.fetchall()
-    cur.close()
-    conn.close()
+    lineas = obtener_lineas_activas(user_id)
 
     # Construir mensaje con la lista de líneas
     if not lineas:
@@ -91,8 +51,8 @@ async def iniciar_agregar_linea(update: Update, context: ContextTypes.DEFAULT_TY
     query = update.callback_query
     await query.answer()
 
-    # Guardamos en el contexto que el usuario está en modo "agregar"
-    context.user_data['estado'] = ESTADO_AGREGAR_NUMERO
+    # Marcamos que el usuario está en modo "agregar"
+    iniciar(query.from_user.id, FlujoAgregarLinea(ESTADO_AGREGAR_NUMERO))
 
     await query.edit_message_text(
         text="📲 Por favor, envía el *número de la línea* (solo dígitos, sin espacios ni guiones):",
@@ -104,19 +64,21 @@ async def manejar_respuesta_agregar(update: Update, context: ContextTypes.DEFAUL
     user_id = update.effective_user.id
     texto = update.message.text.strip()
 
-    estado = context.user_data.get('estado')
+    flujo = obtener(user_id, FlujoAgregarLinea)
+    if flujo is None:
+        return
 
-    if estado == ESTADO_AGREGAR_NUMERO:
+    if flujo.paso == ESTADO_AGREGAR_NUMERO:
         # Validar que sea solo dígitos
         if not texto.isdigit():
             await update.message.reply_text("❌ Por favor, envía solo números (sin espacios, guiones ni letras).")
             return
 
-        context.user_data['numero_linea'] = texto
-        context.user_data['estado'] = ESTADO_AGREGAR_ALIAS
+        flujo.numero_linea = texto
+        flujo.paso = ESTADO_AGREGAR_ALIAS
         await update.message.reply_text(f"✅ Número guardado: {texto}\n\n✏️ Ahora envía un *alias* para esta línea (ej: 'Línea personal', 'Trabajo', etc.):", parse_mode="Markdown")
 
-    elif estado == ESTADO_AGREGAR_ALIAS:
+    elif flujo.paso == ESTADO_AGREGAR_ALIAS:
         alias = texto
 
         # Guardar en la base de datos
@@ -131,12 +93,14 @@ async def manejar_respuesta_agregar(update: Update, context: ContextTypes.DEFAUL
                     saldo_actual = EXCLUDED.saldo_actual,
                     activa = TRUE;
             """, (
-                context.user_data['numero_linea'],
+                flujo.numero_linea,
                 alias,
                 0.00,
                 user_id
             ))
             conn.commit()
+            invalidar_lineas(user_id)
+            marcar_escritura(user_id)
             mensaje = "✅ ¡Línea agregada correctamente!"
         except Exception as e:
             print(f"Error al guardar línea: {e}")
@@ -145,8 +109,8 @@ async def manejar_respuesta_agregar(update: Update, context: ContextTypes.DEFAUL
             cur.close()
             conn.close()
 
-        # Limpiar el estado
-        context.user_data.clear()
+        # Limpiar el estado (solo el de este flujo, no el de otros en curso)
+        terminar(user_id, FlujoAgregarLinea)
 
         # Mostrar mensaje de éxito y botón para volver
         keyboard = [[InlineKeyboardButton("⬅️ Volver al menú de líneas", callback_data='gestionar_lineas')]]
@@ -160,12 +124,7 @@ async def eliminar_linea(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     user_id = update.effective_user.id
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, numero_linea, nombre_alias FROM lineas WHERE propietario_id = %s AND activa = TRUE", (user_id,))
-    lineas = cur.fetchall()
-    cur.close()
-    conn.close()
+    lineas = obtener_lineas_activas(user_id)
 
     if not lineas:
         texto = "📭 No tienes líneas para eliminar."
@@ -192,7 +151,7 @@ async def confirmar_eliminar_linea(update: Update, context: ContextTypes.DEFAULT
     await query.answer()
 
     linea_id = int(query.data.split('_')[-1])
-    context.user_data['linea_id_a_eliminar'] = linea_id
+    iniciar(query.from_user.id, FlujoEliminarLinea(linea_id))
 
     keyboard = [
         [InlineKeyboardButton("🗑️ Eliminar Lógicamente", callback_data='eliminar_logico')],
@@ -212,18 +171,22 @@ async def eliminar_logico(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    linea_id = context.user_data.get('linea_id_a_eliminar')
-    if not linea_id:
+    user_id = update.effective_user.id
+
+    flujo = obtener(user_id, FlujoEliminarLinea)
+    if flujo is None:
         await query.edit_message_text("❌ Error: no se seleccionó una línea.")
         return
-
-    user_id = update.effective_user.id
+    linea_id = flujo.linea_id
+    terminar(user_id, FlujoEliminarLinea)
 
     conn = get_db_connection()
     cur = conn.cursor()
     try:
         cur.execute("UPDATE lineas SET activa = FALSE WHERE id = %s AND propietario_id = %s", (linea_id, user_id))
         conn.commit()
+        invalidar_lineas(user_id)
+        marcar_escritura(user_id)
         if cur.rowcount == 0:
             mensaje = "❌ No se pudo eliminar la línea (no existe o no te pertenece)."
         else:
@@ -240,25 +203,37 @@ async def eliminar_logico(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text(text=mensaje, reply_markup=reply_markup)
 
 async def eliminar_permanente(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Borra la línea y todos sus recursos permanentemente."""
+    """Borra la línea y sus recursos; el historial de recursos pasa al archivo."""
     query = update.callback_query
     await query.answer()
 
-    linea_id = context.user_data.get('linea_id_a_eliminar')
-    if not linea_id:
+    user_id = update.effective_user.id
+
+    flujo = obtener(user_id, FlujoEliminarLinea)
+    if flujo is None:
         await query.edit_message_text("❌ Error: no se seleccionó una línea.")
         return
-
-    user_id = update.effective_user.id
+    linea_id = flujo.linea_id
+    terminar(user_id, FlujoEliminarLinea)
 
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        # Primero borrar recursos asociados
-        cur.execute("DELETE FROM recursos_linea WHERE linea_id = %s", (linea_id,))
-        # Luego borrar la línea
-        cur.execute("DELETE FROM lineas WHERE id = %s AND propietario_id = %s", (linea_id, user_id))
+        # Archivar y borrar los recursos, y luego la línea, en una sola sentencia
+        cur.execute(f"""
+            WITH linea AS (
+                SELECT id FROM lineas WHERE id = %s AND propietario_id = %s
+            ), recursos AS (
+                DELETE FROM recursos_linea WHERE linea_id IN (SELECT id FROM linea)
+                RETURNING *
+            ), archivados AS (
+                {sql_archivar("recursos")}
+            )
+            DELETE FROM lineas WHERE id IN (SELECT id FROM linea)
+        """, (linea_id, user_id))
         conn.commit()
+        invalidar_lineas(user_id)
+        marcar_escritura(user_id)
         if cur.rowcount == 0:
             mensaje = "❌ No se pudo eliminar la línea (no existe o no te pertenece)."
         else:
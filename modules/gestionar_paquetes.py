@@ -1,20 +1,15 @@
 # modules/gestionar_paquetes.py
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import CallbackQueryHandler, ContextTypes
-from database.connection import get_db_connection
+from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes
+from database.connection import get_db_connection, marcar_escritura
+from utils.catalogo_paquetes import obtener_paquete, obtener_paquetes
+from utils.saldos import TIPOS_RECURSO, registrar_consumo
+from utils.cache_lineas import obtener_lineas_activas
+from utils.flujos import MENSAJE_FLUJO_CADUCADO, FlujoPaquete, iniciar, obtener, terminar
 from datetime import date, timedelta
-
-# Definición de paquetes (ID, Descripción, Precio)
-PAQUETES = [
-    (1, "2GB + 15min + 20 SMS", 120.0),
-    (2, "4GB + 35min + 40 SMS", 240.0),
-    (3, "6GB + 60min + 70 SMS", 360.0),
-    (4, "4.5GB", 240.0),
-    (5, "5min", 37.5),
-    (6, "20 SMS", 15.0),
-]
-
-DIAS_VIGENCIA = 35
+from database.particiones import fecha_limite_retencion
+from utils import reloj
+import math
 
 # Estados para selección de fecha
 ESTADO_ELEGIR_AÑO_PAQUETE = "elegir_año_paquete"
@@ -30,7 +25,7 @@ async def mostrar_gestion_paquetes(update: Update, context: ContextTypes.DEFAULT
     user_id = update.effective_user.id
 
     # Obtener línea principal
-    conn = get_db_connection()
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
     cur = conn.cursor()
     cur.execute("""
         SELECT id, numero_linea, nombre_alias
@@ -57,20 +52,19 @@ async def mostrar_gestion_paquetes(update: Update, context: ContextTypes.DEFAULT
 
     linea_id, numero, alias = linea_principal
     nombre_linea = f"{alias or 'Sin alias'} ({numero})"
+    hoy = reloj.hoy()
 
     # Obtener recursos activos de la línea principal
     cur.execute("""
         SELECT tipo_recurso, cantidad, fecha_activacion, fecha_vencimiento, origen_paquete
         FROM recursos_linea
-        WHERE linea_id = %s AND activo = TRUE
+        WHERE linea_id = %s AND activo = TRUE AND fecha_vencimiento >= %s
         ORDER BY tipo_recurso, fecha_vencimiento DESC
-    """, (linea_id,))
+    """, (linea_id, fecha_limite_retencion(hoy)))
     recursos = cur.fetchall()
     cur.close()
     conn.close()
 
-    hoy = date.today()
-
     # Construir mensaje
     texto = f"📦 *Gestión de Paquetes*\n*Línea Principal:* {nombre_linea}\n\n"
 
@@ -128,12 +122,7 @@ async def seleccionar_linea_principal(update: Update, context: ContextTypes.DEFA
 
     user_id = update.effective_user.id
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, numero_linea, nombre_alias FROM lineas WHERE propietario_id = %s AND activa = TRUE", (user_id,))
-    lineas = cur.fetchall()
-    cur.close()
-    conn.close()
+    lineas = obtener_lineas_activas(user_id)
 
     if not lineas:
         texto = "📭 No tienes líneas registradas. Registra una primero en 'Gestionar Líneas'."
@@ -168,6 +157,7 @@ async def set_linea_principal(update: Update, context: ContextTypes.DEFAULT_TYPE
         cur.execute("UPDATE lineas SET es_principal = FALSE WHERE propietario_id = %s", (user_id,))
         cur.execute("UPDATE lineas SET es_principal = TRUE WHERE id = %s", (linea_id,))
         conn.commit()
+        marcar_escritura(user_id)
         mensaje = "✅ ¡Línea marcada como principal!"
     except Exception as e:
         print(f"Error al marcar línea principal: {e}")
@@ -191,7 +181,7 @@ async def comprar_paquete(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     user_id = update.effective_user.id
 
-    conn = get_db_connection()
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
     cur = conn.cursor()
     cur.execute("SELECT id, numero_linea, nombre_alias FROM lineas WHERE propietario_id = %s AND es_principal = TRUE AND activa = TRUE", (user_id,))
     linea_principal = cur.fetchone()
@@ -208,12 +198,12 @@ async def comprar_paquete(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     linea_id, numero, alias = linea_principal
-    context.user_data['linea_id_paquete'] = linea_id
+    iniciar(query.from_user.id, FlujoPaquete(linea_id))
 
     texto = f"📦 *Línea Principal: {alias or 'Sin alias'} ({numero})*\n\n*Elige un paquete para comprar:*"
     keyboard = []
-    for pid, desc, precio in PAQUETES:
-        keyboard.append([InlineKeyboardButton(f"{desc} - ${precio}", callback_data=f'paquete_{pid}')])
+    for paquete in obtener_paquetes():
+        keyboard.append([InlineKeyboardButton(f"{paquete.descripcion} - ${paquete.precio}", callback_data=f'paquete_{paquete.id}')])
 
     keyboard.append([InlineKeyboardButton("⬅️ Volver", callback_data='gestionar_paquetes')])
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -226,13 +216,17 @@ async def elegir_paquete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     paquete_id = int(query.data.split('_')[-1])
-    paquete = next((p for p in PAQUETES if p[0] == paquete_id), None)
+    paquete = obtener_paquete(paquete_id)
 
     if not paquete:
         await query.edit_message_text("❌ Paquete no encontrado.")
         return
 
-    context.user_data['paquete_seleccionado'] = paquete  # (id, desc, precio)
+    flujo = obtener(query.from_user.id, FlujoPaquete)
+    if flujo is None:
+        await query.edit_message_text(MENSAJE_FLUJO_CADUCADO)
+        return
+    flujo.paquete_id = paquete.id
 
     keyboard = [
         [InlineKeyboardButton("✅ Usar fecha actual (hoy)", callback_data='fecha_actual_paquete')],
@@ -242,89 +236,112 @@ async def elegir_paquete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     await query.edit_message_text(
-        text=f"📆 *Has elegido: {paquete[1]} - ${paquete[2]}*\n\n*¿Qué fecha de compra deseas registrar?*",
+        text=f"📆 *Has elegido: {paquete.descripcion} - ${paquete.precio}*\n\n*¿Qué fecha de compra deseas registrar?*",
         reply_markup=reply_markup,
         parse_mode="Markdown"
     )
 
 # ▼▼▼ REUTILIZAMOS LÓGICA DE FECHAS (con prefijos para paquetes) ▼▼▼
 
-async def extraer_recursos_de_paquete(tipo_paquete: str) -> list:
-    """Extrae recursos individuales (GB, min, SMS) de un paquete."""
-    recursos = []
-    tipo_lower = tipo_paquete.lower()
-
-    if "gb" in tipo_lower:
-        import re
-        match_gb = re.search(r'(\d+\.?\d*)\s*gb', tipo_lower)
-        if match_gb:
-            recursos.append(('datos', float(match_gb.group(1))))
-
-    if "min" in tipo_lower:
-        match_min = re.search(r'(\d+\.?\d*)\s*min', tipo_lower)
-        if match_min:
-            recursos.append(('minutos', float(match_min.group(1))))
-
-    if "sms" in tipo_lower:
-        match_sms = re.search(r'(\d+\.?\d*)\s*sms', tipo_lower)
-        if match_sms:
-            recursos.append(('sms', float(match_sms.group(1))))
-
-    return recursos
-
-async def registrar_recursos(linea_id: int, recursos: list, fecha_compra: date, conn, tipo_paquete: str):
-    """Registra o actualiza recursos individuales para una línea."""
-    vencimiento = fecha_compra + timedelta(days=DIAS_VIGENCIA)
+# Compra en una sola sentencia: desactiva los recursos anteriores del mismo tipo, inserta
+# todos los componentes del paquete, los anota como asignaciones en el libro de movimientos,
+# reinicia el saldo de cada tipo y guarda el precio pagado en el historial de gastos.
+# El bloqueo previo de la fila de la línea (en el mismo viaje al servidor) serializa compras
+# concurrentes sobre la misma línea: la segunda espera y su CTE ya ve los recursos insertados
+# por la primera.
+SQL_REGISTRAR_COMPRA = """
+    SELECT 1 FROM lineas WHERE id = %(linea_id)s FOR NO KEY UPDATE;
+    WITH nuevos (tipo_recurso, cantidad) AS (
+        SELECT * FROM unnest(%(tipos)s::varchar[], %(cantidades)s::decimal[])
+    ), desactivados AS (
+        UPDATE recursos_linea
+        SET activo = FALSE
+        WHERE linea_id = %(linea_id)s AND activo = TRUE AND fecha_vencimiento >= %(fecha_minima)s
+          AND tipo_recurso IN (SELECT tipo_recurso FROM nuevos)
+    ), insertados AS (
+        INSERT INTO recursos_linea (linea_id, tipo_recurso, cantidad, fecha_activacion, fecha_vencimiento, origen_paquete)
+        SELECT %(linea_id)s, tipo_recurso, cantidad, %(fecha_compra)s, %(vencimiento)s, %(origen)s
+        FROM nuevos
+        RETURNING id, tipo_recurso, cantidad, fecha_vencimiento
+    ), movimientos AS (
+        INSERT INTO movimientos_recurso (linea_id, tipo_recurso, tipo_movimiento, cantidad, fecha, origen)
+        SELECT %(linea_id)s, tipo_recurso, 'asignacion', cantidad, %(fecha_compra)s, %(origen)s
+        FROM nuevos
+        RETURNING id, tipo_recurso, cantidad
+    ), saldos AS (
+        INSERT INTO saldos_linea
+            (linea_id, tipo_recurso, asignado, consumido, saldo, fecha_vencimiento, ultimo_movimiento_id, actualizado_en)
+        SELECT %(linea_id)s, tipo_recurso, cantidad, 0, cantidad, %(vencimiento)s, id, NOW()
+        FROM movimientos
+        ON CONFLICT (linea_id, tipo_recurso) DO UPDATE
+        SET asignado = EXCLUDED.asignado,
+            consumido = 0,
+            saldo = EXCLUDED.saldo,
+            fecha_vencimiento = EXCLUDED.fecha_vencimiento,
+            ultimo_movimiento_id = EXCLUDED.ultimo_movimiento_id,
+            actualizado_en = NOW()
+    ), gasto AS (
+        INSERT INTO historial_gastos (propietario_id, linea_id, numero_linea, tipo, concepto, monto, fecha)
+        SELECT propietario_id, id, numero_linea, 'paquete', %(origen)s, %(precio)s, %(fecha_compra)s
+        FROM lineas
+        WHERE id = %(linea_id)s
+    )
+    SELECT id, tipo_recurso, cantidad, fecha_vencimiento FROM insertados
+"""
+
+def parametros_compra(linea_id, paquete, fecha_compra):
+    return {
+        "linea_id": linea_id,
+        "tipos": [tipo for tipo, _ in paquete.componentes],
+        "cantidades": [cantidad for _, cantidad in paquete.componentes],
+        "fecha_minima": fecha_limite_retencion(fecha_compra),
+        "fecha_compra": fecha_compra,
+        "vencimiento": fecha_compra + timedelta(days=paquete.dias_vigencia),
+        "origen": paquete.descripcion,
+        "precio": paquete.precio,
+    }
+
+async def registrar_recursos(linea_id: int, paquete, fecha_compra: date):
+    """Registra los recursos de un paquete para una línea. Devuelve las filas nuevas."""
+    conn = get_db_connection()
     cur = conn.cursor()
 
     try:
-        for tipo, cantidad in recursos:
-            cur.execute("""
-                UPDATE recursos_linea
-                SET activo = FALSE
-                WHERE linea_id = %s AND tipo_recurso = %s AND activo = TRUE
-            """, (linea_id, tipo))
-
-            cur.execute("""
-                INSERT INTO recursos_linea (linea_id, tipo_recurso, cantidad, fecha_activacion, fecha_vencimiento, origen_paquete)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (linea_id, tipo, cantidad, fecha_compra, vencimiento, tipo_paquete))
-
+        cur.execute(SQL_REGISTRAR_COMPRA, parametros_compra(linea_id, paquete, fecha_compra))
+        nuevos = cur.fetchall()
         conn.commit()
+        return nuevos
     except Exception as e:
         print(f"Error al registrar recursos: {e}")
         conn.rollback()
         raise e
     finally:
         cur.close()
+        conn.close()
 
 async def usar_fecha_actual_paquete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Registra los recursos del paquete con fecha de hoy."""
     query = update.callback_query
     await query.answer()
 
-    paquete = context.user_data.get('paquete_seleccionado')
-    linea_id = context.user_data.get('linea_id_paquete')
+    flujo = obtener(query.from_user.id, FlujoPaquete)
+    paquete = obtener_paquete(flujo.paquete_id) if flujo else None
 
-    if not paquete or not linea_id:
+    if not paquete:
         await query.edit_message_text("❌ Error: datos incompletos.")
         return
+    linea_id = flujo.linea_id
+    terminar(query.from_user.id, FlujoPaquete)
 
-    hoy = date.today()
-    recursos = await extraer_recursos_de_paquete(paquete[1])
+    hoy = reloj.hoy()
 
-    conn = get_db_connection()
     try:
-        await registrar_recursos(linea_id, recursos, hoy, conn, paquete[1])
-        mensaje = f"✅ ¡Recursos registrados!\nActivados desde: {hoy.strftime('%d/%m/%Y')}\nVigencia: 35 días."
+        await registrar_recursos(linea_id, paquete, hoy)
+        marcar_escritura(query.from_user.id)
+        mensaje = f"✅ ¡Recursos registrados!\nActivados desde: {hoy.strftime('%d/%m/%Y')}\nVigencia: {paquete.dias_vigencia} días."
     except Exception as e:
         print(f"Error al registrar recursos: {e}")
         mensaje = "❌ Error al registrar recursos."
-    finally:
-        conn.close()
-
-    context.user_data.pop('paquete_seleccionado', None)
-    context.user_data.pop('linea_id_paquete', None)
 
     keyboard = [[InlineKeyboardButton("⬅️ Volver", callback_data='gestionar_paquetes')]]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -335,7 +352,7 @@ async def iniciar_seleccion_fecha_botones_paquete(update: Update, context: Conte
     query = update.callback_query
     await query.answer()
 
-    año_actual = date.today().year
+    año_actual = reloj.hoy().year
     años = [año_actual - 2, año_actual - 1, año_actual, año_actual + 1, año_actual + 2]
 
     keyboard = []
@@ -357,7 +374,11 @@ async def seleccionar_año_paquete(update: Update, context: ContextTypes.DEFAULT
     await query.answer()
 
     año = int(query.data.split('_')[-1])
-    context.user_data['año_seleccionado_paq'] = año
+    flujo = obtener(query.from_user.id, FlujoPaquete)
+    if flujo is None:
+        await query.edit_message_text(MENSAJE_FLUJO_CADUCADO)
+        return
+    flujo.año = año
 
     meses = [
         ("Enero", 1), ("Febrero", 2), ("Marzo", 3), ("Abril", 4),
@@ -385,8 +406,12 @@ async def seleccionar_mes_paquete(update: Update, context: ContextTypes.DEFAULT_
     await query.answer()
 
     mes = int(query.data.split('_')[-1])
-    año = context.user_data['año_seleccionado_paq']
-    context.user_data['mes_seleccionado_paq'] = mes
+    flujo = obtener(query.from_user.id, FlujoPaquete)
+    if flujo is None or flujo.año is None:
+        await query.edit_message_text(MENSAJE_FLUJO_CADUCADO)
+        return
+    año = flujo.año
+    flujo.mes = mes
 
     import calendar
     num_dias = calendar.monthrange(año, mes)[1]
@@ -423,10 +448,16 @@ async def seleccionar_dia_paquete(update: Update, context: ContextTypes.DEFAULT_
     await query.answer()
 
     dia = int(query.data.split('_')[-1])
-    mes = context.user_data['mes_seleccionado_paq']
-    año = context.user_data['año_seleccionado_paq']
-    paquete = context.user_data['paquete_seleccionado']
-    linea_id = context.user_data['linea_id_paquete']
+    flujo = obtener(query.from_user.id, FlujoPaquete)
+    if flujo is None or flujo.mes is None:
+        await query.edit_message_text(MENSAJE_FLUJO_CADUCADO)
+        return
+    mes, año, linea_id = flujo.mes, flujo.año, flujo.linea_id
+    paquete = obtener_paquete(flujo.paquete_id)
+
+    if not paquete:
+        await query.edit_message_text("❌ Paquete no encontrado.")
+        return
 
     try:
         fecha_compra = date(año, mes, dia)
@@ -434,20 +465,15 @@ async def seleccionar_dia_paquete(update: Update, context: ContextTypes.DEFAULT_
         await query.edit_message_text("❌ Fecha inválida.")
         return
 
-    recursos = await extraer_recursos_de_paquete(paquete[1])
-
-    conn = get_db_connection()
     try:
-        await registrar_recursos(linea_id, recursos, fecha_compra, conn, paquete[1])
-        mensaje = f"✅ ¡Recursos registrados!\nActivados desde: {fecha_compra.strftime('%d/%m/%Y')}\nVigencia: 35 días."
+        await registrar_recursos(linea_id, paquete, fecha_compra)
+        marcar_escritura(query.from_user.id)
+        mensaje = f"✅ ¡Recursos registrados!\nActivados desde: {fecha_compra.strftime('%d/%m/%Y')}\nVigencia: {paquete.dias_vigencia} días."
     except Exception as e:
         print(f"Error al registrar recursos: {e}")
         mensaje = "❌ Error al registrar recursos."
-    finally:
-        conn.close()
 
-    for key in ['año_seleccionado_paq', 'mes_seleccionado_paq', 'paquete_seleccionado', 'linea_id_paquete']:
-        context.user_data.pop(key, None)
+    terminar(query.from_user.id, FlujoPaquete)
 
     keyboard = [[InlineKeyboardButton("⬅️ Volver", callback_data='gestionar_paquetes')]]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -458,8 +484,7 @@ async def cancelar_seleccion_fecha_paquete(update: Update, context: ContextTypes
     query = update.callback_query
     await query.answer()
 
-    for key in ['año_seleccionado_paq', 'mes_seleccionado_paq', 'paquete_seleccionado', 'linea_id_paquete']:
-        context.user_data.pop(key, None)
+    terminar(query.from_user.id, FlujoPaquete)
 
     await query.edit_message_text(
         text="❌ Selección cancelada.",
@@ -470,6 +495,55 @@ async def cancelar_seleccion_fecha_paquete(update: Update, context: ContextTypes
 
 # ▲▲▲ FIN LÓGICA DE FECHAS PARA PAQUETES ▲▲▲
 
+# ▼▼▼ REGISTRO DE CONSUMO ▼▼▼
+
+async def consumo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/consumo <número> <datos|minutos|sms> <cantidad>: descuenta un consumo del saldo de la línea."""
+    uso = "ℹ️ Uso: `/consumo <número> <datos|minutos|sms> <cantidad>`"
+    if len(context.args) != 3:
+        await update.message.reply_text(uso, parse_mode="Markdown")
+        return
+
+    numero, tipo, cantidad_texto = context.args
+    tipo = tipo.lower()
+    try:
+        cantidad = float(cantidad_texto.replace(",", "."))
+    except ValueError:
+        cantidad = 0
+    # float() acepta 'nan' e 'inf': quedarían grabados en el saldo
+    if tipo not in TIPOS_RECURSO or not math.isfinite(cantidad) or cantidad <= 0:
+        await update.message.reply_text(uso, parse_mode="Markdown")
+        return
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT id FROM lineas WHERE numero_linea = %s AND propietario_id = %s AND activa = TRUE",
+        (numero, update.effective_user.id),
+    )
+    linea = cur.fetchone()
+    cur.close()
+    conn.close()
+
+    if not linea:
+        await update.message.reply_text("❌ No tienes ninguna línea activa con ese número.")
+        return
+
+    try:
+        saldo = registrar_consumo(linea[0], tipo, cantidad)
+        marcar_escritura(update.effective_user.id)
+    except Exception as e:
+        print(f"Error al registrar consumo: {e}")
+        await update.message.reply_text("❌ Hubo un error al registrar el consumo.")
+        return
+
+    if saldo is None:
+        await update.message.reply_text(f"📭 Saldo de {tipo} insuficiente (o vencido) en esa línea.")
+    else:
+        await update.message.reply_text(f"✅ Consumo registrado. Saldo restante: {saldo} {tipo}.")
+
+# ▲▲▲ FIN REGISTRO DE CONSUMO ▲▲▲
+
 # ▼▼▼ NAVEGACIÓN ▼▼▼
 
 async def volver_start_paquetes(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -499,5 +573,8 @@ def register_handlers(application):
     application.add_handler(CallbackQueryHandler(seleccionar_dia_paquete, pattern='^sel_dia_paq_\\d+$'))
     application.add_handler(CallbackQueryHandler(cancelar_seleccion_fecha_paquete, pattern='^cancelar_fecha_paquete$'))
 
+    # Consumo
+    application.add_handler(CommandHandler("consumo", consumo))
+
     # Volver
     application.add_handler(CallbackQueryHandler(volver_start_paquetes, pattern='^volver_start_paquetes$'))
\ No newline at end of file
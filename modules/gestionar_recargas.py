@@ -1,12 +1,30 @@
 # modules/gestionar_recargas.py
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import CallbackQueryHandler, ContextTypes, MessageHandler, filters
-from database.connection import get_db_connection
+from database.connection import get_db_connection, marcar_escritura
+from utils.cache_lineas import obtener_lineas_activas
+from utils.flujos import MENSAJE_FLUJO_CADUCADO, FlujoRecarga, iniciar, obtener, terminar
+from config import MONTO_RECARGA
+import math
 from datetime import date
+from utils import reloj
 import calendar
 
+# Actualiza la fecha de la línea y anota la recarga en el historial en un solo viaje
+SQL_REGISTRAR_RECARGA = """
+    WITH linea AS (
+        UPDATE lineas SET fecha_ultima_recarga = %(fecha)s
+        WHERE id = %(linea_id)s
+        RETURNING id, propietario_id, numero_linea
+    )
+    INSERT INTO historial_gastos (propietario_id, linea_id, numero_linea, tipo, concepto, monto, fecha)
+    SELECT propietario_id, id, numero_linea, 'recarga', 'Recarga', %(monto)s::decimal, %(fecha)s
+    FROM linea
+"""
+
 # Estados para el flujo de recarga
 ESTADO_ELEGIR_LINEA = "elegir_linea_recarga"
+ESTADO_INGRESAR_IMPORTE = "ingresar_importe_recarga"
 ESTADO_ELEGIR_FECHA = "elegir_fecha_recarga"
 ESTADO_INGRESAR_FECHA_MANUAL = "ingresar_fecha_manual"
 
@@ -19,7 +37,7 @@ async def mostrar_gestion_recargas(update: Update, context: ContextTypes.DEFAULT
     user_id = update.effective_user.id
 
     # Obtener todas las líneas con recarga registrada
-    conn = get_db_connection()
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
     cur = conn.cursor()
     cur.execute("""
         SELECT numero_linea, nombre_alias, fecha_ultima_recarga
@@ -29,7 +47,7 @@ async def mostrar_gestion_recargas(update: Update, context: ContextTypes.DEFAULT
     """, (user_id,))
     lineas_con_recarga = cur.fetchall()
 
-    hoy = date.today()
+    hoy = reloj.hoy()
 
     # Construir mensaje
     texto = "💳 *Gestión de Recargas*\n\n"
@@ -80,12 +98,7 @@ async def registrar_recarga(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     user_id = update.effective_user.id
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, numero_linea, nombre_alias FROM lineas WHERE propietario_id = %s AND activa = TRUE", (user_id,))
-    lineas = cur.fetchall()
-    cur.close()
-    conn.close()
+    lineas = obtener_lineas_activas(user_id)
 
     if not lineas:
         texto = "📭 No tienes líneas registradas. Registra una primero en 'Gestionar Líneas'."
@@ -107,23 +120,74 @@ async def registrar_recarga(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text(text=texto, reply_markup=reply_markup, parse_mode="Markdown")
 
 async def elegir_linea_para_recarga(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Guarda la línea elegida y muestra opciones de fecha."""
+    """Guarda la línea elegida y pregunta el importe pagado (para el historial de gastos)."""
     query = update.callback_query
     await query.answer()
 
     linea_id = int(query.data.split('_')[-1])
-    context.user_data['linea_id_recarga'] = linea_id
+    iniciar(query.from_user.id, FlujoRecarga(linea_id, ESTADO_INGRESAR_IMPORTE))
 
-    keyboard = [
+    keyboard = []
+    if MONTO_RECARGA:
+        keyboard.append([InlineKeyboardButton(f"💵 ${MONTO_RECARGA:g}", callback_data='importe_sugerido')])
+    keyboard.append([InlineKeyboardButton("⏭️ Sin importe", callback_data='importe_omitir')])
+    keyboard.append([InlineKeyboardButton("⬅️ Volver", callback_data='registrar_recarga')])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    await query.edit_message_text(
+        text="💵 *¿Cuánto pagaste por la recarga?*\nEnvía el importe (ej: 150 o 99.90) o elige una opción:",
+        reply_markup=reply_markup,
+        parse_mode="Markdown"
+    )
+
+def _teclado_fechas():
+    return InlineKeyboardMarkup([
         [InlineKeyboardButton("✅ Usar fecha actual (hoy)", callback_data='fecha_actual')],
         [InlineKeyboardButton("📅 Seleccionar fecha con botones", callback_data='fecha_botones')],
         [InlineKeyboardButton("⬅️ Volver", callback_data='registrar_recarga')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    ])
+
+def _texto_fechas(monto):
+    importe = f"${monto:g}" if monto is not None else "sin importe"
+    return f"💵 Importe: {importe}\n\n📆 *¿Qué fecha quieres registrar para la recarga?*"
+
+async def elegir_importe_boton(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Importe sugerido (MONTO_RECARGA) o sin importe; después, la fecha."""
+    query = update.callback_query
+    await query.answer()
+
+    flujo = obtener(query.from_user.id, FlujoRecarga)
+    if flujo is None:
+        await query.edit_message_text(MENSAJE_FLUJO_CADUCADO)
+        return
+    flujo.monto = MONTO_RECARGA if query.data == 'importe_sugerido' else None
+    flujo.paso = ESTADO_ELEGIR_FECHA
 
     await query.edit_message_text(
-        text="📆 *¿Qué fecha quieres registrar para la recarga?*",
-        reply_markup=reply_markup,
+        text=_texto_fechas(flujo.monto),
+        reply_markup=_teclado_fechas(),
+        parse_mode="Markdown"
+    )
+
+async def manejar_importe_recarga(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Importe escrito por el usuario; después, la fecha."""
+    flujo = obtener(update.effective_user.id, FlujoRecarga)
+    if flujo is None or flujo.paso != ESTADO_INGRESAR_IMPORTE:
+        return
+
+    try:
+        monto = float(update.message.text.strip().lstrip("$").replace(",", "."))
+    except ValueError:
+        monto = None
+    if monto is None or not math.isfinite(monto) or monto <= 0 or monto >= 10 ** 8:
+        await update.message.reply_text("❌ Envía solo el importe, un número mayor que cero (ej: 150 o 99.90).")
+        return
+
+    flujo.monto = round(monto, 2)
+    flujo.paso = ESTADO_ELEGIR_FECHA
+    await update.message.reply_text(
+        text=_texto_fechas(flujo.monto),
+        reply_markup=_teclado_fechas(),
         parse_mode="Markdown"
     )
 
@@ -132,18 +196,21 @@ async def usar_fecha_actual(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    linea_id = context.user_data.get('linea_id_recarga')
-    if not linea_id:
+    flujo = obtener(query.from_user.id, FlujoRecarga)
+    if flujo is None:
         await query.edit_message_text("❌ Error: no se seleccionó una línea.")
         return
+    linea_id, monto = flujo.linea_id, flujo.monto
+    terminar(query.from_user.id, FlujoRecarga)
 
-    hoy = date.today()
+    hoy = reloj.hoy()
 
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("UPDATE lineas SET fecha_ultima_recarga = %s WHERE id = %s", (hoy, linea_id))
+        cur.execute(SQL_REGISTRAR_RECARGA, {"fecha": hoy, "linea_id": linea_id, "monto": monto})
         conn.commit()
+        marcar_escritura(query.from_user.id)
         mensaje = f"✅ ¡Recarga registrada con fecha de hoy ({hoy.strftime('%d/%m/%Y')})!"
     except Exception as e:
         print(f"Error al registrar recarga: {e}")
@@ -163,7 +230,7 @@ async def iniciar_seleccion_fecha_botones(update: Update, context: ContextTypes.
     query = update.callback_query
     await query.answer()
 
-    año_actual = date.today().year
+    año_actual = reloj.hoy().year
     años = [año_actual - 2, año_actual - 1, año_actual, año_actual + 1, año_actual + 2]
 
     keyboard = []
@@ -185,7 +252,11 @@ async def seleccionar_año(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     año = int(query.data.split('_')[-1])
-    context.user_data['año_seleccionado'] = año
+    flujo = obtener(query.from_user.id, FlujoRecarga)
+    if flujo is None:
+        await query.edit_message_text(MENSAJE_FLUJO_CADUCADO)
+        return
+    flujo.año = año
 
     meses = [
         ("Enero", 1), ("Febrero", 2), ("Marzo", 3), ("Abril", 4),
@@ -213,8 +284,12 @@ async def seleccionar_mes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     mes = int(query.data.split('_')[-1])
-    año = context.user_data['año_seleccionado']
-    context.user_data['mes_seleccionado'] = mes
+    flujo = obtener(query.from_user.id, FlujoRecarga)
+    if flujo is None or flujo.año is None:
+        await query.edit_message_text(MENSAJE_FLUJO_CADUCADO)
+        return
+    año = flujo.año
+    flujo.mes = mes
 
     num_dias = calendar.monthrange(año, mes)[1]
     dias = list(range(1, num_dias + 1))
@@ -250,9 +325,11 @@ async def seleccionar_dia(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     dia = int(query.data.split('_')[-1])
-    mes = context.user_data['mes_seleccionado']
-    año = context.user_data['año_seleccionado']
-    linea_id = context.user_data['linea_id_recarga']
+    flujo = obtener(query.from_user.id, FlujoRecarga)
+    if flujo is None or flujo.mes is None:
+        await query.edit_message_text(MENSAJE_FLUJO_CADUCADO)
+        return
+    mes, año, linea_id, monto = flujo.mes, flujo.año, flujo.linea_id, flujo.monto
 
     try:
         fecha_recarga = date(año, mes, dia)
@@ -263,8 +340,9 @@ async def seleccionar_dia(update: Update, context: ContextTypes.DEFAULT_TYPE):
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("UPDATE lineas SET fecha_ultima_recarga = %s WHERE id = %s", (fecha_recarga, linea_id))
+        cur.execute(SQL_REGISTRAR_RECARGA, {"fecha": fecha_recarga, "linea_id": linea_id, "monto": monto})
         conn.commit()
+        marcar_escritura(query.from_user.id)
         mensaje = f"✅ ¡Recarga registrada con fecha {fecha_recarga.strftime('%d/%m/%Y')}!"
     except Exception as e:
         print(f"Error al registrar recarga manual: {e}")
@@ -273,8 +351,7 @@ async def seleccionar_dia(update: Update, context: ContextTypes.DEFAULT_TYPE):
         cur.close()
         conn.close()
 
-    for key in ['año_seleccionado', 'mes_seleccionado', 'linea_id_recarga']:
-        context.user_data.pop(key, None)
+    terminar(query.from_user.id, FlujoRecarga)
 
     keyboard = [[InlineKeyboardButton("⬅️ Volver", callback_data='gestionar_recargas')]]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -285,8 +362,7 @@ async def cancelar_seleccion_fecha(update: Update, context: ContextTypes.DEFAULT
     query = update.callback_query
     await query.answer()
 
-    for key in ['año_seleccionado', 'mes_seleccionado', 'linea_id_recarga']:
-        context.user_data.pop(key, None)
+    terminar(query.from_user.id, FlujoRecarga)
 
     await query.edit_message_text(
         text="❌ Selección cancelada.",
@@ -314,6 +390,11 @@ def register_handlers(application):
     application.add_handler(CallbackQueryHandler(registrar_recarga, pattern='^registrar_recarga$'))
     application.add_handler(CallbackQueryHandler(elegir_linea_para_recarga, pattern='^elegir_linea_\\d+$'))
 
+    # Importe: botones o texto. Grupo propio: el MessageHandler de gestion_lineas (grupo 0)
+    # también recibe todo el texto y PTB solo ejecuta un handler por grupo
+    application.add_handler(CallbackQueryHandler(elegir_importe_boton, pattern='^importe_(sugerido|omitir)$'))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, manejar_importe_recarga), group=1)
+
     # Fechas
     application.add_handler(CallbackQueryHandler(usar_fecha_actual, pattern='^fecha_actual$'))
     application.add_handler(CallbackQueryHandler(iniciar_seleccion_fecha_botones, pattern='^fecha_botones$'))
@@ -0,0 +1,71 @@
+# modules/historial.py
+from datetime import date
+from utils import reloj
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+from telegram.helpers import escape_markdown
+
+from database.archivo import consultar_archivo, resumen_archivo
+from database.particiones import inicio_mes
+from modules.gastos import MESES, mes_hace
+
+MESES_RESUMEN = 12
+MAX_FILAS_DETALLE = 40
+ICONOS_RECURSO = {"datos": "🌐", "minutos": "📞", "sms": "💬"}
+USO = "Uso: /historial para el resumen o /historial AAAA-MM para el detalle de un mes."
+
+def leer_mes(texto):
+    """Primer día del mes 'AAAA-MM', o None si el texto no es un mes válido."""
+    try:
+        año, mes = (int(parte) for parte in texto.split("-"))
+        return date(año, mes, 1)
+    except ValueError:
+        return None
+
+def formatear_resumen(filas):
+    if not filas:
+        return "📭 *No hay recursos archivados todavía.*\nLos recursos vencidos pasan aquí al limpiar la base."
+
+    partes = [f"🗄️ *HISTORIAL ARCHIVADO (últimos {MESES_RESUMEN} meses)*"]
+    mes_previo = None
+    for mes, tipo, paquetes, cantidad in filas:
+        if mes != mes_previo:
+            partes.append(f"\n📅 *{MESES[mes.month]} {mes.year}*")
+            mes_previo = mes
+        partes.append(f"   {ICONOS_RECURSO.get(tipo, '•')} {tipo.capitalize()}: {cantidad} ({paquetes})")
+    partes.append("\nDetalle de un mes: /historial AAAA-MM")
+    return "\n".join(partes)
+
+def formatear_detalle(filas, mes):
+    titulo = f"{MESES[mes.month]} {mes.year}"
+    if not filas:
+        return f"📭 *No hay recursos archivados en {titulo}.*"
+
+    partes = [f"🗄️ *ARCHIVO DE {titulo.upper()}*\n"]
+    for numero, tipo, cantidad, activacion, vencimiento, origen in filas[:MAX_FILAS_DETALLE]:
+        # Número y origen vienen de datos del usuario: escapados para no romper el Markdown
+        linea = escape_markdown(numero or "Línea eliminada")
+        detalle = f" · {escape_markdown(origen)}" if origen else ""
+        partes.append(f"{ICONOS_RECURSO.get(tipo, '•')} {linea}: {cantidad} {tipo} "
+                      f"({activacion:%d/%m} → {vencimiento:%d/%m}){detalle}")
+    if len(filas) > MAX_FILAS_DETALLE:
+        partes.append(f"\n… y {len(filas) - MAX_FILAS_DETALLE} más. Usa /exportar para verlos todos.")
+    return "\n".join(partes)
+
+async def historial(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/historial [AAAA-MM]: recursos ya archivados, resumidos por mes o detallados para un mes."""
+    user_id = update.effective_user.id
+    if not context.args:
+        desde = mes_hace(inicio_mes(reloj.hoy()), MESES_RESUMEN - 1)
+        texto = formatear_resumen(resumen_archivo(user_id, desde=desde))
+    else:
+        mes = leer_mes(context.args[0])
+        if mes is None:
+            await update.message.reply_text(USO)
+            return
+        texto = formatear_detalle(consultar_archivo(user_id, desde=mes, hasta=mes), mes)
+    await update.message.reply_text(texto, parse_mode="Markdown")
+
+def register_handlers(application):
+    application.add_handler(CommandHandler("historial", historial))
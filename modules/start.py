@@ -1,66 +1,39 @@
 # modules/start.py
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import CommandHandler, ContextTypes
-from utils.auth import is_user_authorized
+from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes
 from utils.recargas import calcular_estado_recarga
 from database.connection import get_db_connection
-from datetime import date
+from database.preparadas import ejecutar
+from utils.saldos import obtener_saldos_lineas, formatear_saldo
+from utils.resumen_propietario import obtener_resumen, formatear_cabecera
+from database.circuito import ERRORES_DISPONIBILIDAD
+from collections import OrderedDict
+from datetime import datetime
+from utils import reloj
+
+# Último panel generado por usuario (menú y detalle): se muestra si la base de datos no responde
+_ultimos_paneles = OrderedDict()
+MAX_PANELES_GUARDADOS = 5000
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user = update.effective_user
-
-    # 🔐 Verificar si el usuario está autorizado
-    if not is_user_authorized(user.id):
-        await update.message.reply_text(
-            "🚫 Lo siento, no tienes permiso para usar este bot.\n"
-            "Contacta al administrador para obtener acceso."
-        )
-        return
-
-    # 💾 Guardar o actualizar al usuario en la base de datos
-    conn = get_db_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO usuarios (id, username, first_name, last_name)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (id) DO UPDATE
-                SET username = EXCLUDED.username,
-                    first_name = EXCLUDED.first_name,
-                    last_name = EXCLUDED.last_name;
-            """, (
-                user.id,
-                user.username,
-                user.first_name,
-                user.last_name
-            ))
-            conn.commit()
-            cur.close()
-        except Exception as e:
-            print(f"❌ Error al guardar usuario: {e}")
-        finally:
-            conn.close()
-
-    # 📊 Generar y mostrar el menú de inicio con resumen detallado
+    # 📊 Generar y mostrar el menú de inicio con el resumen
     await mostrar_menu_inicio(update, context)
 
-async def mostrar_menu_inicio(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Genera y muestra el menú principal con panel de resumen detallado."""
-    user = update.effective_user
-
-    # 📊 Obtener datos para el panel de resumen
-    resumen = await generar_panel_resumen_detallado(user.id)
-
-    # 🎨 Mensaje de bienvenida + panel de resumen
-    mensaje = (
-        f"👋 ¡Hola {user.first_name}!\n\n"
-        f"🌟 *PANEL DE RESUMEN GENERAL*\n"
-        f"{resumen}\n\n"
-        f"👇 Elige una opción para gestionar tu cuenta:"
-    )
-
-    # 🔘 Creamos los botones en dos filas
+def _guardar_panel(user_id, parte, texto):
+    _ultimos_paneles.setdefault(user_id, {})[parte] = (datetime.now(), texto)
+    _ultimos_paneles.move_to_end(user_id)
+    if len(_ultimos_paneles) > MAX_PANELES_GUARDADOS:
+        _ultimos_paneles.popitem(last=False)
+
+def _panel_guardado(user_id, parte):
+    """Última copia de esa parte del panel, con la hora a la que se generó, o None."""
+    guardado = _ultimos_paneles.get(user_id, {}).get(parte)
+    if guardado is None:
+        return None
+    momento, texto = guardado
+    return f"⚠️ _Datos de las {momento.strftime('%H:%M')}: ahora no se pueden actualizar._\n" + texto
+
+def _teclado_inicio(con_detalle):
     keyboard = [
         [
             InlineKeyboardButton("📱 Consultar Líneas", callback_data='consultar_lineas'),
@@ -71,8 +44,35 @@ async def mostrar_menu_inicio(update: Update, context: ContextTypes.DEFAULT_TYPE
             InlineKeyboardButton("📦 Gestionar Paquetes", callback_data='gestionar_paquetes')
         ]
     ]
+    if con_detalle:
+        keyboard.append([InlineKeyboardButton("🔎 Ver detalle por línea", callback_data='detalle_inicio')])
+    else:
+        keyboard.append([InlineKeyboardButton("🔼 Ocultar detalle", callback_data='volver_start')])
+    return InlineKeyboardMarkup(keyboard)
+
+def _mensaje_inicio(user, cuerpo):
+    return (
+        f"👋 ¡Hola {user.first_name}!\n\n"
+        f"🌟 *PANEL DE RESUMEN GENERAL*\n"
+        f"{cuerpo}\n\n"
+        f"👇 Elige una opción para gestionar tu cuenta:"
+    )
+
+async def mostrar_menu_inicio(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Genera y muestra el menú principal con el resumen precalculado (el detalle, bajo demanda)."""
+    user = update.effective_user
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # 📊 Una consulta por clave primaria; el detalle por línea se pide con un botón
+    try:
+        cabecera = formatear_cabecera(obtener_resumen(user.id)) or "📭 *No tienes líneas registradas aún.*"
+        _guardar_panel(user.id, "cabecera", cabecera)
+    except ERRORES_DISPONIBILIDAD:
+        cabecera = _panel_guardado(user.id, "cabecera")
+        if cabecera is None:
+            raise  # Sin copia: el manejador de errores responde "inténtalo más tarde"
+
+    mensaje = _mensaje_inicio(user, cabecera)
+    reply_markup = _teclado_inicio(con_detalle=True)
 
     if update.message:  # Si viene de /start
         await update.message.reply_text(mensaje, reply_markup=reply_markup, parse_mode="Markdown")
@@ -82,26 +82,46 @@ async def mostrar_menu_inicio(update: Update, context: ContextTypes.DEFAULT_TYPE
         # Añadimos \u200b para evitar "Message is not modified"
         await query.edit_message_text(text=mensaje + "\u200b", reply_markup=reply_markup, parse_mode="Markdown")
 
+async def mostrar_detalle_inicio(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Botón del menú principal: añade el panel detallado (líneas, recargas y saldos)."""
+    query = update.callback_query
+    await query.answer()
+    user = update.effective_user
+
+    try:
+        cabecera = formatear_cabecera(obtener_resumen(user.id))
+        detalle = await generar_panel_resumen_detallado(user.id)
+        cuerpo = f"{cabecera}\n{detalle}" if cabecera else detalle
+        _guardar_panel(user.id, "detalle", cuerpo)
+    except ERRORES_DISPONIBILIDAD:
+        cuerpo = _panel_guardado(user.id, "detalle")
+        if cuerpo is None:
+            raise  # Sin copia: el manejador de errores responde "inténtalo más tarde"
+
+    await query.edit_message_text(
+        text=_mensaje_inicio(user, cuerpo), reply_markup=_teclado_inicio(con_detalle=False), parse_mode="Markdown"
+    )
+
 async def generar_panel_resumen_detallado(user_id):
     """Genera un string con el panel de resumen detallado para el usuario."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    hoy = date.today()
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
+    hoy = reloj.hoy()
 
     # Obtener todas las líneas activas, poniendo la principal primero
-    cur.execute("""
-        SELECT id, numero_linea, nombre_alias, fecha_ultima_recarga, es_principal
-        FROM lineas
-        WHERE propietario_id = %s AND activa = TRUE
-        ORDER BY es_principal DESC, id ASC
-    """, (user_id,))
-    lineas = cur.fetchall()
+    try:
+        cur = conn.cursor()
+        ejecutar(cur, "lineas_panel", (user_id,))
+        lineas = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()  # También si la consulta superó statement_timeout
 
     if not lineas:
-        cur.close()
-        conn.close()
         return "📭 *No tienes líneas registradas aún.*"
 
+    # Saldos de todas las líneas de una vez (tabla de saldos, sin reagregar recursos)
+    saldos = obtener_saldos_lineas([linea[0] for linea in lineas])
+
     partes_resumen = []
 
     for linea_id, numero, alias, fecha_ultima_recarga, es_principal in lineas:
@@ -120,16 +140,10 @@ async def generar_panel_resumen_detallado(user_id):
             partes_resumen.append("   ❓ Sin recarga registrada")
 
         # Recursos activos
-        cur.execute("""
-            SELECT tipo_recurso, cantidad, fecha_vencimiento, origen_paquete
-            FROM recursos_linea
-            WHERE linea_id = %s AND activo = TRUE
-            ORDER BY tipo_recurso, fecha_vencimiento ASC
-        """, (linea_id,))
-        recursos = cur.fetchall()
+        recursos = saldos.get(linea_id, [])
 
         if recursos:
-            for tipo, cantidad, vence, origen in recursos:
+            for tipo, saldo, asignado, vence in recursos:
                 dias_restantes = (vence - hoy).days
                 if dias_restantes < 0:
                     estado = f"❌ Vencido (hace {abs(dias_restantes)} días)"
@@ -137,14 +151,12 @@ async def generar_panel_resumen_detallado(user_id):
                     estado = f"⚠️ Pronto ({dias_restantes} días)"
                 else:
                     estado = f"✅ Activo ({dias_restantes} días)"
-                partes_resumen.append(f"   📦 {cantidad} {tipo} → {estado} (vence {vence.strftime('%d/%m')})")
+                partes_resumen.append(f"   📦 {formatear_saldo(saldo, asignado)} {tipo} → {estado} (vence {vence.strftime('%d/%m')})")
         else:
             partes_resumen.append("   📭 Sin recursos activos")
 
-    cur.close()
-    conn.close()
-
     return "\n".join(partes_resumen)
 
 def register_handlers(application):
-    application.add_handler(CommandHandler("start", start))
\ No newline at end of file
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CallbackQueryHandler(mostrar_detalle_inicio, pattern='^detalle_inicio$'))
\ No newline at end of file
@@ -2,24 +2,25 @@
 import logging
 from telegram import Bot
 from database.connection import get_db_connection
-from datetime import date
+from utils import reloj
 
-from utils.limpieza_db import limpiar_recursos_viejos
 from utils.recargas import calcular_estado_recarga
+from utils.resumen_propietario import propietarios_a_notificar
 
 logger = logging.getLogger(__name__)
 
 async def enviar_mensaje(bot, chat_id, texto):
-    """Envía un mensaje a un usuario de Telegram."""
-    try:
-        await bot.send_message(chat_id=chat_id, text=texto, parse_mode="Markdown")
-        logger.info(f"✅ Mensaje enviado a {chat_id}")
-    except Exception as e:
-        logger.error(f"❌ Error al enviar mensaje a {chat_id}: {e}")
+    """Envía un mensaje a un usuario de Telegram.
+
+    Los errores (429, 5xx, red) se propagan: quien llama decide si reintenta (el programador de
+    avisos libera el día reclamado y vuelve a programar al usuario).
+    """
+    await bot.send_message(chat_id=chat_id, text=texto, parse_mode="Markdown")
+    logger.debug("✅ Mensaje enviado a %s", chat_id)
 
 async def obtener_recursos_por_vencer_o_vencidos(user_id, hoy):
     """Obtiene recursos (datos, minutos, SMS) por vencer o ya vencidos para un usuario."""
-    conn = get_db_connection()
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
     cur = conn.cursor()
 
     recursos = {
@@ -27,19 +28,20 @@ async def obtener_recursos_por_vencer_o_vencidos(user_id, hoy):
         "vencidos": {"datos": [], "minutos": [], "sms": []}
     }
 
+    # Saldos vigentes (una fila por línea y tipo), sin recorrer el historial de recursos
     cur.execute("""
-        SELECT rl.tipo_recurso, rl.cantidad, rl.fecha_vencimiento, l.numero_linea, l.nombre_alias
-        FROM recursos_linea rl
-        JOIN lineas l ON rl.linea_id = l.id
-        WHERE l.propietario_id = %s AND rl.activo = TRUE
-        ORDER BY rl.fecha_vencimiento ASC
+        SELECT sl.tipo_recurso, sl.saldo, sl.fecha_vencimiento, l.numero_linea, l.nombre_alias
+        FROM saldos_linea sl
+        JOIN lineas l ON sl.linea_id = l.id
+        WHERE l.propietario_id = %s
+        ORDER BY sl.fecha_vencimiento ASC
     """, (user_id,))
 
     for tipo, cantidad, vence, numero, alias in cur.fetchall():
         dias_restantes = (vence - hoy).days
         nombre_linea = f"{alias or 'Sin alias'} ({numero})"
 
-        logger.info(f"🔍 Recurso {tipo} en {nombre_linea}: vence={vence}, dias_restantes={dias_restantes}")
+        logger.debug("🔍 Recurso %s en %s: vence=%s, dias_restantes=%s", tipo, nombre_linea, vence, dias_restantes)
 
         if dias_restantes > 0 and dias_restantes <= 3:
             recursos["por_vencer"][tipo].append((cantidad, vence, dias_restantes, nombre_linea))
@@ -53,7 +55,7 @@ async def obtener_recursos_por_vencer_o_vencidos(user_id, hoy):
 
 async def obtener_recargas_por_vencer_o_vencidas(user_id, hoy):
     """Obtiene recargas por vencer o ya vencidas para un usuario."""
-    conn = get_db_connection()
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
     cur = conn.cursor()
 
     recargas = {"por_vencer": [], "vencidas": []}
@@ -68,7 +70,7 @@ async def obtener_recargas_por_vencer_o_vencidas(user_id, hoy):
         estado_info = calcular_estado_recarga(fecha_ultima, hoy)
         nombre_linea = f"{alias or 'Sin alias'} ({numero})"
 
-        logger.info(f"🔍 Recarga en {nombre_linea}: fecha_ultima={fecha_ultima}, estado={estado_info['estado']}")
+        logger.debug("🔍 Recarga en %s: fecha_ultima=%s, estado=%s", nombre_linea, fecha_ultima, estado_info["estado"])
 
         if "Pronto" in estado_info["estado"] or "Vence hoy" in estado_info["estado"]:
             # Notificar si está por vencer (día 30) o vencida (día 31+)
@@ -82,73 +84,84 @@ async def obtener_recargas_por_vencer_o_vencidas(user_id, hoy):
     conn.close()
     return recargas
 
+async def notificar_propietario(bot, user_id, hoy):
+    """Arma y envía el aviso de un usuario. Devuelve True si tenía algo que notificar.
+
+    Lanza la excepción del envío si Telegram no aceptó el mensaje.
+    """
+    # Revisar recargas
+    recargas = await obtener_recargas_por_vencer_o_vencidas(user_id, hoy)
+    # Revisar recursos
+    recursos = await obtener_recursos_por_vencer_o_vencidos(user_id, hoy)
+
+    # Construir mensaje
+    partes_mensaje = ["🔔 *NOTIFICACIÓN AUTOMÁTICA*\n"]
+
+    # Recargas por vencer
+    if recargas["por_vencer"]:
+        partes_mensaje.append("⚠️ *Recargas Próximas a Vencer (30 días):*")
+        for nombre_linea, dias in recargas["por_vencer"]:
+            partes_mensaje.append(f"▫️ {nombre_linea} → {dias} días restantes")
+
+    # Recargas vencidas
+    if recargas["vencidas"]:
+        partes_mensaje.append("\n❌ *Recargas Vencidas:*")
+        for nombre_linea, dias in recargas["vencidas"]:
+            partes_mensaje.append(f"▫️ {nombre_linea} → vencida hace {dias} días")
+
+    # Recursos por vencer
+    tipos = [("datos", "📊 *Datos (GB) Próximos a Vencer:*"), 
+             ("minutos", "⏱️ *Minutos Próximos a Vencer:*"), 
+             ("sms", "✉️ *SMS Próximos a Vencer:*")]
+
+    for tipo, titulo in tipos:
+        if recursos["por_vencer"][tipo]:
+            partes_mensaje.append(f"\n{titulo}")
+            for cantidad, vence, dias, nombre_linea in recursos["por_vencer"][tipo]:
+                partes_mensaje.append(f"▫️ {cantidad} {tipo} en {nombre_linea} → {dias} días (vence {vence.strftime('%d/%m')})")
+
+    # Recursos vencidos
+    tipos_vencidos = [("datos", "📉 *Datos (GB) Vencidos:*"), 
+                      ("minutos", "📉 *Minutos Vencidos:*"), 
+                      ("sms", "📉 *SMS Vencidos:*")]
+
+    for tipo, titulo in tipos_vencidos:
+        if recursos["vencidos"][tipo]:
+            partes_mensaje.append(f"\n{titulo}")
+            for cantidad, vence, dias, nombre_linea in recursos["vencidos"][tipo]:
+                partes_mensaje.append(f"▫️ {cantidad} {tipo} en {nombre_linea} → vencido hace {dias} días (venció {vence.strftime('%d/%m')})")
+
+    # Enviar mensaje si hay algo que notificar
+    if len(partes_mensaje) > 1:  # Más que solo el título
+        partes_mensaje.append("\nRevisa todos los detalles con /start.")
+        mensaje = "\n".join(partes_mensaje)
+        await enviar_mensaje(bot, user_id, mensaje)
+        logger.debug("📩 Notificación enviada a usuario %s", user_id)
+        return True
+
+    logger.debug("📭 Usuario %s no tiene recargas ni recursos por vencer o vencidos.", user_id)
+    return False
+
 async def enviar_notificaciones_programadas(bot):
-    """Función principal: revisa fechas, limpia DB y envía notificaciones."""
-    
-    # 🧹 PASO 1: Limpiar recursos viejos (¡Nuevo!)
-    await limpiar_recursos_viejos()
+    """Barrido completo manual (/check-notifications): revisa a todos y envía notificaciones.
 
-    # 📅 PASO 2: Revisar y enviar notificaciones (existente)
-    hoy = date.today()
+    Los avisos diarios los envía el programador (utils/programador_avisos.py) a la hora de cada
+    usuario; la limpieza de la DB la ejecuta el motor de retención (utils/limpieza_db.py).
+    """
+    hoy = reloj.hoy()
 
-    # Obtener todos los usuarios con líneas activas
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT DISTINCT propietario_id FROM lineas WHERE activa = TRUE")
-    usuarios = [row[0] for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    # Solo los usuarios que, según el resumen precalculado, tienen algo que notificar
+    usuarios = propietarios_a_notificar(hoy)
+    enviadas = 0
 
+    errores = 0
     for user_id in usuarios:
-        # Revisar recargas
-        recargas = await obtener_recargas_por_vencer_o_vencidas(user_id, hoy)
-        # Revisar recursos
-        recursos = await obtener_recursos_por_vencer_o_vencidos(user_id, hoy)
-
-        # Construir mensaje
-        partes_mensaje = ["🔔 *NOTIFICACIÓN AUTOMÁTICA*\n"]
-
-        # Recargas por vencer
-        if recargas["por_vencer"]:
-            partes_mensaje.append("⚠️ *Recargas Próximas a Vencer (30 días):*")
-            for nombre_linea, dias in recargas["por_vencer"]:
-                partes_mensaje.append(f"▫️ {nombre_linea} → {dias} días restantes")
-
-        # Recargas vencidas
-        if recargas["vencidas"]:
-            partes_mensaje.append("\n❌ *Recargas Vencidas:*")
-            for nombre_linea, dias in recargas["vencidas"]:
-                partes_mensaje.append(f"▫️ {nombre_linea} → vencida hace {dias} días")
-
-        # Recursos por vencer
-        tipos = [("datos", "📊 *Datos (GB) Próximos a Vencer:*"), 
-                 ("minutos", "⏱️ *Minutos Próximos a Vencer:*"), 
-                 ("sms", "✉️ *SMS Próximos a Vencer:*")]
-
-        for tipo, titulo in tipos:
-            if recursos["por_vencer"][tipo]:
-                partes_mensaje.append(f"\n{titulo}")
-                for cantidad, vence, dias, nombre_linea in recursos["por_vencer"][tipo]:
-                    partes_mensaje.append(f"▫️ {cantidad} {tipo} en {nombre_linea} → {dias} días (vence {vence.strftime('%d/%m')})")
-
-        # Recursos vencidos
-        tipos_vencidos = [("datos", "📉 *Datos (GB) Vencidos:*"), 
-                          ("minutos", "📉 *Minutos Vencidos:*"), 
-                          ("sms", "📉 *SMS Vencidos:*")]
-
-        for tipo, titulo in tipos_vencidos:
-            if recursos["vencidos"][tipo]:
-                partes_mensaje.append(f"\n{titulo}")
-                for cantidad, vence, dias, nombre_linea in recursos["vencidos"][tipo]:
-                    partes_mensaje.append(f"▫️ {cantidad} {tipo} en {nombre_linea} → vencido hace {dias} días (venció {vence.strftime('%d/%m')})")
-
-        # Enviar mensaje si hay algo que notificar
-        if len(partes_mensaje) > 1:  # Más que solo el título
-            partes_mensaje.append("\nRevisa todos los detalles con /start.")
-            mensaje = "\n".join(partes_mensaje)
-            await enviar_mensaje(bot, user_id, mensaje)
-            logger.info(f"📩 Notificación enviada a usuario {user_id}")
-        else:
-            logger.info(f"📭 Usuario {user_id} no tiene recargas ni recursos por vencer o vencidos.")
-
-    logger.info("✅ Revisión de notificaciones completada para todos los usuarios.")
\ No newline at end of file
+        try:
+            if await notificar_propietario(bot, user_id, hoy):
+                enviadas += 1
+        except Exception as e:
+            errores += 1
+            logger.error("❌ Error al enviar mensaje a %s: %s", user_id, e, extra={"campos": {"usuario": user_id}})
+
+    logger.info("✅ Revisión de notificaciones completada para todos los usuarios.",
+                extra={"campos": {"revisados": len(usuarios), "enviadas": enviadas, "errores": errores}})
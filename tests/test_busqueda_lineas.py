@@ -0,0 +1,61 @@
+# tests/test_busqueda_lineas.py
+import unittest
+from unittest import mock
+
+from database.busqueda import _patron_like, buscar_lineas_db
+from utils import busqueda_lineas
+from utils.busqueda_lineas import _buscar_en_memoria, _claves_linea, normalizar
+
+LINEAS = (
+    (1, "5551234567", "Mamá"),
+    (2, "5559876543", "Oficina centro"),
+    (3, "5550004567", None),
+    (4, "5551112222", "MAMÁ trabajo"),
+)
+
+class NormalizarTest(unittest.TestCase):
+    def test_quita_tildes_y_mayusculas(self):
+        self.assertEqual(normalizar("MAMÁ Ñandú"), "mama nandu")
+
+    def test_claves_son_sufijos_de_numero_y_palabras(self):
+        claves = _claves_linea("123", "Casa Vieja")
+        self.assertEqual(claves, {"123", "23", "3", "casa", "asa", "sa", "a", "vieja", "ieja", "eja", "ja"})
+
+    def test_patron_like_escapa_comodines(self):
+        self.assertEqual(_patron_like("50%_a\\b"), "%50\\%\\_a\\\\b%")
+
+class BuscarEnMemoriaTest(unittest.TestCase):
+    def setUp(self):
+        busqueda_lineas._indices.clear()
+
+    def buscar(self, texto, limite=20):
+        return [linea[0] for linea in _buscar_en_memoria(1, LINEAS, normalizar(texto).split(), limite)]
+
+    def test_fragmento_del_numero(self):
+        self.assertEqual(self.buscar("4567"), [1, 3])
+
+    def test_alias_sin_tildes(self):
+        self.assertEqual(self.buscar("mama"), [1, 4])
+
+    def test_todos_los_terminos(self):
+        self.assertEqual(self.buscar("Mamá trab"), [4])
+        self.assertEqual(self.buscar("mama oficina"), [])
+
+    def test_limite(self):
+        self.assertEqual(self.buscar("555", limite=2), [1, 2])
+
+    def test_indice_se_reconstruye_con_otra_tupla(self):
+        self.assertEqual(self.buscar("centro"), [2])
+        otras = LINEAS[:1]
+        self.assertEqual(_buscar_en_memoria(1, otras, ["centro"], 20), [])
+
+class BuscarEnBaseTest(unittest.TestCase):
+    def test_compara_el_alias_normalizado(self):
+        cur = mock.Mock()
+        buscar_lineas_db(cur, 7, ["mama"], 20)
+        sql, parametros = cur.execute.call_args[0]
+        self.assertIn("normalizar_busqueda(nombre_alias) LIKE %s", sql)
+        self.assertEqual(parametros, (7, "%mama%", "%mama%", 20))
+
+if __name__ == "__main__":
+    unittest.main()
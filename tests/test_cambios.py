@@ -0,0 +1,55 @@
+# tests/test_cambios.py
+import asyncio
+import gc
+import threading
+import unittest
+
+from database import cambios
+from database.cambios import _tareas_invalidacion, publicar_cambio, registrar_invalidador
+
+TABLA = "tabla_de_prueba"
+
+class PublicarCambioTest(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(cambios._invalidadores.pop, TABLA, None)
+
+    def test_guarda_la_tarea_hasta_que_termina(self):
+        liberar = threading.Event()
+        claves = []
+
+        def invalidar(clave):
+            liberar.wait(5)
+            claves.append(clave)
+
+        registrar_invalidador(TABLA, invalidar, bloqueante=True)
+
+        async def escenario():
+            publicar_cambio(TABLA, 7)
+            tareas = set(_tareas_invalidacion)
+            self.assertEqual(len(tareas), 1)
+            gc.collect()
+            liberar.set()
+            await asyncio.gather(*tareas)
+            await asyncio.sleep(0)
+
+        asyncio.run(escenario())
+        self.assertEqual(claves, [7])
+        self.assertEqual(_tareas_invalidacion, set())
+
+    def test_error_en_el_hilo_se_registra_y_se_suelta(self):
+        def fallar(_clave):
+            raise RuntimeError("sin base")
+
+        registrar_invalidador(TABLA, fallar, bloqueante=True)
+
+        async def escenario():
+            publicar_cambio(TABLA, None)
+            await asyncio.gather(*_tareas_invalidacion, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        with self.assertLogs(cambios.logger, "ERROR"):
+            asyncio.run(escenario())
+        self.assertEqual(_tareas_invalidacion, set())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# tests/test_circuito.py
+import unittest
+from unittest import mock
+
+from database.circuito import Circuito
+
+class CircuitoTest(unittest.TestCase):
+    def setUp(self):
+        self.reloj = 1000.0
+        parche = mock.patch("database.circuito.time.monotonic", side_effect=lambda: self.reloj)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.circuito = Circuito(umbral=2, espera_seg=10)
+
+    def abrir(self):
+        self.circuito.fallo()
+        self.circuito.fallo()
+        self.assertEqual(self.circuito.estado, "abierto")
+
+    def test_abre_tras_fallos_seguidos(self):
+        self.circuito.fallo()
+        self.assertTrue(self.circuito.permitir())
+        self.circuito.fallo()
+        self.assertFalse(self.circuito.permitir())
+        self.assertEqual(self.circuito.describir()["aperturas"], 1)
+
+    def test_exito_reinicia_los_fallos(self):
+        self.circuito.fallo()
+        self.circuito.exito()
+        self.circuito.fallo()
+        self.assertEqual(self.circuito.estado, "cerrado")
+
+    def test_semiabierto_admite_una_sola_prueba(self):
+        self.abrir()
+        self.reloj += 10
+        self.assertTrue(self.circuito.permitir())
+        self.assertEqual(self.circuito.estado, "semiabierto")
+        self.assertFalse(self.circuito.permitir())
+
+    def test_prueba_exitosa_cierra(self):
+        self.abrir()
+        self.reloj += 10
+        self.circuito.permitir()
+        self.circuito.exito()
+        self.assertEqual(self.circuito.estado, "cerrado")
+        self.assertTrue(self.circuito.permitir())
+
+    def test_prueba_fallida_vuelve_a_abrir(self):
+        self.abrir()
+        self.reloj += 10
+        self.circuito.permitir()
+        self.circuito.fallo()
+        self.assertEqual(self.circuito.estado, "abierto")
+        self.assertFalse(self.circuito.permitir())
+
+    def test_prueba_abandonada_admite_otra(self):
+        self.abrir()
+        self.reloj += 10
+        self.assertTrue(self.circuito.permitir())
+        self.circuito.abandonar_prueba()
+        self.assertTrue(self.circuito.permitir())
+
+    def test_prueba_sin_respuesta_vence(self):
+        self.abrir()
+        self.reloj += 10
+        self.assertTrue(self.circuito.permitir())
+        self.reloj += 5
+        self.assertFalse(self.circuito.permitir())
+        self.reloj += 5
+        self.assertTrue(self.circuito.permitir())
+
+if __name__ == "__main__":
+    unittest.main()
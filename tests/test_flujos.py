@@ -0,0 +1,26 @@
+# tests/test_flujos.py
+import sys
+import unittest
+
+from utils.flujos import FlujoConsulta, FlujoRecarga, _campos, _tamano
+
+class TamanoFlujoTest(unittest.TestCase):
+    def test_incluye_los_slots_de_la_base(self):
+        self.assertEqual(_campos(FlujoRecarga), ["linea_id", "paso", "monto", "año", "mes", "tocado"])
+
+    def test_cuenta_todos_los_campos(self):
+        flujo = FlujoRecarga(7)
+        flujo.año, flujo.mes = 2026, 10
+        esperado = sys.getsizeof(flujo) + sum(
+            sys.getsizeof(v) for v in (flujo.linea_id, None, None, flujo.año, flujo.mes, flujo.tocado)
+        )
+        self.assertEqual(_tamano(flujo), esperado)
+
+    def test_suma_los_elementos_de_las_tuplas(self):
+        flujo = FlujoConsulta([1000, 2000])
+        vacio = FlujoConsulta([])
+        extra = sys.getsizeof(flujo.linea_ids) - sys.getsizeof(()) + sys.getsizeof(1000) + sys.getsizeof(2000)
+        self.assertEqual(_tamano(flujo) - _tamano(vacio), extra)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+# tests/test_gastos.py
+import unittest
+from datetime import date
+
+from modules.gastos import formatear_gastos, mes_hace
+
+class FormatearGastosTest(unittest.TestCase):
+    def test_escapa_alias_y_numero(self):
+        texto = formatear_gastos(
+            [(date(2026, 10, 1), "paquete", 10, 1, 0)],
+            [(1, "casa_*vieja*`", "555_1", 10)],
+            date(2026, 10, 5),
+        )
+        self.assertIn("casa\\_\\*vieja\\*\\` (555\\_1): $10", texto)
+
+    def test_operaciones_sin_importe(self):
+        texto = formatear_gastos([(date(2026, 10, 1), "recarga", 0, 3, 2)], [], date(2026, 10, 5))
+        self.assertIn("Recarga: $0 (3, 2 sin importe)", texto)
+
+    def test_mes_hace_cruza_el_año(self):
+        self.assertEqual(mes_hace(date(2026, 2, 1), 3), date(2025, 11, 1))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+# tests/test_historial.py
+import unittest
+from datetime import date
+
+from modules.historial import MAX_FILAS_DETALLE, formatear_detalle, formatear_resumen, leer_mes
+
+MES = date(2026, 5, 1)
+
+class LeerMesTest(unittest.TestCase):
+    def test_mes_valido(self):
+        self.assertEqual(leer_mes("2026-05"), MES)
+
+    def test_mes_invalido(self):
+        for texto in ("2026", "2026-13", "mayo", "2026-05-01"):
+            self.assertIsNone(leer_mes(texto))
+
+class FormatearHistorialTest(unittest.TestCase):
+    def test_resumen_agrupa_por_mes(self):
+        texto = formatear_resumen([(MES, "datos", 2, 3000), (MES, "sms", 1, 50)])
+        self.assertEqual(texto.count("May 2026"), 1)
+        self.assertIn("Datos: 3000 (2)", texto)
+
+    def test_detalle_escapa_numero_y_origen(self):
+        fila = ("555_1", "sms", 50, date(2026, 5, 1), date(2026, 5, 31), "promo_*x*")
+        texto = formatear_detalle([fila], MES)
+        self.assertIn("555\\_1: 50 sms (01/05 → 31/05) · promo\\_\\*x\\*", texto)
+
+    def test_detalle_recorta_filas(self):
+        fila = (None, "datos", 1, date(2026, 5, 1), date(2026, 5, 2), None)
+        texto = formatear_detalle([fila] * (MAX_FILAS_DETALLE + 5), MES)
+        self.assertEqual(texto.count("Línea eliminada"), MAX_FILAS_DETALLE)
+        self.assertIn("… y 5 más", texto)
+
+if __name__ == "__main__":
+    unittest.main()
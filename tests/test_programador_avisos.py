@@ -0,0 +1,72 @@
+# tests/test_programador_avisos.py
+import asyncio
+import unittest
+from unittest import mock
+
+from telegram.error import NetworkError
+
+from utils import programador_avisos
+from utils.programador_avisos import ProgramadorAvisos
+
+RECARGAS = {"por_vencer": [("Casa (5551234567)", 1)], "vencidas": []}
+RECURSOS = {"por_vencer": {"datos": [], "minutos": [], "sms": []},
+            "vencidos": {"datos": [], "minutos": [], "sms": []}}
+
+class BotFalso:
+    def __init__(self, error=None):
+        self.error = error
+        self.enviados = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if self.error:
+            raise self.error
+        self.enviados.append(chat_id)
+
+class AvisarTest(unittest.TestCase):
+    def setUp(self):
+        parches = {
+            "reclamar_aviso": mock.patch.object(programador_avisos, "reclamar_aviso", return_value=(True, None)),
+            "liberar_aviso": mock.patch.object(programador_avisos, "liberar_aviso"),
+            "leer_resumen_aviso": mock.patch.object(programador_avisos, "leer_resumen_aviso", return_value=None),
+            "recargas": mock.patch("notificaciones.obtener_recargas_por_vencer_o_vencidas",
+                                   mock.AsyncMock(return_value=RECARGAS)),
+            "recursos": mock.patch("notificaciones.obtener_recursos_por_vencer_o_vencidos",
+                                   mock.AsyncMock(return_value=RECURSOS)),
+        }
+        self.mocks = {nombre: parche.start() for nombre, parche in parches.items()}
+        for parche in parches.values():
+            self.addCleanup(parche.stop)
+
+    def test_envio_fallido_libera_el_dia_y_reintenta(self):
+        programador = ProgramadorAvisos(BotFalso(NetworkError("sin red")))
+        asyncio.run(programador._avisar(42))
+
+        self.mocks["liberar_aviso"].assert_called_once()
+        self.assertEqual(self.mocks["liberar_aviso"].call_args[0][0], 42)
+        self.assertEqual(programador._reintentos, {42: 1})
+        self.assertIn(42, programador._momentos)
+        self.assertEqual(programador.metricas["errores"], 1)
+        self.assertEqual(programador.metricas["avisos_enviados"], 0)
+
+    def test_envio_correcto_no_libera(self):
+        bot = BotFalso()
+        programador = ProgramadorAvisos(bot)
+        programador._reintentos[42] = 2
+        asyncio.run(programador._avisar(42))
+
+        self.assertEqual(bot.enviados, [42])
+        self.mocks["liberar_aviso"].assert_not_called()
+        self.assertEqual(programador._reintentos, {})
+        self.assertEqual(programador.metricas["avisos_enviados"], 1)
+
+    def test_dia_ya_reclamado_no_envia(self):
+        self.mocks["reclamar_aviso"].return_value = (False, None)
+        bot = BotFalso()
+        programador = ProgramadorAvisos(bot)
+        asyncio.run(programador._avisar(42))
+
+        self.assertEqual(bot.enviados, [])
+        self.assertEqual(programador.metricas["ya_avisados"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
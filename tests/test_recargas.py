@@ -0,0 +1,44 @@
+# tests/test_recargas.py
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from modules.gestionar_recargas import ESTADO_ELEGIR_FECHA, ESTADO_INGRESAR_IMPORTE, manejar_importe_recarga
+from utils.flujos import FlujoRecarga, iniciar, obtener, terminar
+
+USUARIO = 99
+
+def mensaje(texto):
+    return SimpleNamespace(
+        effective_user=SimpleNamespace(id=USUARIO),
+        message=SimpleNamespace(text=texto, reply_text=mock.AsyncMock()),
+    )
+
+class ImporteRecargaTest(unittest.TestCase):
+    def setUp(self):
+        iniciar(USUARIO, FlujoRecarga(7, ESTADO_INGRESAR_IMPORTE))
+        self.addCleanup(terminar, USUARIO, FlujoRecarga)
+
+    def test_guarda_el_importe_y_pasa_a_la_fecha(self):
+        asyncio.run(manejar_importe_recarga(mensaje("$99,90"), None))
+        flujo = obtener(USUARIO, FlujoRecarga)
+        self.assertEqual(flujo.monto, 99.9)
+        self.assertEqual(flujo.paso, ESTADO_ELEGIR_FECHA)
+
+    def test_rechaza_importes_invalidos(self):
+        for texto in ("abc", "0", "-5", "nan", "inf"):
+            update = mensaje(texto)
+            asyncio.run(manejar_importe_recarga(update, None))
+            update.message.reply_text.assert_awaited_once()
+            self.assertIsNone(obtener(USUARIO, FlujoRecarga).monto)
+
+    def test_ignora_texto_fuera_del_paso(self):
+        obtener(USUARIO, FlujoRecarga).paso = ESTADO_ELEGIR_FECHA
+        update = mensaje("150")
+        asyncio.run(manejar_importe_recarga(update, None))
+        update.message.reply_text.assert_not_awaited()
+        self.assertIsNone(obtener(USUARIO, FlujoRecarga).monto)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+# utils/actividad.py
+# Perfil y última actividad de los usuarios: se acumulan en memoria y se vuelcan por lotes,
+# así las escrituras en 'usuarios' crecen con los cambios y no con las peticiones.
+import asyncio
+import logging
+from datetime import datetime
+
+import config
+from database.connection import BaseDatosNoDisponible, get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# user_id -> (username, first_name, last_name) tal como está en la base de datos
+_huellas = {}
+# Pendientes de volcar: user_id -> última actividad / perfil nuevo
+_ultimo_uso = {}
+_perfiles = {}
+
+METRICAS_ACTIVIDAD = {"perfiles_cambiados": 0, "volcados": 0, "filas_volcadas": 0, "pendientes": 0}
+
+def cargar_huellas():
+    """Carga el perfil conocido de los usuarios activos (evita reescribirlos tras reiniciar)."""
+    try:
+        conn = get_db_connection()
+    except BaseDatosNoDisponible:
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id, username, first_name, last_name FROM usuarios WHERE activo = TRUE")
+        for user_id, username, first_name, last_name in cur.fetchall():
+            _huellas[user_id] = (username, first_name, last_name)
+        cur.close()
+    finally:
+        conn.close()
+
+def registrar_actividad(user, cuando=None):
+    """Anota la actividad del usuario; solo encola el perfil si alguno de sus campos cambió."""
+    _ultimo_uso[user.id] = cuando or datetime.now()
+
+    huella = (user.username, user.first_name, user.last_name)
+    if _huellas.get(user.id) != huella:
+        _huellas[user.id] = huella
+        _perfiles[user.id] = huella
+        METRICAS_ACTIVIDAD["perfiles_cambiados"] += 1
+
+    METRICAS_ACTIVIDAD["pendientes"] = len(_ultimo_uso)
+
+def tomar_pendientes():
+    """Se llama desde el event loop: entrega lo acumulado y empieza un buffer nuevo."""
+    global _ultimo_uso, _perfiles
+    lote = (_ultimo_uso, _perfiles)
+    _ultimo_uso, _perfiles = {}, {}
+    METRICAS_ACTIVIDAD["pendientes"] = 0
+    return lote
+
+def devolver_pendientes(lote):
+    """Reencola un lote que no se pudo volcar, sin pisar datos más recientes."""
+    ultimo_uso, perfiles = lote
+    for user_id, cuando in ultimo_uso.items():
+        if user_id not in _ultimo_uso or _ultimo_uso[user_id] < cuando:
+            _ultimo_uso[user_id] = cuando
+    for user_id, huella in perfiles.items():
+        _perfiles.setdefault(user_id, huella)
+    METRICAS_ACTIVIDAD["pendientes"] = len(_ultimo_uso)
+
+def volcar_actividad(lote):
+    """Escribe un lote completo con una sola sentencia UPDATE."""
+    ultimo_uso, perfiles = lote
+    if not ultimo_uso:
+        return 0
+
+    ids = list(ultimo_uso)
+    ids_perfil = list(perfiles)
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE usuarios u
+            SET fecha_ultimo_uso = GREATEST(u.fecha_ultimo_uso, v.fecha),
+                username = CASE WHEN p.id IS NULL THEN u.username ELSE p.username END,
+                first_name = CASE WHEN p.id IS NULL THEN u.first_name ELSE p.first_name END,
+                last_name = CASE WHEN p.id IS NULL THEN u.last_name ELSE p.last_name END
+            FROM unnest(%s::bigint[], %s::timestamp[]) AS v(id, fecha)
+            LEFT JOIN unnest(%s::bigint[], %s::varchar[], %s::varchar[], %s::varchar[])
+                AS p(id, username, first_name, last_name) ON p.id = v.id
+            WHERE u.id = v.id
+        """, (
+            ids, [ultimo_uso[i] for i in ids],
+            ids_perfil,
+            [perfiles[i][0] for i in ids_perfil],
+            [perfiles[i][1] for i in ids_perfil],
+            [perfiles[i][2] for i in ids_perfil],
+        ))
+        filas = cur.rowcount
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    METRICAS_ACTIVIDAD["volcados"] += 1
+    METRICAS_ACTIVIDAD["filas_volcadas"] += filas
+    return filas
+
+async def volcar_pendientes():
+    """Vuelca lo acumulado fuera del event loop; si falla, lo reencola para el próximo intento."""
+    lote = tomar_pendientes()
+    if not lote[0]:
+        return
+    try:
+        await asyncio.to_thread(volcar_actividad, lote)
+    except Exception as e:
+        logger.error("❌ Error al volcar la actividad de usuarios: %s", e, exc_info=True)
+        devolver_pendientes(lote)
+
+async def bucle_actividad():
+    """Tarea en segundo plano: vuelca la actividad cada ACTIVIDAD_INTERVALO_SEG."""
+    while True:
+        await asyncio.sleep(config.ACTIVIDAD_INTERVALO_SEG)
+        await volcar_pendientes()
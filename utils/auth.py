@@ -1,6 +1,72 @@
 # utils/auth.py
+import logging
+
 from config import AUTHORIZED_USERS
+from database.cambios import registrar_invalidador
+from database.connection import BaseDatosNoDisponible, get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Los IDs de ADMIN_ID son administradores: siempre autorizados y pueden autorizar a otros
+ADMINISTRADORES = frozenset(AUTHORIZED_USERS)
+
+# Conjunto inmutable en memoria; recargar = reemplazar la referencia completa
+_autorizados = ADMINISTRADORES
 
 def is_user_authorized(user_id: int) -> bool:
     """Verifica si el usuario está autorizado para usar el bot."""
-    return user_id in AUTHORIZED_USERS
\ No newline at end of file
+    return user_id in _autorizados
+
+def es_administrador(user_id: int) -> bool:
+    """Verifica si el usuario puede autorizar o revocar a otros."""
+    return user_id in ADMINISTRADORES
+
+def cargar_autorizados():
+    """Lee los usuarios activos de la tabla 'usuarios' y reemplaza el conjunto en memoria."""
+    global _autorizados
+
+    try:
+        conn = get_db_connection()
+    except BaseDatosNoDisponible:
+        logger.error("❌ No se pudo cargar la lista de usuarios autorizados; se mantiene la actual.")
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM usuarios WHERE activo = TRUE")
+        ids = [fila[0] for fila in cur.fetchall()]
+        cur.close()
+    except Exception as e:
+        logger.error("❌ Error al cargar los usuarios autorizados: %s", e, exc_info=True)
+        return
+    finally:
+        conn.close()
+
+    _autorizados = ADMINISTRADORES | frozenset(ids)
+    logger.info("🔐 Usuarios autorizados cargados: %s.", len(_autorizados))
+
+def actualizar_autorizado(user_id):
+    """Relee solo el estado de un usuario (o todos si user_id es None) tras un cambio."""
+    global _autorizados
+
+    if user_id is None:
+        cargar_autorizados()
+        return
+
+    try:
+        conn = get_db_connection()
+    except BaseDatosNoDisponible:
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT activo FROM usuarios WHERE id = %s", (user_id,))
+        fila = cur.fetchone()
+        cur.close()
+    finally:
+        conn.close()
+
+    if (fila and fila[0]) or user_id in ADMINISTRADORES:
+        _autorizados = _autorizados | {user_id}
+    else:
+        _autorizados = _autorizados - {user_id}
+
+registrar_invalidador("usuarios", actualizar_autorizado, bloqueante=True)
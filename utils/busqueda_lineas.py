@@ -0,0 +1,85 @@
+# utils/busqueda_lineas.py
+# Búsqueda de líneas por fragmento de número o alias. Si las líneas del usuario ya están en
+# la caché, se busca en un índice de sufijos en memoria (bisect sobre una lista ordenada);
+# si no, en la base de datos con el índice trigram, sin cargar todas sus líneas.
+import bisect
+from collections import OrderedDict
+
+from database.busqueda import CON_TILDE, SIN_TILDE, buscar_lineas_db
+from database.connection import get_db_connection
+from utils.cache_lineas import lineas_en_cache
+
+MAX_RESULTADOS = 20
+MAX_INDICES = 1000  # Usuarios con índice construido (los más recientes)
+
+# user_id -> (tupla de líneas de la caché, claves ordenadas, posiciones)
+_indices = OrderedDict()
+
+_SIN_TILDES = str.maketrans(CON_TILDE, SIN_TILDE)
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, para comparar 'Mamá' con 'mama' (igual que normalizar_busqueda en SQL)."""
+    return texto.translate(_SIN_TILDES).lower()
+
+def _claves_linea(numero, alias):
+    """Todos los sufijos del número y de cada palabra del alias: un prefijo de alguno
+    equivale a 'contiene' (buscar '4567' encuentra 5551234567)."""
+    claves = {numero[i:] for i in range(len(numero))}
+    for palabra in normalizar(alias or "").split():
+        claves.update(palabra[i:] for i in range(len(palabra)))
+    return claves
+
+def _construir_indice(lineas):
+    pares = sorted(
+        (clave, posicion)
+        for posicion, (_, numero, alias) in enumerate(lineas)
+        for clave in _claves_linea(numero, alias)
+    )
+    return [clave for clave, _ in pares], [posicion for _, posicion in pares]
+
+def _indice(user_id, lineas):
+    """Índice del usuario; se reconstruye cuando la caché de líneas trae otra tupla."""
+    entrada = _indices.get(user_id)
+    if entrada is None or entrada[0] is not lineas:
+        entrada = (lineas, *_construir_indice(lineas))
+        _indices[user_id] = entrada
+        if len(_indices) > MAX_INDICES:
+            _indices.popitem(last=False)
+    _indices.move_to_end(user_id)
+    return entrada[1], entrada[2]
+
+def _buscar_en_memoria(user_id, lineas, terminos, limite):
+    claves, posiciones = _indice(user_id, lineas)
+    coincidencias = None
+    for termino in terminos:
+        encontradas = set()
+        i = bisect.bisect_left(claves, termino)
+        while i < len(claves) and claves[i].startswith(termino):
+            encontradas.add(posiciones[i])
+            i += 1
+        coincidencias = encontradas if coincidencias is None else coincidencias & encontradas
+        if not coincidencias:
+            return []
+    return [lineas[posicion] for posicion in sorted(coincidencias)[:limite]]
+
+def buscar_lineas(user_id, texto, limite=MAX_RESULTADOS):
+    """Líneas activas del usuario que contienen todas las palabras de 'texto' en su número o alias.
+
+    Devuelve tuplas (id, numero_linea, nombre_alias) en orden de ID.
+    """
+    terminos = normalizar(texto).split()
+    if not terminos:
+        return []
+
+    lineas = lineas_en_cache(user_id)
+    if lineas is not None:
+        return _buscar_en_memoria(user_id, lineas, terminos, limite)
+
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
+    try:
+        cur = conn.cursor()
+        resultados = buscar_lineas_db(cur, user_id, terminos, limite)
+        cur.close()
+    finally:
+        conn.close()
+    return resultados
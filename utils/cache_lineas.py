@@ -0,0 +1,44 @@
+# utils/cache_lineas.py
+# Caché por usuario de sus líneas activas (id, número, alias) para los menús de selección.
+# Se invalida por propietario vía LISTEN/NOTIFY, así que sirve con varios workers.
+from collections import OrderedDict
+
+from database.cambios import registrar_invalidador
+from database.connection import get_db_connection
+from database.preparadas import ejecutar
+
+MAX_PROPIETARIOS = 5000
+
+_lineas_por_propietario = OrderedDict()
+
+def obtener_lineas_activas(user_id):
+    """Líneas activas del usuario como tupla de (id, numero_linea, nombre_alias), en orden de ID."""
+    lineas = _lineas_por_propietario.get(user_id)
+    if lineas is not None:
+        _lineas_por_propietario.move_to_end(user_id)
+        return lineas
+
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
+    cur = conn.cursor()
+    ejecutar(cur, "lineas_activas", (user_id,))
+    lineas = tuple(cur.fetchall())
+    cur.close()
+    conn.close()
+
+    _lineas_por_propietario[user_id] = lineas
+    if len(_lineas_por_propietario) > MAX_PROPIETARIOS:
+        _lineas_por_propietario.popitem(last=False)
+    return lineas
+
+def lineas_en_cache(user_id):
+    """Las líneas del usuario si ya están en caché, sin ir a la base de datos (o None)."""
+    return _lineas_por_propietario.get(user_id)
+
+def invalidar_lineas(user_id=None):
+    """Descarta las líneas en caché de un usuario (o de todos si user_id es None)."""
+    if user_id is None:
+        _lineas_por_propietario.clear()
+    else:
+        _lineas_por_propietario.pop(user_id, None)
+
+registrar_invalidador("lineas", invalidar_lineas)
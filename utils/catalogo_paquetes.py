@@ -0,0 +1,95 @@
+# utils/catalogo_paquetes.py
+import logging
+from types import MappingProxyType
+from typing import NamedTuple
+
+from database.cambios import registrar_invalidador
+from database.connection import BaseDatosNoDisponible, get_db_connection
+
+logger = logging.getLogger(__name__)
+
+class Paquete(NamedTuple):
+    id: int
+    descripcion: str
+    precio: float
+    datos_gb: float
+    minutos: float
+    sms: float
+    dias_vigencia: int
+    componentes: tuple  # ((tipo_recurso, cantidad), ...) ya calculados al cargar
+
+# Catálogo inicial: se inserta en la tabla 'paquetes' si está vacía
+# (ID, Descripción, Precio, GB, Minutos, SMS, Días de vigencia)
+PAQUETES_INICIALES = [
+    (1, "2GB + 15min + 20 SMS", 120.0, 2, 15, 20, 35),
+    (2, "4GB + 35min + 40 SMS", 240.0, 4, 35, 40, 35),
+    (3, "6GB + 60min + 70 SMS", 360.0, 6, 60, 70, 35),
+    (4, "4.5GB", 240.0, 4.5, 0, 0, 35),
+    (5, "5min", 37.5, 0, 5, 0, 35),
+    (6, "20 SMS", 15.0, 0, 0, 20, 35),
+]
+
+def _crear_paquete(pid, descripcion, precio, datos_gb, minutos, sms, dias_vigencia):
+    componentes = tuple(
+        (tipo, float(cantidad))
+        for tipo, cantidad in (("datos", datos_gb), ("minutos", minutos), ("sms", sms))
+        if cantidad
+    )
+    return Paquete(int(pid), descripcion, float(precio), float(datos_gb), float(minutos), float(sms),
+                   int(dias_vigencia), componentes)
+
+def _construir_indice(filas):
+    paquetes = tuple(_crear_paquete(*fila) for fila in filas)
+    return paquetes, MappingProxyType({p.id: p for p in paquetes})
+
+# Índice inmutable en memoria; recargar = reemplazar la referencia completa
+_paquetes, _por_id = _construir_indice(PAQUETES_INICIALES)
+
+def obtener_paquetes():
+    """Paquetes activos, en orden de ID."""
+    return _paquetes
+
+def obtener_paquete(paquete_id):
+    """Busca un paquete por ID en O(1). Devuelve None si no existe."""
+    return _por_id.get(paquete_id)
+
+def cargar_catalogo():
+    """Lee la tabla 'paquetes' y reemplaza el índice en memoria (sembrándola si está vacía)."""
+    global _paquetes, _por_id
+
+    try:
+        conn = get_db_connection()
+    except BaseDatosNoDisponible:
+        logger.error("❌ No se pudo cargar el catálogo de paquetes; se mantiene el actual.")
+        return
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT EXISTS (SELECT 1 FROM paquetes)")
+        if not cur.fetchone()[0]:
+            cur.executemany("""
+                INSERT INTO paquetes (id, descripcion, precio, datos_gb, minutos, sms, dias_vigencia)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (id) DO NOTHING
+            """, PAQUETES_INICIALES)
+            conn.commit()
+
+        cur.execute("""
+            SELECT id, descripcion, precio, datos_gb, minutos, sms, dias_vigencia
+            FROM paquetes
+            WHERE activo = TRUE
+            ORDER BY id
+        """)
+        filas = cur.fetchall()
+        cur.close()
+    except Exception as e:
+        logger.error("❌ Error al cargar el catálogo de paquetes: %s", e, exc_info=True)
+        conn.rollback()
+        return
+    finally:
+        conn.close()
+
+    _paquetes, _por_id = _construir_indice(filas)
+    logger.info("📦 Catálogo de paquetes cargado: %s paquetes.", len(_paquetes))
+
+registrar_invalidador("paquetes", lambda _clave: cargar_catalogo(), bloqueante=True)
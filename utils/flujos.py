@@ -0,0 +1,161 @@
+# utils/flujos.py
+# Estado de los flujos de conversación (recarga, compra, alta/baja de línea, consulta).
+# Un objeto con __slots__ por usuario y flujo, con vida limitada: un flujo abandonado se
+# purga solo, en vez de quedarse para siempre en context.user_data.
+import asyncio
+import logging
+import sys
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+MENSAJE_FLUJO_CADUCADO = "⌛ Esta operación caducó por inactividad. Empieza de nuevo desde el menú (/start)."
+
+class Flujo:
+    """Base: cada subclase declara sus campos en __slots__ y su vida en VIDA_SEG."""
+
+    __slots__ = ("tocado",)
+    VIDA_SEG = 15 * 60
+
+    def __init__(self):
+        self.tocado = time.monotonic()
+
+    def vencido(self, ahora):
+        return ahora - self.tocado > self.VIDA_SEG
+
+class FlujoRecarga(Flujo):
+    __slots__ = ("linea_id", "paso", "monto", "año", "mes")
+
+    def __init__(self, linea_id, paso=None):
+        super().__init__()
+        self.linea_id = linea_id
+        self.paso = paso
+        self.monto = None  # None: sin importe
+        self.año = None
+        self.mes = None
+
+class FlujoPaquete(Flujo):
+    __slots__ = ("linea_id", "paquete_id", "año", "mes")
+
+    def __init__(self, linea_id):
+        super().__init__()
+        self.linea_id = linea_id
+        self.paquete_id = None
+        self.año = None
+        self.mes = None
+
+class FlujoAgregarLinea(Flujo):
+    __slots__ = ("paso", "numero_linea")
+    VIDA_SEG = 10 * 60
+
+    def __init__(self, paso):
+        super().__init__()
+        self.paso = paso
+        self.numero_linea = None
+
+class FlujoEliminarLinea(Flujo):
+    __slots__ = ("linea_id",)
+    VIDA_SEG = 5 * 60
+
+    def __init__(self, linea_id):
+        super().__init__()
+        self.linea_id = linea_id
+
+class FlujoConsulta(Flujo):
+    """Navegación por las líneas: guarda los IDs, no las filas (los datos se releen al mostrar)."""
+
+    __slots__ = ("linea_ids", "indice")
+    VIDA_SEG = 30 * 60
+
+    def __init__(self, linea_ids):
+        super().__init__()
+        self.linea_ids = tuple(linea_ids)
+        self.indice = 0
+
+# (user_id, clase) -> flujo. Plano a propósito: purgar es recorrer un solo dict
+_flujos = {}
+METRICAS_FLUJOS = {"iniciados": 0, "terminados": 0, "vencidos": 0}
+
+def iniciar(user_id, flujo):
+    """Empieza (o reinicia) el flujo de ese tipo para el usuario."""
+    _flujos[(user_id, type(flujo))] = flujo
+    METRICAS_FLUJOS["iniciados"] += 1
+    return flujo
+
+def obtener(user_id, clase):
+    """Flujo en curso del usuario, o None si no hay o ya venció. Renueva su vida."""
+    flujo = _flujos.get((user_id, clase))
+    if flujo is None:
+        return None
+    ahora = time.monotonic()
+    if flujo.vencido(ahora):
+        del _flujos[(user_id, clase)]
+        METRICAS_FLUJOS["vencidos"] += 1
+        return None
+    flujo.tocado = ahora
+    return flujo
+
+def terminar(user_id, clase):
+    if _flujos.pop((user_id, clase), None) is not None:
+        METRICAS_FLUJOS["terminados"] += 1
+
+def purgar_vencidos():
+    """Descarta los flujos abandonados. Devuelve cuántos."""
+    ahora = time.monotonic()
+    vencidos = [clave for clave, flujo in _flujos.items() if flujo.vencido(ahora)]
+    for clave in vencidos:
+        del _flujos[clave]
+    METRICAS_FLUJOS["vencidos"] += len(vencidos)
+    return len(vencidos)
+
+def _campos(clase):
+    """Todos los __slots__ de la clase y de sus bases (p. ej. 'tocado' de Flujo)."""
+    campos = []
+    for base in clase.__mro__:
+        slots = base.__dict__.get("__slots__", ())
+        campos.extend((slots,) if isinstance(slots, str) else slots)
+    return campos
+
+def _tamano(flujo):
+    tamano = sys.getsizeof(flujo)
+    for campo in _campos(type(flujo)):
+        valor = getattr(flujo, campo, None)
+        tamano += sys.getsizeof(valor)
+        if isinstance(valor, tuple):
+            tamano += sum(sys.getsizeof(v) for v in valor)
+    return tamano
+
+def informe_memoria(application=None):
+    """Flujos vivos por tipo y bytes aproximados (objeto + campos), y user_data que quede en PTB."""
+    por_tipo = {}
+    vivos = list(_flujos.items())  # Copia: el dict no debe cambiar mientras se recorre
+    for (_, clase), flujo in vivos:
+        datos = por_tipo.setdefault(clase.__name__, {"vivos": 0, "bytes": 0})
+        datos["vivos"] += 1
+        datos["bytes"] += _tamano(flujo)
+    informe = {
+        "flujos": por_tipo,
+        "usuarios_con_flujo": len({user_id for (user_id, _), _ in vivos}),
+        "bytes_total": sum(datos["bytes"] for datos in por_tipo.values()),
+        **METRICAS_FLUJOS,
+    }
+    if application is not None:
+        informe["user_data_ptb"] = len(application.user_data)
+    return informe
+
+async def bucle_flujos(application):
+    """Tarea en segundo plano: purga flujos vencidos y los user_data vacíos que PTB va creando."""
+    while True:
+        await asyncio.sleep(config.FLUJOS_PURGA_SEG)
+        try:
+            vencidos = purgar_vencidos()
+            # PTB crea un dict por usuario al acceder a context.user_data y nunca lo borra
+            vacios = [user_id for user_id, datos in application.user_data.items() if not datos]
+            for user_id in vacios:
+                application.drop_user_data(user_id)
+            if vencidos or vacios:
+                logger.debug("🧽 Flujos vencidos: %s, user_data vacíos: %s", vencidos, len(vacios))
+        except Exception as e:
+            logger.error("❌ Error al purgar flujos: %s", e, exc_info=True)
@@ -1,41 +1,197 @@
 # utils/limpieza_db.py
+import asyncio
 import logging
-from database.connection import get_db_connection
-from datetime import date, timedelta
+import time
+from datetime import datetime, timedelta
+
+import config
+from database.connection import BaseDatosNoDisponible, get_db_connection, fijar_presupuesto
+from database.archivo import sql_archivar
+from utils import reloj
+from database.particiones import (
+    PARTICION_DEFAULT, asegurar_particiones, eliminar_particion, fecha_limite_retencion, particiones_vencidas,
+)
 
 logger = logging.getLogger(__name__)
 
-async def limpiar_recursos_viejos():
-    """Borra recursos de recursos_linea que vencieron hace más de 4 meses."""
-    conn = get_db_connection()
-    if not conn:
-        logger.error("❌ No se pudo conectar a la base de datos para limpieza.")
-        return
+# Antigüedad a partir de la cual se borran las líneas eliminadas lógicamente
+DIAS_RETENCION_LINEAS = 7
 
-    try:
+# Métricas publicadas por el motor de retención (ver endpoint /metricas)
+METRICAS_RETENCION = {
+    "ejecuciones": 0,
+    "ultima_ejecucion": None,
+    "ultima_duracion_seg": 0.0,
+    "ultimas_lineas_eliminadas": 0,
+    "ultimos_recursos_eliminados": 0,
+    "ultimas_particiones_eliminadas": 0,
+    "ultimos_activos_archivados": 0,  # De las particiones eliminadas, los que seguían marcados activos
+    "particiones_creadas_total": 0,
+    "presupuesto_agotado": False,
+    "lineas_eliminadas_total": 0,
+    "recursos_eliminados_total": 0,
+    "errores": 0,
+}
+
+def _borrar_por_lotes(conn, sentencia, params, tamano_lote, limite):
+    """Ejecuta 'sentencia' en transacciones cortas hasta que no quede nada o se agote el tiempo.
+
+    Devuelve (filas_borradas, completado).
+    """
+    total = 0
+    while time.monotonic() < limite:
         cur = conn.cursor()
+        try:
+            cur.execute(sentencia, params + (tamano_lote,))
+            # Las sentencias con CTE de archivo devuelven el conteo como resultado
+            borradas = cur.fetchone()[0] if cur.description else cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
 
-        # Calcular fecha límite: hoy - 4 meses (aproximado como 120 días)
-        fecha_limite = date.today() - timedelta(days=120)
-
-        # Contar registros que se van a borrar (para log)
-        cur.execute("""
-            SELECT COUNT(*) FROM recursos_linea
-            WHERE fecha_vencimiento < %s AND activo = FALSE
-        """, (fecha_limite,))
-        count_before = cur.fetchone()[0]
-
-        # Borrar recursos vencidos hace más de 4 meses
-        cur.execute("""
-            DELETE FROM recursos_linea
-            WHERE fecha_vencimiento < %s AND activo = FALSE
-        """, (fecha_limite,))
-        conn.commit()
+        total += borradas
+        if borradas < tamano_lote:
+            return total, True
+    return total, False
 
-        logger.info(f"🧹 Limpieza de DB completada: {cur.rowcount} recursos eliminados (vencidos antes de {fecha_limite}).")
-    except Exception as e:
-        logger.error(f"❌ Error durante la limpieza de recursos viejos: {e}", exc_info=True)
+def borrar_lineas_antiguas(conn, hoy, tamano_lote, limite):
+    """Borra por lotes las líneas inactivas antiguas; sus recursos pasan al archivo."""
+    return _borrar_por_lotes(conn, f"""
+        WITH lote AS (
+            SELECT id FROM lineas
+            WHERE activa = FALSE AND fecha_registro <= %s
+            ORDER BY id
+            LIMIT %s
+        ), recursos AS (
+            DELETE FROM recursos_linea WHERE linea_id IN (SELECT id FROM lote)
+            RETURNING *
+        ), archivados AS (
+            {sql_archivar("recursos")}
+        )
+        DELETE FROM lineas WHERE id IN (SELECT id FROM lote)
+    """, (hoy - timedelta(days=DIAS_RETENCION_LINEAS),), tamano_lote, limite)
+
+def borrar_recursos_default(conn, hoy, tamano_lote, limite):
+    """Archiva por lotes los recursos antiguos que quedaron en la partición default (fuera de rango).
+
+    Como en eliminar_particion, también los que seguían activos: las consultas de activos ya no los
+    ven (fecha_limite_retencion), y así la partición default no crece.
+    """
+    return _borrar_por_lotes(conn, f"""
+        WITH movidos AS (
+            DELETE FROM {PARTICION_DEFAULT}
+            WHERE ctid = ANY(ARRAY(
+                SELECT ctid FROM {PARTICION_DEFAULT}
+                WHERE fecha_vencimiento < %s
+                LIMIT %s
+            ))
+            RETURNING *
+        ), archivados AS (
+            {sql_archivar("movidos")}
+        )
+        SELECT COUNT(*) FROM movidos
+    """, (fecha_limite_retencion(hoy),), tamano_lote, limite)
+
+def mantener_particiones(conn, hoy, limite):
+    """Crea las particiones de los próximos meses; las ya vencidas se archivan y se eliminan enteras.
+
+    Devuelve (particiones_creadas, particiones_eliminadas, filas_eliminadas, activas_eliminadas, completado).
+    """
+    cur = conn.cursor()
+    try:
+        creadas = asegurar_particiones(cur, hoy)
+        conn.commit()
+        vencidas = particiones_vencidas(cur, fecha_limite_retencion(hoy))
+        conn.commit()
+    except Exception:
         conn.rollback()
+        cur.close()
+        raise
+
+    eliminadas = filas = activas = 0
+    try:
+        for nombre in vencidas:
+            if time.monotonic() >= limite:
+                return creadas, eliminadas, filas, activas, False
+            try:
+                # Archivar y eliminar en la misma transacción: o se hacen las dos o ninguna
+                cur.execute(sql_archivar(nombre))
+                filas_particion, activas_particion = eliminar_particion(cur, nombre)
+                conn.commit()
+                filas += filas_particion
+                activas += activas_particion
+                eliminadas += 1
+                logger.info("🗂️ Partición %s archivada y eliminada (%s recursos aún activos).", nombre, activas_particion)
+            except Exception:
+                conn.rollback()
+                raise
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+    return creadas, eliminadas, filas, activas, True
+
+def ejecutar_retencion(hoy=None):
+    """Una pasada completa de retención, limitada por el presupuesto de tiempo configurado."""
+    if hoy is None:
+        hoy = reloj.hoy()
+
+    inicio = time.monotonic()
+    limite = inicio + config.RETENCION_PRESUPUESTO_SEG
+    tamano_lote = config.RETENCION_TAMANO_LOTE
+
+    try:
+        conn = get_db_connection()
+    except BaseDatosNoDisponible:
+        logger.error("❌ No se pudo conectar a la base de datos para la retención.")
+        METRICAS_RETENCION["errores"] += 1
+        return
+
+    lineas = recursos = activas = creadas = particiones = 0
+    completado = False
+    try:
+        fijar_presupuesto(conn, config.DB_PRESUPUESTO_FONDO_MS)
+        lineas, completado = borrar_lineas_antiguas(conn, hoy, tamano_lote, limite)
+        if completado:
+            creadas, particiones, recursos, activas, completado = mantener_particiones(conn, hoy, limite)
+        if completado:
+            sueltos, completado = borrar_recursos_default(conn, hoy, tamano_lote, limite)
+            recursos += sueltos
+    except Exception as e:
+        logger.error("❌ Error durante la retención de datos: %s", e, exc_info=True)
+        METRICAS_RETENCION["errores"] += 1
+    finally:
+        conn.close()
+
+    duracion = time.monotonic() - inicio
+    METRICAS_RETENCION.update({
+        "ejecuciones": METRICAS_RETENCION["ejecuciones"] + 1,
+        "ultima_ejecucion": datetime.now().isoformat(timespec="seconds"),
+        "ultima_duracion_seg": round(duracion, 3),
+        "ultimas_lineas_eliminadas": lineas,
+        "ultimos_recursos_eliminados": recursos,
+        "ultimas_particiones_eliminadas": particiones,
+        "ultimos_activos_archivados": activas,
+        "particiones_creadas_total": METRICAS_RETENCION["particiones_creadas_total"] + creadas,
+        "presupuesto_agotado": not completado,
+        "lineas_eliminadas_total": METRICAS_RETENCION["lineas_eliminadas_total"] + lineas,
+        "recursos_eliminados_total": METRICAS_RETENCION["recursos_eliminados_total"] + recursos,
+    })
+    logger.info(
+        "🧹 Retención completada en %.2fs: %s líneas y %s recursos eliminados (%s particiones)%s",
+        duracion, lineas, recursos, particiones,
+        " (presupuesto agotado, se continúa en la próxima ejecución)." if not completado else ".",
+    )
+
+async def bucle_retencion():
+    """Tarea en segundo plano: ejecuta la retención periódicamente fuera de los handlers."""
+    intervalo = config.RETENCION_INTERVALO_MIN * 60
+    # Primera pasada poco después del arranque, sin retrasar el startup
+    await asyncio.sleep(60)
+    while True:
+        try:
+            await asyncio.to_thread(ejecutar_retencion)
+        except Exception as e:
+            logger.error("❌ Error en el bucle de retención: %s", e, exc_info=True)
+        await asyncio.sleep(intervalo)
@@ -0,0 +1,176 @@
+# utils/perfilado.py
+# Modo de perfilado (opcional): un muestreador de pilas de bajo costo siempre activo y cProfile
+# para una fracción de los updates. Se guardan los N updates más lentos y, aparte, los últimos
+# N perfiles de cProfile de updates rápidos (muestras de referencia).
+import cProfile
+import heapq
+import io
+import itertools
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+import config
+
+PROFUNDIDAD_MAXIMA = 60
+VENTANA_SEG = 60  # Historia de muestras que se conserva
+
+class MuestreadorPilas(threading.Thread):
+    """Hilo que toma cada 'intervalo' segundos la pila del hilo del event loop."""
+
+    def __init__(self, hilo_objetivo, intervalo):
+        super().__init__(name="muestreador-pilas", daemon=True)
+        self.hilo_objetivo = hilo_objetivo
+        self.intervalo = intervalo
+        self.muestras = deque(maxlen=int(VENTANA_SEG / intervalo))
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_objetivo)
+            pila = []
+            while frame is not None and len(pila) < PROFUNDIDAD_MAXIMA:
+                codigo = frame.f_code
+                pila.append(f"{codigo.co_filename.rsplit('/', 1)[-1]}:{codigo.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.muestras.append((time.monotonic(), tuple(reversed(pila))))
+
+    def detener(self):
+        self._detener.set()
+
+    def pilas_entre(self, inicio, fin):
+        """Pilas plegadas (formato flamegraph: 'a;b;c N') del hilo tomadas entre dos instantes.
+
+        Son del hilo, no de un update: si otros updates se procesaron a la vez, sus pilas también están.
+        """
+        conteo = Counter(pila for momento, pila in list(self.muestras) if inicio <= momento <= fin)
+        return "\n".join(f"{';'.join(pila)} {n}" for pila, n in conteo.most_common())
+
+class Perfilador:
+    """Mide cada update y guarda el perfil de los más lentos (y muestras de los rápidos)."""
+
+    def __init__(self, fraccion, umbral_ms, max_guardados, intervalo_muestreo):
+        self.fraccion = fraccion
+        self.umbral_ms = umbral_ms
+        self.max_guardados = max_guardados
+        self.muestreador = MuestreadorPilas(threading.get_ident(), intervalo_muestreo)
+        self._lentos = []  # min-heap de (duracion_ms, n, perfil): la raíz es el más rápido de los guardados
+        self._muestras = deque(maxlen=max_guardados)  # cProfile de updates bajo el umbral, los últimos
+        self._contador = itertools.count()
+        self._en_curso = {}  # n -> máximo de updates simultáneos mientras duró el update n
+        self._cprofile_en_uso = False
+        self.metricas = {"updates": 0, "con_cprofile": 0, "lentos": 0}
+
+    def iniciar(self):
+        self.muestreador.start()
+
+    def detener(self):
+        self.muestreador.detener()
+
+    async def medir(self, update, corrutina):
+        """Ejecuta la corrutina del update midiéndola; si fue lenta, guarda su perfil."""
+        self.metricas["updates"] += 1
+
+        # cProfile perfila todo el hilo (también otros updates concurrentes): solo uno a la vez
+        perfil = None
+        if not self._cprofile_en_uso and random.random() < self.fraccion:
+            self._cprofile_en_uso = True
+            self.metricas["con_cprofile"] += 1
+            perfil = cProfile.Profile()
+            perfil.enable()
+
+        # Updates que se solapan: sus pilas (y su cProfile) se mezclan con las de este
+        n = next(self._contador)
+        simultaneos = len(self._en_curso) + 1
+        for otro in self._en_curso:
+            self._en_curso[otro] = max(self._en_curso[otro], simultaneos)
+        self._en_curso[n] = simultaneos
+
+        inicio = time.monotonic()
+        try:
+            return await corrutina
+        finally:
+            fin = time.monotonic()
+            if perfil is not None:
+                perfil.disable()
+                self._cprofile_en_uso = False
+            concurrentes = self._en_curso.pop(n) - 1
+
+            duracion_ms = (fin - inicio) * 1000
+            if duracion_ms >= self.umbral_ms or perfil is not None:
+                self._guardar(update, n, duracion_ms, inicio, fin, perfil, concurrentes)
+
+    def _guardar(self, update, n, duracion_ms, inicio, fin, perfil, concurrentes):
+        lento = duracion_ms >= self.umbral_ms
+        if perfil is not None:
+            salida = io.StringIO()
+            pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(40)
+            contenido, formato = salida.getvalue(), "cprofile"
+        else:
+            contenido, formato = self.muestreador.pilas_entre(inicio, fin), "pilas_hilo"
+        if concurrentes:
+            contenido = (
+                f"# Perfil del hilo del event loop: incluye {concurrentes} update(s) procesados a la vez\n"
+                + contenido
+            )
+
+        entrada = (duracion_ms, n, {
+            "update_id": update.update_id,
+            "update": describir_update(update),
+            "duracion_ms": round(duracion_ms, 1),
+            "momento": datetime.now().isoformat(timespec="seconds"),
+            "tipo": "lento" if lento else "muestra",
+            "formato": formato,
+            "concurrentes": concurrentes,
+            "contenido": contenido,
+        })
+        if not lento:
+            self._muestras.append(entrada)
+            return
+
+        self.metricas["lentos"] += 1
+        if len(self._lentos) < self.max_guardados:
+            heapq.heappush(self._lentos, entrada)
+        elif duracion_ms > self._lentos[0][0]:
+            heapq.heapreplace(self._lentos, entrada)
+
+    def _guardados(self):
+        """Los lentos (del más lento al más rápido) y después las muestras (de la más reciente)."""
+        return sorted(self._lentos, reverse=True) + list(reversed(self._muestras))
+
+    def listar(self):
+        """Perfiles guardados, en el orden de obtener() (sin el contenido)."""
+        return [
+            {clave: valor for clave, valor in perfil.items() if clave != "contenido"}
+            for _, _, perfil in self._guardados()
+        ]
+
+    def obtener(self, indice):
+        guardados = self._guardados()
+        return guardados[indice][2] if 0 <= indice < len(guardados) else None
+
+def describir_update(update):
+    """Texto corto para reconocer el update: datos del callback o el comando."""
+    if update.callback_query:
+        return f"callback:{update.callback_query.data}"
+    if update.message and update.message.text:
+        return f"mensaje:{update.message.text.split()[0][:32]}"
+    return "otro"
+
+def crear_perfilador():
+    """Perfilador configurado, o None si el modo de perfilado está desactivado.
+
+    Debe llamarse desde el hilo del event loop (es el que se muestrea).
+    """
+    if not config.PERFIL_ACTIVO:
+        return None
+    return Perfilador(
+        fraccion=config.PERFIL_FRACCION,
+        umbral_ms=config.PERFIL_UMBRAL_MS,
+        max_guardados=config.PERFIL_MAX_GUARDADOS,
+        intervalo_muestreo=config.PERFIL_INTERVALO_MUESTREO_MS / 1000,
+    )
@@ -0,0 +1,185 @@
+# utils/programador_avisos.py
+# Programador en proceso: cada usuario tiene su próximo aviso en un min-heap y se le avisa a su hora,
+# repartida dentro de una ventana diaria, en lugar de un barrido de todos una vez al día.
+import asyncio
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import config
+from database.cambios import registrar_invalidador
+from utils import reloj
+from notificaciones import notificar_propietario
+from utils.resumen_propietario import leer_resumen_aviso, leer_resumenes_aviso, liberar_aviso, reclamar_aviso
+
+logger = logging.getLogger(__name__)
+
+LOTE_CARGA = 1000
+ESPERA_MAXIMA_SEG = 3600  # Despierta al menos cada hora (cambio de día, relojes)
+DIAS_AVISO_RECURSOS = 3  # Igual que propietarios_a_notificar
+REINTENTO_BASE_SEG = 60  # Tras un error: 1, 2, 4… minutos, hasta REINTENTO_MAX_SEG
+REINTENTO_MAX_SEG = 3600
+
+def fecha_aviso(proxima_recarga, proximo_vencimiento, recursos_vencidos, hoy):
+    """Primer día en que hay algo que avisar, o None si no hay nada pendiente."""
+    candidatos = []
+    if recursos_vencidos:
+        candidatos.append(hoy)
+    if proxima_recarga:
+        candidatos.append(proxima_recarga)
+    if proximo_vencimiento:
+        candidatos.append(proximo_vencimiento - timedelta(days=DIAS_AVISO_RECURSOS))
+    return min(candidatos) if candidatos else None
+
+def desfase_usuario(user_id):
+    """Segundos dentro de la ventana de envío; fijo por usuario para repartir la carga."""
+    ventana_seg = config.AVISOS_VENTANA_MIN * 60
+    return (user_id * 2654435761) % ventana_seg if ventana_seg else 0
+
+class ProgramadorAvisos:
+    def __init__(self, bot):
+        self.bot = bot
+        self._heap = []       # (momento, user_id); las entradas viejas se descartan al sacarlas
+        self._momentos = {}   # user_id -> momento vigente
+        self._reintentos = {}  # user_id -> errores seguidos al avisarle
+        self._despertar = asyncio.Event()
+        self._loop = None
+        self._cargando = threading.Lock()  # Varias tablas piden 'todo' a la vez al reconectar el listener
+        hora, minuto = map(int, config.AVISOS_VENTANA_INICIO.split(":"))
+        self._inicio_ventana = (hora, minuto)
+        self.metricas = {"programados": 0, "avisos_enviados": 0, "sin_novedad": 0, "ya_avisados": 0,
+                         "errores": 0, "reintentos_pendientes": 0}
+
+    # ------------------------
+    # Programación
+    # ------------------------
+    def programar(self, user_id, fila):
+        """(Re)programa a un usuario a partir de su fila de resumen_propietario. Solo en el event loop."""
+        momento = self._calcular_momento(user_id, fila)
+        if momento is None:
+            self._momentos.pop(user_id, None)
+        elif self._momentos.get(user_id) != momento:
+            self._momentos[user_id] = momento
+            heapq.heappush(self._heap, (momento, user_id))
+            if self._heap[0][1] == user_id:
+                self._despertar.set()
+        self.metricas["programados"] = len(self._momentos)
+
+    def _reintentar(self, user_id):
+        """Vuelve a programar al usuario con espera exponencial tras un error al avisarle."""
+        intentos = self._reintentos.get(user_id, 0) + 1
+        self._reintentos[user_id] = intentos
+        espera = min(REINTENTO_BASE_SEG * 2 ** (intentos - 1), REINTENTO_MAX_SEG)
+        momento = reloj.ahora() + timedelta(seconds=espera)
+        self._momentos[user_id] = momento
+        heapq.heappush(self._heap, (momento, user_id))
+        self.metricas["reintentos_pendientes"] = len(self._reintentos)
+
+    def _calcular_momento(self, user_id, fila):
+        if not fila:
+            return None
+        _, lineas_activas, proxima_recarga, proximo_vencimiento, vencidos, ultima_notificacion = fila
+        hoy = reloj.hoy()
+        fecha = fecha_aviso(proxima_recarga, proximo_vencimiento, vencidos, hoy)
+        if not lineas_activas or fecha is None:
+            return None
+
+        dia = max(fecha, hoy)
+        if dia == hoy and ultima_notificacion == hoy:
+            dia = hoy + timedelta(days=1)  # Hoy ya se le avisó; mientras siga pendiente, un aviso por día
+        hora, minuto = self._inicio_ventana
+        inicio = datetime(dia.year, dia.month, dia.day, hora, minuto)
+        return inicio + timedelta(seconds=desfase_usuario(user_id))
+
+    def _cargar_todo(self):
+        """Lee todos los resúmenes por lotes (en un hilo) y los programa en el event loop."""
+        if not self._cargando.acquire(blocking=False):
+            return
+        try:
+            ultimo_id = -1
+            while True:
+                filas = leer_resumenes_aviso(ultimo_id, LOTE_CARGA)
+                if not filas:
+                    break
+                for fila in filas:
+                    self._loop.call_soon_threadsafe(self.programar, fila[0], fila)
+                ultimo_id = filas[-1][0]
+        finally:
+            self._cargando.release()
+
+    def _al_cambiar(self, user_id):
+        """Una escritura cambió las líneas o recursos de un usuario: releer su resumen."""
+        if user_id is None:
+            self._cargar_todo()
+            return
+        self._loop.call_soon_threadsafe(self.programar, user_id, leer_resumen_aviso(user_id))
+
+    # ------------------------
+    # Ejecución
+    # ------------------------
+    async def _recargar(self):
+        self._heap, self._momentos, self._reintentos = [], {}, {}
+        await asyncio.to_thread(self._cargar_todo)
+        await asyncio.sleep(0)  # Deja correr los call_soon_threadsafe pendientes
+        logger.info("⏰ Avisos programados", extra={"campos": {"usuarios": len(self._momentos)}})
+
+    async def _avisar(self, user_id):
+        hoy = reloj.hoy()
+        reclamado = avisado = False
+        try:
+            # Cada worker tiene su programador: solo avisa el que reclama el día en la base de datos
+            reclamado, anterior = await asyncio.to_thread(reclamar_aviso, user_id, hoy)
+            if not reclamado:
+                self.metricas["ya_avisados"] += 1
+            elif await notificar_propietario(self.bot, user_id, hoy):
+                self.metricas["avisos_enviados"] += 1
+            else:
+                self.metricas["sin_novedad"] += 1
+            avisado = True
+            fila = await asyncio.to_thread(leer_resumen_aviso, user_id)
+        except Exception as e:
+            self.metricas["errores"] += 1
+            logger.error("❌ Error al avisar al usuario %s: %s", user_id, e, exc_info=True)
+            if reclamado and not avisado:
+                try:
+                    await asyncio.to_thread(liberar_aviso, user_id, hoy, anterior)
+                except Exception as e:
+                    logger.warning("⚠️ No se pudo liberar el aviso del usuario %s: %s", user_id, e)
+            self._reintentar(user_id)
+            return
+        if self._reintentos.pop(user_id, None) is not None:
+            self.metricas["reintentos_pendientes"] = len(self._reintentos)
+        self.programar(user_id, fila)
+
+    async def ejecutar(self):
+        """Tarea en segundo plano (lifespan)."""
+        self._loop = asyncio.get_running_loop()
+        for tabla in ("lineas", "recursos_linea"):
+            registrar_invalidador(tabla, self._al_cambiar, bloqueante=True)
+
+        await self._recargar()
+        dia = reloj.hoy()
+
+        while True:
+            ahora = reloj.ahora()
+            if ahora.date() != dia:
+                # Cambio de día: lo que depende solo de la fecha (vencidos) se recalcula entero
+                dia = ahora.date()
+                await self._recargar()
+
+            while self._heap and self._heap[0][0] <= ahora:
+                momento, user_id = heapq.heappop(self._heap)
+                if self._momentos.get(user_id) != momento:
+                    continue  # Reprogramado después de encolarse
+                del self._momentos[user_id]
+                await self._avisar(user_id)
+
+            espera = ESPERA_MAXIMA_SEG
+            if self._heap:
+                espera = min(espera, max(0.0, (self._heap[0][0] - reloj.ahora()).total_seconds()))
+            self._despertar.clear()
+            try:
+                await asyncio.wait_for(self._despertar.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
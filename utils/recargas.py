@@ -1,5 +1,5 @@
 # utils/recargas.py
-from datetime import date
+from utils import reloj
 
 def calcular_estado_recarga(fecha_ultima_recarga, hoy=None):
     """
@@ -9,7 +9,7 @@ def calcular_estado_recarga(fecha_ultima_recarga, hoy=None):
     - Hoy = fecha_ultima_recarga + 31 → es el primer día "por vencer".
     """
     if hoy is None:
-        hoy = date.today()
+        hoy = reloj.hoy()
 
     if not fecha_ultima_recarga:
         return {
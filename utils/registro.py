@@ -0,0 +1,93 @@
+# utils/registro.py
+# Logging sin bloquear el event loop: los handlers solo encolan el registro; un hilo aparte
+# lo formatea y lo escribe. Los eventos de alto volumen se limitan por frecuencia.
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+FORMATO = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener = None
+_handlers_originales = None  # Los del logger raíz antes de configurar_registro
+
+class ColaSinFormato(QueueHandler):
+    """QueueHandler que no formatea en el hilo que registra: el mensaje (%-style) se arma
+    en el hilo del listener. Los argumentos deben ser inmutables o no cambiar después."""
+
+    def prepare(self, record):
+        return record
+
+class FormatoEstructurado(logging.Formatter):
+    """Añade al final los campos estructurados: logger.info("...", extra={"campos": {...}})."""
+
+    def format(self, record):
+        texto = super().format(record)
+        campos = getattr(record, "campos", None)
+        if campos:
+            texto += " | " + " ".join(f"{clave}={valor}" for clave, valor in campos.items())
+        suprimidos = getattr(record, "suprimidos", 0)
+        if suprimidos:
+            texto += f" (+{suprimidos} similares suprimidos)"
+        return texto
+
+class LimiteFrecuencia(logging.Filter):
+    """Deja pasar como mucho 'maximo' registros por 'intervalo' segundos de cada plantilla de mensaje
+    con nivel <= 'nivel_maximo' (por defecto DEBUG). El resto se cuenta y se informa en el siguiente."""
+
+    def __init__(self, maximo=20, intervalo=10.0, nivel_maximo=logging.DEBUG):
+        super().__init__()
+        self.maximo = maximo
+        self.intervalo = intervalo
+        self.nivel_maximo = nivel_maximo
+        self._ventanas = {}  # (logger, plantilla) -> [inicio, emitidos, suprimidos]
+
+    def filter(self, record):
+        if record.levelno > self.nivel_maximo and not getattr(record, "alto_volumen", False):
+            return True
+
+        ahora = time.monotonic()
+        clave = (record.name, record.msg)
+        ventana = self._ventanas.get(clave)
+        if ventana is None or ahora - ventana[0] >= self.intervalo:
+            suprimidos = ventana[2] if ventana else 0
+            self._ventanas[clave] = [ahora, 1, 0]
+            record.suprimidos = suprimidos
+            return True
+        if ventana[1] < self.maximo:
+            ventana[1] += 1
+            return True
+        ventana[2] += 1
+        return False
+
+def configurar_registro(nivel="INFO"):
+    """Instala el handler de cola en el logger raíz y arranca el hilo que escribe a stdout."""
+    global _listener, _handlers_originales
+    if _listener is not None:
+        return
+
+    cola = queue.SimpleQueue()
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormatoEstructurado(FORMATO))
+
+    handler = ColaSinFormato(cola)
+    handler.addFilter(LimiteFrecuencia())
+
+    raiz = logging.getLogger()
+    _handlers_originales = list(raiz.handlers)
+    raiz.handlers[:] = [handler]
+    raiz.setLevel(nivel)
+
+    _listener = QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+
+def detener_registro():
+    """Devuelve al logger raíz sus handlers originales, vacía la cola y detiene el hilo
+    (al apagar la aplicación). Lo que se registre después ya no se encola en una cola muerta."""
+    global _listener, _handlers_originales
+    if _listener is not None:
+        logging.getLogger().handlers[:] = _handlers_originales
+        _listener.stop()
+        _listener = None
+        _handlers_originales = None
@@ -0,0 +1,30 @@
+# utils/reloj.py
+# Reloj del proceso: la lógica que depende de "hoy" (avisos, estado de recargas, retención)
+# lo pregunta aquí en lugar de llamar a date.today(), para poder fijar otro día y repetir
+# ciclos diarios (herramientas/simulacion.py). En producción es el reloj real.
+from datetime import date, datetime, timedelta
+
+_desfase = None  # timedelta respecto al reloj real, o None si no se ha fijado
+
+def ahora():
+    """Fecha y hora locales según el reloj del proceso."""
+    real = datetime.now()
+    return real if _desfase is None else real + _desfase
+
+def hoy():
+    """Fecha local según el reloj del proceso."""
+    return ahora().date()
+
+def fijar(fecha):
+    """Hace que hoy() devuelva 'fecha' (la hora sigue avanzando). None vuelve al reloj real."""
+    global _desfase
+    _desfase = None if fecha is None else timedelta(days=(fecha - date.today()).days)
+
+def avanzar(dias=1):
+    """Adelanta el reloj fijado (o el real) 'dias' días. Devuelve el nuevo hoy()."""
+    fijar(hoy() + timedelta(days=dias))
+    return hoy()
+
+def fijado():
+    """True si el reloj no es el real (la base de datos debe usar el mismo día, ver hoy_app())."""
+    return _desfase is not None
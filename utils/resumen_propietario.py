@@ -0,0 +1,177 @@
+# utils/resumen_propietario.py
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+import config
+from database.connection import BaseDatosNoDisponible, get_db_connection, fijar_presupuesto, marcar_escritura
+from database.preparadas import ejecutar
+from database.resumen import refrescar_resumenes
+
+logger = logging.getLogger(__name__)
+
+LOTE_REFRESCO = 500
+
+def obtener_resumen(user_id):
+    """Resumen precalculado del usuario (búsqueda por clave primaria), o None si no tiene.
+
+    Si la base de datos no responde lanza el error: el menú decide si muestra su última copia.
+    """
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
+    try:
+        cur = conn.cursor()
+        ejecutar(cur, "resumen_propietario", (user_id,))
+        fila = cur.fetchone()
+        cur.close()
+        return fila
+    finally:
+        conn.close()
+
+def formatear_cabecera(resumen):
+    """Cabecera corta del menú principal a partir del resumen precalculado."""
+    if not resumen or not resumen[0]:
+        return ""
+
+    lineas_activas, principal, proxima_recarga, proximo_vencimiento, vencidos = resumen
+    partes = [f"📊 {lineas_activas} línea(s) activa(s)"]
+    if principal:
+        partes.append(f"⭐ {principal}")
+    if proxima_recarga:
+        partes.append(f"🔋 Próxima recarga: {proxima_recarga.strftime('%d/%m')}")
+    if proximo_vencimiento:
+        partes.append(f"⏳ Próximo vencimiento: {proximo_vencimiento.strftime('%d/%m')}")
+    if vencidos:
+        partes.append(f"❌ Recursos vencidos: {vencidos}")
+    return "\n".join(partes)
+
+def propietarios_a_notificar(hoy):
+    """Usuarios con alguna recarga vencida o por vencer, o recursos vencidos o a ≤3 días de vencer."""
+    conn = get_db_connection(solo_lectura=True)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT propietario_id
+        FROM resumen_propietario
+        WHERE lineas_activas > 0
+          AND (proxima_recarga <= %s OR proximo_vencimiento <= %s OR recursos_vencidos > 0)
+        ORDER BY propietario_id
+    """, (hoy, hoy + timedelta(days=3)))
+    usuarios = [fila[0] for fila in cur.fetchall()]
+    cur.close()
+    conn.close()
+    return usuarios
+
+COLUMNAS_AVISO = "propietario_id, lineas_activas, proxima_recarga, proximo_vencimiento, recursos_vencidos, ultima_notificacion"
+
+def leer_resumenes_aviso(desde_id, tamano_lote):
+    """Lote (orden por propietario) con los datos que decide cuándo avisar a cada usuario."""
+    conn = get_db_connection(solo_lectura=True)
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT {COLUMNAS_AVISO}
+        FROM resumen_propietario
+        WHERE propietario_id > %s AND lineas_activas > 0
+        ORDER BY propietario_id
+        LIMIT %s
+    """, (desde_id, tamano_lote))
+    filas = cur.fetchall()
+    cur.close()
+    conn.close()
+    return filas
+
+def leer_resumen_aviso(user_id):
+    conn = get_db_connection(solo_lectura=True, propietario_id=user_id)
+    cur = conn.cursor()
+    cur.execute(f"SELECT {COLUMNAS_AVISO} FROM resumen_propietario WHERE propietario_id = %s", (user_id,))
+    fila = cur.fetchone()
+    cur.close()
+    conn.close()
+    return fila
+
+def reclamar_aviso(user_id, hoy):
+    """Marca al usuario como avisado hoy, solo si nadie lo había hecho (cada worker tiene su programador).
+
+    Devuelve (reclamado, valor_anterior): si reclamado es False, otro worker ya le avisó hoy.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE resumen_propietario r
+        SET ultima_notificacion = %(hoy)s
+        FROM (
+            SELECT propietario_id, ultima_notificacion FROM resumen_propietario
+            WHERE propietario_id = %(user_id)s
+            FOR UPDATE
+        ) anterior
+        WHERE r.propietario_id = anterior.propietario_id
+          AND anterior.ultima_notificacion IS DISTINCT FROM %(hoy)s
+        RETURNING anterior.ultima_notificacion
+    """, {"hoy": hoy, "user_id": user_id})
+    fila = cur.fetchone()
+    conn.commit()
+    marcar_escritura(user_id)
+    cur.close()
+    conn.close()
+    return fila is not None, fila[0] if fila else None
+
+def liberar_aviso(user_id, hoy, anterior):
+    """Deshace reclamar_aviso cuando el aviso no se pudo enviar (para reintentarlo)."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE resumen_propietario SET ultima_notificacion = %s WHERE propietario_id = %s AND ultima_notificacion = %s",
+        (anterior, user_id, hoy),
+    )
+    conn.commit()
+    marcar_escritura(user_id)
+    cur.close()
+    conn.close()
+
+def refrescar_todos_los_resumenes():
+    """Pasada completa (por lotes) para los cambios que dependen solo de la fecha."""
+    inicio = time.monotonic()
+    try:
+        conn = get_db_connection()
+    except BaseDatosNoDisponible:
+        logger.error("❌ No se pudo conectar a la base de datos para refrescar los resúmenes.")
+        return
+
+    procesados = 0
+    ultimo_id = -1
+    try:
+        cur = conn.cursor()
+        fijar_presupuesto(conn, config.DB_PRESUPUESTO_FONDO_MS)
+        while True:
+            siguiente = refrescar_resumenes(cur, ultimo_id, LOTE_REFRESCO)
+            conn.commit()
+            if siguiente is None:
+                break
+            procesados += 1
+            ultimo_id = siguiente
+        cur.close()
+    except Exception as e:
+        logger.error("❌ Error al refrescar los resúmenes: %s", e, exc_info=True)
+        conn.rollback()
+    finally:
+        conn.close()
+
+    logger.info("🌙 Resúmenes refrescados en %.2fs (%s lotes).", time.monotonic() - inicio, procesados)
+
+def segundos_hasta(hora_texto, ahora=None):
+    """Segundos que faltan hasta la próxima aparición de 'HH:MM' (hora local)."""
+    if ahora is None:
+        ahora = datetime.now()
+    hora, minuto = map(int, hora_texto.split(":"))
+    objetivo = ahora.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+    if objetivo <= ahora:
+        objetivo += timedelta(days=1)
+    return (objetivo - ahora).total_seconds()
+
+async def bucle_resumen_nocturno():
+    """Tarea en segundo plano: una pasada de refresco cada noche."""
+    while True:
+        await asyncio.sleep(segundos_hasta(config.RESUMEN_HORA_NOCTURNA))
+        try:
+            await asyncio.to_thread(refrescar_todos_los_resumenes)
+        except Exception as e:
+            logger.error("❌ Error en la pasada nocturna de resúmenes: %s", e, exc_info=True)
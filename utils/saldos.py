@@ -0,0 +1,73 @@
+# utils/saldos.py
+from utils import reloj
+from database.connection import get_db_connection
+from database.preparadas import ejecutar
+
+TIPOS_RECURSO = ("datos", "minutos", "sms")
+
+def registrar_consumo(linea_id, tipo_recurso, cantidad, fecha=None):
+    """Anota un consumo en el libro y descuenta el saldo en la misma transacción.
+
+    Solo descuenta de un saldo vigente en 'fecha' que alcance para 'cantidad'. Devuelve el saldo
+    restante, o None si la línea no tiene saldo de ese tipo, ya venció o no alcanza.
+    """
+    if fecha is None:
+        fecha = reloj.hoy()
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Primero el UPDATE con la condición (que se vuelve a evaluar tras esperar el bloqueo de
+        # la fila si hay otro consumo en curso) y el movimiento sale de sus filas: si no se
+        # descontó nada, no se anota nada en el libro. El id del movimiento se reserva antes para
+        # guardarlo en ultimo_movimiento_id sin tocar la fila dos veces.
+        cur.execute("""
+            WITH nuevo AS (
+                SELECT nextval(pg_get_serial_sequence('movimientos_recurso', 'id')) AS id
+            ), descontado AS (
+                UPDATE saldos_linea
+                SET consumido = consumido + %(cantidad)s,
+                    saldo = saldo - %(cantidad)s,
+                    ultimo_movimiento_id = (SELECT id FROM nuevo),
+                    actualizado_en = NOW()
+                WHERE linea_id = %(linea_id)s AND tipo_recurso = %(tipo)s
+                  AND saldo >= %(cantidad)s AND fecha_vencimiento >= %(fecha)s
+                RETURNING linea_id, tipo_recurso, saldo, ultimo_movimiento_id
+            ), movimiento AS (
+                INSERT INTO movimientos_recurso (id, linea_id, tipo_recurso, tipo_movimiento, cantidad, fecha)
+                SELECT ultimo_movimiento_id, linea_id, tipo_recurso, 'consumo', -%(cantidad)s, %(fecha)s
+                FROM descontado
+            )
+            SELECT saldo FROM descontado
+        """, {"linea_id": linea_id, "tipo": tipo_recurso, "cantidad": cantidad, "fecha": fecha})
+        fila = cur.fetchone()
+        conn.commit()
+        return fila[0] if fila else None
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def formatear_saldo(saldo, asignado):
+    """'20' si no hubo consumo, '12.5/20' si ya se consumió parte."""
+    return f"{saldo}" if saldo == asignado else f"{saldo}/{asignado}"
+
+def obtener_saldos_lineas(linea_ids):
+    """Saldos actuales (uno por línea y tipo) de varias líneas en una sola consulta.
+
+    Devuelve {linea_id: [(tipo_recurso, saldo, asignado, fecha_vencimiento), ...]}.
+    """
+    if not linea_ids:
+        return {}
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    ejecutar(cur, "saldos_lineas", (list(linea_ids),))
+    saldos = {}
+    for linea_id, tipo, saldo, asignado, vence in cur.fetchall():
+        saldos.setdefault(linea_id, []).append((tipo, saldo, asignado, vence))
+    cur.close()
+    conn.close()
+    return saldos
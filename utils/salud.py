@@ -0,0 +1,49 @@
+# utils/salud.py
+# Sonda de disponibilidad (readiness) con resultado en caché: sondear seguido no carga la DB.
+import asyncio
+import time
+
+import config
+from database.connection import BaseDatosNoDisponible, get_db_connection, obtener_pool
+
+_ultimo = None  # (momento, resultado)
+_candado = asyncio.Lock()
+
+def _probar_db():
+    try:
+        conn = get_db_connection()
+    except BaseDatosNoDisponible:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.close()
+        return True
+    except Exception:
+        return False
+    finally:
+        conn.close()
+
+async def _sondear(application):
+    inicio = time.monotonic()
+    try:
+        db_ok = await asyncio.wait_for(asyncio.to_thread(_probar_db), config.LISTO_TIMEOUT_DB_SEG)
+    except asyncio.TimeoutError:
+        db_ok = False
+
+    listo = db_ok and application.running
+    return {
+        "listo": listo,
+        "base_de_datos": {"ok": db_ok, "latencia_ms": round((time.monotonic() - inicio) * 1000, 1)},
+        "pool": obtener_pool().estado(),
+        "ptb": {"ejecutando": application.running, "cola_updates": application.update_queue.qsize()},
+    }
+
+async def estado_disponibilidad(application):
+    """Resultado de la sonda; se recalcula como mucho una vez cada LISTO_CACHE_SEG."""
+    global _ultimo
+    async with _candado:  # Varias sondas simultáneas comparten una sola consulta
+        if _ultimo is None or time.monotonic() - _ultimo[0] >= config.LISTO_CACHE_SEG:
+            _ultimo = (time.monotonic(), await _sondear(application))
+        return _ultimo[1]